@@ -0,0 +1,131 @@
+# analytics/archive.py
+"""
+Холодный архив журналов BookView / DownloadLog.
+
+Формат: gzip CSV, разбитый по дням:
+    <root>/<kind>/date=YYYY-MM-DD/part-<метка>.csv.gz
+
+Запись используется командой archive_events,
+чтение (iter_archive, recompute_stats) работает офлайн — без базы данных.
+"""
+
+import csv
+import gzip
+from collections import Counter
+from datetime import date, datetime
+from pathlib import Path
+
+# Колонки архива для каждого типа событий
+ARCHIVE_FIELDS = {
+    'views': ('id', 'user_id', 'book_id', 'session_key', 'created_at'),
+    'downloads': ('id', 'user_id', 'book_id', 'file_format', 'file_size', 'status', 'created_at'),
+}
+
+# Колонки, которые при чтении приводим к int
+INT_FIELDS = {'id', 'user_id', 'book_id', 'file_size'}
+
+
+def partition_dir(root, kind, day):
+    """
+    Каталог партиции за конкретный день.
+    """
+    return Path(root) / kind / f'date={day.isoformat()}'
+
+
+def write_partition(root, kind, day, rows, label):
+    """
+    Потоково пишет строки (dict из .values()) в новый файл партиции.
+    Возвращает (путь, количество строк).
+    Файл сначала пишется во временный *.tmp и переименовывается в конце,
+    чтобы читатель никогда не видел недописанный архив.
+    """
+    fields = ARCHIVE_FIELDS[kind]
+    directory = partition_dir(root, kind, day)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    path = directory / f'part-{label}.csv.gz'
+    tmp_path = path.with_name(path.name + '.tmp')
+
+    count = 0
+    with gzip.open(tmp_path, 'wt', encoding='utf-8', newline='') as fh:
+        writer = csv.writer(fh)
+        writer.writerow(fields)
+        for row in rows:
+            writer.writerow([_dump(row.get(f)) for f in fields])
+            count += 1
+
+    tmp_path.replace(path)
+    return path, count
+
+
+def _dump(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _load(field, value):
+    if value == '':
+        return None
+    if field in INT_FIELDS:
+        return int(value)
+    if field == 'created_at':
+        return datetime.fromisoformat(value)
+    return value
+
+
+def iter_archive(root, kind, start=None, end=None):
+    """
+    Офлайн-чтение архива: генератор dict'ов по всем партициям kind
+    в диапазоне дней [start, end] (включительно, оба необязательны).
+    """
+    base = Path(root) / kind
+    if not base.exists():
+        return
+
+    for directory in sorted(base.glob('date=*')):
+        day = date.fromisoformat(directory.name.split('=', 1)[1])
+        if start and day < start:
+            continue
+        if end and day > end:
+            continue
+
+        for path in sorted(directory.glob('part-*.csv.gz')):
+            with gzip.open(path, 'rt', encoding='utf-8', newline='') as fh:
+                reader = csv.DictReader(fh)
+                for row in reader:
+                    yield {k: _load(k, v) for k, v in row.items()}
+
+
+def recompute_stats(root, start=None, end=None):
+    """
+    Пересчёт исторической аналитики только по архиву.
+    Возвращает словарь с теми же метриками, что и дашборд:
+    - total_views / views_by_book
+    - total_downloads — уникальные пары (пользователь, книга), только success
+    - downloads_by_book — уникальные скачавшие по книге
+    - formats — уникальные книги по форматам
+    """
+    views_by_book = Counter()
+    for row in iter_archive(root, 'views', start, end):
+        views_by_book[row['book_id']] += 1
+
+    pairs = set()
+    formats = {}
+    for row in iter_archive(root, 'downloads', start, end):
+        if row['status'] != 'success':
+            continue
+        pairs.add((row['user_id'], row['book_id']))
+        formats.setdefault(row['file_format'], set()).add(row['book_id'])
+
+    downloads_by_book = Counter(book_id for _, book_id in pairs)
+
+    return {
+        'total_views': sum(views_by_book.values()),
+        'views_by_book': views_by_book,
+        'total_downloads': len(pairs),
+        'downloads_by_book': downloads_by_book,
+        'formats': {fmt: len(books) for fmt, books in formats.items()},
+    }
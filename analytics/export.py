@@ -0,0 +1,103 @@
+# analytics/export.py
+"""
+Потоковая выгрузка журналов BookView / DownloadLog в CSV или JSONL.
+
+Используется действиями админки (books/admin.py) и командой export_events.
+Строки читаются server-side курсором (.values().iterator(chunk_size)) и сразу
+уходят в ответ или файл — память не зависит от размера выгрузки.
+Колонки — те же, что в холодном архиве (analytics/archive.py).
+"""
+
+import csv
+import json
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from books.models import BookView, DownloadLog
+from .archive import ARCHIVE_FIELDS
+
+MODELS = {
+    'views': BookView,
+    'downloads': DownloadLog,
+}
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+# Строк на одно чтение курсора
+EXPORT_CHUNK_SIZE = 5000
+# Строки склеиваются в куски примерно такого размера (символов):
+# не отдавать ответ по одной строке
+WRITE_BUFFER_SIZE = 64 * 1024
+
+
+def kind_for(model):
+    for kind, kind_model in MODELS.items():
+        if kind_model is model:
+            return kind
+    raise ValueError(f'{model.__name__} не выгружается')
+
+
+def iter_rows(queryset, kind, chunk_size=EXPORT_CHUNK_SIZE):
+    return queryset.order_by('pk').values(*ARCHIVE_FIELDS[kind]).iterator(chunk_size=chunk_size)
+
+
+class _Echo:
+    """
+    «Файл» для csv.writer: writerow возвращает готовую строку.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _csv_lines(rows, fields):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([_csv_value(row[field]) for field in fields])
+
+
+def _jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def stream(queryset, fmt, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Генератор кусков текста выгрузки queryset в формате fmt ('csv' | 'jsonl').
+    """
+    kind = kind_for(queryset.model)
+    rows = iter_rows(queryset, kind, chunk_size)
+    lines = _csv_lines(rows, ARCHIVE_FIELDS[kind]) if fmt == 'csv' else _jsonl_lines(rows)
+
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= WRITE_BUFFER_SIZE:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def streaming_response(queryset, fmt):
+    kind = kind_for(queryset.model)
+    response = StreamingHttpResponse(stream(queryset, fmt), content_type=CONTENT_TYPES[fmt])
+    filename = f'{kind}-{timezone.now():%Y%m%dT%H%M%S}.{fmt}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,96 @@
+# analytics/hll.py
+"""
+HyperLogLog — приближённый подсчёт уникальных значений.
+
+Точность: m = 2**PRECISION регистров, стандартная ошибка 1.04 / sqrt(m).
+При PRECISION = 12 (4096 регистров):
+- стандартная ошибка ≈ 1.6 %;
+- ~95 % оценок укладываются в ±3.3 %, ~99 % — в ±5 %.
+На малых множествах (до ~2.5·m) используется linear counting,
+там оценка практически точная.
+
+Скетчи сливаются поэлементным максимумом, поэтому дневные скетчи
+можно объединять в любое временное окно без повторного прохода по логам.
+В базе хранится zlib-сжатый массив регистров: скетч книги с парой
+десятков посетителей занимает десятки байт, а не 4 КБ.
+"""
+
+import hashlib
+import math
+import zlib
+
+PRECISION = 12
+
+
+class HyperLogLog:
+    def __init__(self, registers=None, precision=PRECISION):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(registers) if registers else bytearray(self.m)
+
+    # ---------------------------------------
+    # Сериализация
+    # ---------------------------------------
+    @classmethod
+    def from_bytes(cls, data):
+        if not data:
+            return cls()
+        raw = zlib.decompress(bytes(data))
+        # Первый байт — точность, дальше регистры
+        return cls(raw[1:], precision=raw[0])
+
+    def to_bytes(self):
+        return zlib.compress(bytes([self.precision]) + bytes(self.registers))
+
+    # ---------------------------------------
+    # Добавление и слияние
+    # ---------------------------------------
+    @staticmethod
+    def position(value, precision=PRECISION):
+        """
+        Индекс регистра и ранг (позиция первой единицы) для значения.
+        """
+        digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest()
+        x = int.from_bytes(digest, 'big')
+        tail_bits = 64 - precision
+        idx = x >> tail_bits
+        tail = x & ((1 << tail_bits) - 1)
+        rank = tail_bits - tail.bit_length() + 1
+        return idx, rank
+
+    def add(self, value):
+        """
+        Добавляет значение. Возвращает True, если скетч изменился.
+        """
+        idx, rank = self.position(value, self.precision)
+        return self.add_position(idx, rank)
+
+    def add_position(self, idx, rank):
+        if self.registers[idx] >= rank:
+            return False
+        self.registers[idx] = rank
+        return True
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError('Нельзя объединить скетчи разной точности')
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return self
+
+    # ---------------------------------------
+    # Оценка
+    # ---------------------------------------
+    def count(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting для малых множеств
+            estimate = m * math.log(m / zeros)
+
+        return int(round(estimate))
+
+    def __len__(self):
+        return self.count()
@@ -0,0 +1,146 @@
+# analytics/management/commands/archive_events.py
+"""
+Холодная архивация старых журналов BookView / DownloadLog.
+
+Для каждого полного дня старше --days:
+  1. строки потоково (server-side cursor) выгружаются в gzip CSV партицию;
+  2. в одной транзакции пополняются агрегаты (DailyBookStats, ArchivedDownloadPair)
+     и сырые строки удаляются пачками.
+Если транзакция упала — файл партиции удаляется, день можно перезапустить.
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import router, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from books.models import BookView, DownloadLog
+from analytics.archive import ARCHIVE_FIELDS, write_partition
+from analytics.models import DailyBookStats, ArchivedDownloadPair
+
+MODELS = {
+    'views': BookView,
+    'downloads': DownloadLog,
+}
+
+
+class Command(BaseCommand):
+    help = 'Архивирует события старше N дней в сжатые файлы и удаляет их из базы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=180,
+                            help='Возраст событий (в днях), начиная с которого они архивируются')
+        parser.add_argument('--output', default=str(settings.ANALYTICS_ARCHIVE_ROOT),
+                            help='Корневой каталог архива')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Размер пачки для курсора и удаления')
+        parser.add_argument('--kind', choices=sorted(MODELS), action='append',
+                            help='Какие события архивировать (по умолчанию все)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, сколько строк будет заархивировано')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        kinds = options['kind'] or sorted(MODELS)
+
+        # Граница — полночь (по локальному времени), чтобы партиции были полными днями
+        cutoff_day = timezone.localdate() - timedelta(days=options['days'])
+        cutoff = timezone.make_aware(datetime.combine(cutoff_day, time.min))
+        label = timezone.now().strftime('%Y%m%dT%H%M%S')
+
+        for kind in kinds:
+            model = MODELS[kind]
+            old = model.objects.filter(created_at__lt=cutoff)
+
+            first = old.order_by('created_at').values_list('created_at', flat=True).first()
+            if first is None:
+                self.stdout.write(f'{kind}: нечего архивировать')
+                continue
+
+            if options['dry_run']:
+                self.stdout.write(f'{kind}: {old.count()} строк до {cutoff_day}')
+                continue
+
+            total = 0
+            day = timezone.localdate(first)
+            while day < cutoff_day:
+                total += self.archive_day(kind, model, day, options['output'], label, batch_size)
+                day += timedelta(days=1)
+
+            self.stdout.write(self.style.SUCCESS(f'{kind}: заархивировано {total} строк'))
+
+    def archive_day(self, kind, model, day, root, label, batch_size):
+        start = timezone.make_aware(datetime.combine(day, time.min))
+        end = start + timedelta(days=1)
+        qs = model.objects.filter(created_at__gte=start, created_at__lt=end)
+
+        if not qs.exists():
+            return 0
+
+        # 1. Потоковая выгрузка (iterator → server-side cursor в PostgreSQL)
+        rows = qs.order_by('pk').values(*ARCHIVE_FIELDS[kind]).iterator(chunk_size=batch_size)
+        path, count = write_partition(root, kind, day, rows, label)
+
+        # 2. Агрегаты + удаление атомарно
+        try:
+            with transaction.atomic(using=router.db_for_write(model)):
+                if kind == 'views':
+                    self.rollup_views(qs, day)
+                else:
+                    self.rollup_downloads(qs, day, batch_size)
+                self.delete_in_batches(model, qs, batch_size)
+        except Exception:
+            path.unlink(missing_ok=True)
+            raise
+
+        self.stdout.write(f'  {kind} {day}: {count} строк → {path}')
+        return count
+
+    def rollup_views(self, qs, day):
+        for item in qs.values('book_id').annotate(n=Count('id')).order_by():
+            self.add_daily(item['book_id'], day, views=item['n'])
+
+    def rollup_downloads(self, qs, day, batch_size):
+        success = qs.filter(status='success')
+
+        for item in success.values('book_id').annotate(n=Count('id')).order_by():
+            self.add_daily(item['book_id'], day, downloads=item['n'])
+
+        # Уникальные пары; дни обрабатываются по возрастанию,
+        # поэтому первая вставка пары хранит самую раннюю дату
+        pairs = (
+            success
+                .values('user_id', 'book_id')
+                .annotate(first=Min('created_at'))
+                .order_by()
+                .iterator(chunk_size=batch_size)
+        )
+        chunk = []
+        for item in pairs:
+            chunk.append(ArchivedDownloadPair(
+                user_id=item['user_id'],
+                book_id=item['book_id'],
+                first_downloaded_at=item['first'],
+            ))
+            if len(chunk) >= batch_size:
+                ArchivedDownloadPair.objects.bulk_create(chunk, ignore_conflicts=True)
+                chunk = []
+        if chunk:
+            ArchivedDownloadPair.objects.bulk_create(chunk, ignore_conflicts=True)
+
+    def add_daily(self, book_id, day, views=0, downloads=0):
+        stats, _ = DailyBookStats.objects.get_or_create(book_id=book_id, day=day)
+        DailyBookStats.objects.filter(pk=stats.pk).update(
+            views=F('views') + views,
+            downloads=F('downloads') + downloads,
+        )
+
+    def delete_in_batches(self, model, qs, batch_size):
+        while True:
+            ids = list(qs.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            model.objects.filter(pk__in=ids).delete()
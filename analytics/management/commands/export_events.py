@@ -0,0 +1,62 @@
+# analytics/management/commands/export_events.py
+"""
+Выгрузка журналов BookView / DownloadLog за период в CSV или JSONL.
+
+    python manage.py export_events downloads --since 2024-01-01 --until 2024-01-31 -o jan.csv
+    python manage.py export_events views --format jsonl --since 2024-03-01 -o views.jsonl.gz
+    python manage.py export_events views --since 2024-03-01 | gzip > views.csv.gz
+
+Границы — дни по локальному времени, --until включительно. Строки читаются
+server-side курсором (analytics/export.py), поэтому память не растёт с объёмом.
+Файл с расширением .gz пишется сжатым.
+"""
+
+import gzip
+from datetime import date, datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from analytics.export import CONTENT_TYPES, EXPORT_CHUNK_SIZE, MODELS, stream
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class Command(BaseCommand):
+    help = 'Выгружает журнал просмотров или скачиваний за период в CSV или JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(MODELS), help='Какой журнал выгружать')
+        parser.add_argument('--format', choices=sorted(CONTENT_TYPES), default='csv')
+        parser.add_argument('--since', type=date.fromisoformat, help='Первый день периода, YYYY-MM-DD')
+        parser.add_argument('--until', type=date.fromisoformat,
+                            help='Последний день периода (включительно), YYYY-MM-DD')
+        parser.add_argument('-o', '--output', default='-', help='Файл (по умолчанию — stdout)')
+        parser.add_argument('--batch-size', type=int, default=EXPORT_CHUNK_SIZE,
+                            help='Строк на одно чтение курсора')
+
+    def handle(self, *args, **options):
+        since, until = options['since'], options['until']
+        if since and until and since > until:
+            raise CommandError('--since позже --until')
+
+        queryset = MODELS[options['kind']].objects.all()
+        if since:
+            queryset = queryset.filter(created_at__gte=day_start(since))
+        if until:
+            queryset = queryset.filter(created_at__lt=day_start(until + timedelta(days=1)))
+        chunks = stream(queryset, options['format'], chunk_size=options['batch_size'])
+
+        output = options['output']
+        if output == '-':
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        opener = gzip.open if output.endswith('.gz') else open
+        with opener(output, 'wt', encoding='utf-8', newline='') as fh:
+            for chunk in chunks:
+                fh.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f'{options["kind"]}: выгружено в {output}'))
@@ -0,0 +1,209 @@
+# analytics/management/commands/rebuild_sketches.py
+"""
+Пересборка HLL-скетчей из сырых логов и сверка с точными подсчётами.
+
+  manage.py rebuild_sketches            — пересобрать все скетчи
+  manage.py rebuild_sketches --verify   — после сборки сравнить с COUNT(DISTINCT)
+  manage.py rebuild_sketches --verify-only
+
+Скетчи собираются по холодному архиву (archive_events, ANALYTICS_ARCHIVE_ROOT
+или --archive-root) и живым логам, поэтому история до архивации не теряется.
+Сверка считает точные значения по тем же событиям.
+"""
+
+import math
+from itertools import chain
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import router, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from books.models import BookView, DownloadLog
+from analytics import sketches
+from analytics.archive import iter_archive
+from analytics.hll import HyperLogLog, PRECISION
+from analytics.models import ArchivedDownloadPair, HLLSketch
+from analytics.sketches import estimate, estimate_per_book
+
+
+def visitor(user_id, session_key):
+    return f'u:{user_id}' if user_id else f's:{session_key}'
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает HLL-скетчи по логам и/или сверяет их с точными значениями'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='После сборки сравнить оценки с точными подсчётами')
+        parser.add_argument('--verify-only', action='store_true',
+                            help='Только сверка, без пересборки')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--archive-root', default=settings.ANALYTICS_ARCHIVE_ROOT,
+                            help='Каталог архива событий (по умолчанию ANALYTICS_ARCHIVE_ROOT)')
+        parser.add_argument('--top', type=int, default=20,
+                            help='Сколько самых скачиваемых книг сверять по отдельности')
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            self.rebuild(options['batch_size'], options['archive_root'])
+        if options['verify'] or options['verify_only']:
+            self.verify(options['top'], options['archive_root'])
+
+    # ---------------------------------------
+    # Пересборка
+    # ---------------------------------------
+    def rebuild(self, batch_size, archive_root):
+        # Несброшенные события процесса и так попадут в скетчи из логов
+        sketches.flush()
+
+        with transaction.atomic(using=router.db_for_write(HLLSketch)):
+            HLLSketch.objects.all().delete()
+
+            # Архив содержит дни раньше живых логов: обе части идут по времени
+            archived_views = (
+                (row['book_id'], visitor(row['user_id'], row['session_key']), row['created_at'])
+                for row in iter_archive(archive_root, 'views')
+            )
+            views = (
+                BookView.objects.order_by('created_at')
+                    .values_list('book_id', 'user_id', 'session_key', 'created_at')
+                    .iterator(chunk_size=batch_size)
+            )
+            self.build_daily(
+                chain(archived_views, (
+                    (book_id, visitor(user_id, session_key), created_at)
+                    for book_id, user_id, session_key, created_at in views
+                )),
+                HLLSketch.VIEWERS,
+            )
+
+            archived_downloads = (
+                (row['book_id'], row['user_id'], row['created_at'])
+                for row in iter_archive(archive_root, 'downloads') if row['status'] == 'success'
+            )
+            downloads = (
+                DownloadLog.objects.filter(status='success').order_by('created_at')
+                    .values_list('book_id', 'user_id', 'created_at')
+                    .iterator(chunk_size=batch_size)
+            )
+            self.build_daily(chain(archived_downloads, downloads), HLLSketch.DOWNLOADERS, pairs=True)
+
+            for kind in (HLLSketch.VIEWERS, HLLSketch.DOWNLOADERS, HLLSketch.DOWNLOAD_PAIRS):
+                self.build_all_time(kind, batch_size)
+
+        self.stdout.write(self.style.SUCCESS(f'Скетчей: {HLLSketch.objects.count()}'))
+
+    def build_daily(self, events, kind, pairs=False):
+        """
+        events — (book_id, value, created_at), сгруппированные по дням.
+        В памяти держим только скетчи текущего дня. Если день встретился
+        снова (событие задним числом), его скетчи сливаются с уже записанными.
+        """
+        current_day = None
+        flushed_days = set()
+        buckets = {}
+        for book_id, value, created_at in events:
+            day = timezone.localdate(created_at)
+            if day != current_day:
+                self.flush(buckets, merge=current_day in flushed_days)
+                flushed_days.add(current_day)
+                buckets = {}
+                current_day = day
+
+            buckets.setdefault((kind, book_id, day), HyperLogLog()).add(value)
+            buckets.setdefault((kind, None, day), HyperLogLog()).add(value)
+            if pairs:
+                buckets.setdefault((HLLSketch.DOWNLOAD_PAIRS, None, day), HyperLogLog()).add(f'{value}:{book_id}')
+        self.flush(buckets, merge=current_day in flushed_days)
+
+    def flush(self, buckets, merge=False):
+        if merge:
+            days = {day for _, _, day in buckets}
+            existing = HLLSketch.objects.filter(day__in=days, kind__in={kind for kind, _, _ in buckets})
+            updated = []
+            for sketch in existing:
+                hll = buckets.pop((sketch.kind, sketch.book_id, sketch.day), None)
+                if hll is not None:
+                    hll.merge(HyperLogLog.from_bytes(sketch.registers))
+                    sketch.registers = hll.to_bytes()
+                    updated.append(sketch)
+            HLLSketch.objects.bulk_update(updated, ['registers'], batch_size=1000)
+        HLLSketch.objects.bulk_create([
+            HLLSketch(kind=kind, book_id=book_id, day=day, registers=hll.to_bytes())
+            for (kind, book_id, day), hll in buckets.items()
+        ], batch_size=1000)
+
+    def build_all_time(self, kind, batch_size):
+        """
+        Скетч «за всё время» = слияние дневных, потоково по книгам.
+        """
+        rows = (
+            HLLSketch.objects.filter(kind=kind, day__isnull=False)
+                .order_by('book_id')
+                .values_list('book_id', 'registers')
+                .iterator(chunk_size=batch_size)
+        )
+        chunk = []
+        current, merged = object(), None
+        for book_id, registers in rows:
+            if book_id != current:
+                if merged is not None:
+                    chunk.append(HLLSketch(kind=kind, book_id=current, registers=merged.to_bytes()))
+                current, merged = book_id, HyperLogLog()
+            merged.merge(HyperLogLog.from_bytes(registers))
+            if len(chunk) >= 1000:
+                HLLSketch.objects.bulk_create(chunk)
+                chunk = []
+        if merged is not None:
+            chunk.append(HLLSketch(kind=kind, book_id=current, registers=merged.to_bytes()))
+        HLLSketch.objects.bulk_create(chunk)
+
+    # ---------------------------------------
+    # Сверка с точными значениями
+    # ---------------------------------------
+    def verify(self, top, archive_root):
+        bound = 3 * 1.04 / math.sqrt(1 << PRECISION)
+        self.stdout.write(f'Допустимая ошибка (3σ): ±{bound:.1%}')
+
+        # Точные значения — по тем же событиям, что и скетчи: живые логи + архив
+        success = DownloadLog.objects.filter(status='success').order_by()
+        archived_pairs = ArchivedDownloadPair.objects.order_by()
+        viewers = {
+            visitor(user_id, session_key)
+            for user_id, session_key in BookView.objects.order_by()
+                .values_list('user_id', 'session_key').distinct().iterator()
+        }
+        viewers.update(visitor(row['user_id'], row['session_key']) for row in iter_archive(archive_root, 'views'))
+        checks = [
+            ('Уникальные скачивания (пары)',
+             success.values('user', 'book').union(archived_pairs.values('user', 'book')).count(),
+             estimate(HLLSketch.DOWNLOAD_PAIRS)),
+            ('Уникальные читатели сайта', len(viewers), estimate(HLLSketch.VIEWERS)),
+        ]
+
+        top_books = (
+            success.values('book').annotate(n=Count('user', distinct=True)).order_by('-n')
+                .values_list('book', flat=True)[:top]
+        )
+        exact_per_book = {
+            book_id: success.filter(book_id=book_id).values('user')
+                .union(archived_pairs.filter(book_id=book_id).values('user')).count()
+            for book_id in top_books
+        }
+        approx_per_book = estimate_per_book(HLLSketch.DOWNLOADERS, list(exact_per_book))
+        for book_id, exact in exact_per_book.items():
+            checks.append((f'Скачавшие книгу #{book_id}', exact, approx_per_book[book_id]))
+
+        failed = 0
+        for label, exact, approx in checks:
+            error = abs(approx - exact) / exact if exact else float(approx != 0)
+            ok = error <= bound
+            failed += not ok
+            style = self.style.SUCCESS if ok else self.style.ERROR
+            self.stdout.write(style(f'{label}: точно {exact}, оценка {approx}, ошибка {error:.2%}'))
+
+        if failed:
+            self.stdout.write(self.style.WARNING(f'Вне допуска: {failed} из {len(checks)}'))
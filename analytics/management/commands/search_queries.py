@@ -0,0 +1,70 @@
+# analytics/management/commands/search_queries.py
+"""
+Отчёт по журналу поиска (SearchQueryLog) и прогрев кэша поиска.
+
+    python manage.py search_queries --days 7             — топ запросов и запросы без результатов
+    python manage.py search_queries --days 7 --warm 200  — заодно прогреть кэш 200 популярными
+
+Прогрев выполняет cached_search (books/search.py) для популярных запросов
+с результатами — после изменения каталога (новая версия CATALOG) их первые
+посетители не ждут полного поиска. Удобно запускать по cron или после деплоя.
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, Q
+from django.utils import timezone
+
+from analytics import search_log
+from analytics.models import SearchQueryLog
+from books.search import cached_search
+
+
+class Command(BaseCommand):
+    help = 'Популярные запросы и запросы без результатов; прогрев кэша поиска'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='За сколько последних дней смотреть журнал')
+        parser.add_argument('--top', type=int, default=20, help='Сколько запросов показывать')
+        parser.add_argument('--warm', type=int, default=0,
+                            help='Прогреть кэш поиска столькими популярными запросами')
+
+    def handle(self, *args, **options):
+        search_log.flush()
+        since = timezone.now() - timedelta(days=options['days'])
+        log = SearchQueryLog.objects.filter(created_at__gte=since)
+        searches = log.filter(clicked_url='')
+
+        clicks = dict(
+            log.exclude(clicked_url='').order_by()
+                .values('query').annotate(n=Count('id')).values_list('query', 'n')
+        )
+        top = list(
+            searches.order_by().values('query')
+                .annotate(n=Count('id'), results=Avg('results'), latency=Avg('latency_ms'),
+                          hits=Count('id', filter=Q(cached=True)))
+                .order_by('-n')[:max(options['top'], options['warm'])]
+        )
+
+        self.stdout.write(f"{'запрос':<40}{'поисков':>9}{'результ.':>10}{'мс':>7}{'кэш %':>7}{'клики':>7}")
+        for row in top[:options['top']]:
+            self.stdout.write(
+                f"{row['query'][:39]:<40}{row['n']:>9}{row['results']:>10.0f}{row['latency']:>7.0f}"
+                f"{row['hits'] / row['n'] * 100:>7.0f}{clicks.get(row['query'], 0):>7}"
+            )
+
+        zero = (
+            searches.filter(results=0).order_by().values('query')
+                .annotate(n=Count('id')).order_by('-n')[:options['top']]
+        )
+        self.stdout.write('\nБез результатов:')
+        for row in zero:
+            self.stdout.write(f"{row['query'][:39]:<40}{row['n']:>9}")
+
+        if options['warm']:
+            queries = [row['query'] for row in top[:options['warm']] if row['results']]
+            warmed = sum(not cached_search(query)[1] for query in queries)
+            self.stdout.write(self.style.SUCCESS(
+                f'Кэш поиска: {warmed} запросов прогрето, {len(queries) - warmed} уже были в кэше'
+            ))
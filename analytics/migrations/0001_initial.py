@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('books', '0006_remove_book_books_book_title_s_ae82d5_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedDownloadPair',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_downloaded_at', models.DateTimeField()),
+                ('book', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_downloads', to='books.book')),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_downloads', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['book', 'user'], name='analytics_a_book_id_23eb25_idx')],
+                'unique_together': {('user', 'book')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyBookStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('downloads', models.PositiveIntegerField(default=0)),
+                ('book', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='daily_stats', to='books.book')),
+            ],
+            options={
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['day'], name='analytics_d_day_75f1ca_idx')],
+                'unique_together': {('book', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+        ('books', '0006_remove_book_books_book_title_s_ae82d5_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HLLSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(blank=True, null=True)),
+                ('kind', models.CharField(choices=[('viewers', 'Уникальные читатели'), ('downloaders', 'Уникальные скачавшие'), ('download_pairs', 'Уникальные скачивания')], max_length=16)),
+                ('registers', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('book', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='sketches', to='books.book')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'book', 'day'), name='analytics_hllsketch_unique_scope', nulls_distinct=False)],
+            },
+        ),
+    ]
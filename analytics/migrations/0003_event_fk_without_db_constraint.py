@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_hllsketch'),
+        ('books', '0007_event_fk_without_db_constraint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archiveddownloadpair',
+            name='book',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_downloads', to='books.book'),
+        ),
+        migrations.AlterField(
+            model_name='archiveddownloadpair',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_downloads', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='dailybookstats',
+            name='book',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='daily_stats', to='books.book'),
+        ),
+        migrations.AlterField(
+            model_name='hllsketch',
+            name='book',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='sketches', to='books.book'),
+        ),
+    ]
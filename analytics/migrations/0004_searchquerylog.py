@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_event_fk_without_db_constraint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchQueryLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(max_length=200)),
+                ('results', models.PositiveIntegerField(blank=True, null=True)),
+                ('latency_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('cached', models.BooleanField(default=False)),
+                ('clicked_url', models.CharField(blank=True, max_length=300)),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='analytics_s_created_35675f_idx'), models.Index(fields=['query', 'created_at'], name='analytics_s_query_69e069_idx')],
+            },
+        ),
+    ]
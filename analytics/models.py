@@ -0,0 +1,116 @@
+# analytics/models.py
+from django.db import models
+from django.contrib.auth import get_user_model
+from books.models import Book
+
+User = get_user_model()
+
+
+# -----------------------------------------
+# DailyBookStats — дневные агрегаты по архивированным событиям
+# Заполняется командой archive_events перед удалением сырых логов,
+# чтобы итоговые счётчики оставались корректными.
+# -----------------------------------------
+class DailyBookStats(models.Model):
+    book = models.ForeignKey(
+        Book,
+        on_delete=models.DO_NOTHING,  # каскад — сигналом, см. books/signals.py
+        db_constraint=False,  # модель живёт в базе 'analytics'
+        related_name='daily_stats'
+    )
+    day = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    downloads = models.PositiveIntegerField(default=0)  # только успешные
+    class Meta:
+        unique_together = ('book', 'day')
+        ordering = ['-day']
+        indexes = [models.Index(fields=['day'])]
+    def __str__(self):
+        return f'{self.book} @ {self.day}: {self.views}/{self.downloads}'
+
+
+# -----------------------------------------
+# ArchivedDownloadPair — уникальные пары (пользователь, книга)
+# из архивированных успешных скачиваний.
+# Нужны для точного подсчёта уникальных скачиваний после архивации.
+# -----------------------------------------
+class ArchivedDownloadPair(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,  # каскад — сигналом, см. books/signals.py
+        db_constraint=False,  # модель живёт в базе 'analytics'
+        related_name='archived_downloads'
+    )
+    book = models.ForeignKey(
+        Book,
+        on_delete=models.DO_NOTHING,  # каскад — сигналом, см. books/signals.py
+        db_constraint=False,  # модель живёт в базе 'analytics'
+        related_name='archived_downloads'
+    )
+    first_downloaded_at = models.DateTimeField()
+    class Meta:
+        unique_together = ('user', 'book')
+        indexes = [models.Index(fields=['book', 'user'])]
+    def __str__(self):
+        return f'{self.user} → {self.book} (архив)'
+
+
+# -----------------------------------------
+# HLLSketch — HyperLogLog-скетч уникальных посетителей/скачавших
+# book = NULL — скетч по всему сайту
+# day = NULL — скетч за всё время
+# -----------------------------------------
+class HLLSketch(models.Model):
+    VIEWERS = 'viewers'
+    DOWNLOADERS = 'downloaders'
+    DOWNLOAD_PAIRS = 'download_pairs'  # пары (пользователь, книга), только глобально
+    KIND_CHOICES = [
+        (VIEWERS, 'Уникальные читатели'),
+        (DOWNLOADERS, 'Уникальные скачавшие'),
+        (DOWNLOAD_PAIRS, 'Уникальные скачивания'),
+    ]
+    book = models.ForeignKey(
+        Book,
+        null=True,
+        blank=True,
+        on_delete=models.DO_NOTHING,  # каскад — сигналом, см. books/signals.py
+        db_constraint=False,  # модель живёт в базе 'analytics'
+        related_name='sketches'
+    )
+    day = models.DateField(null=True, blank=True)
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    registers = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['kind', 'book', 'day'],
+                name='analytics_hllsketch_unique_scope',
+                nulls_distinct=False,
+            ),
+        ]
+    def __str__(self):
+        return f'{self.kind}: {self.book or "сайт"} @ {self.day or "всё время"}'
+
+
+# -----------------------------------------
+# SearchQueryLog — журнал поиска: запрос, число результатов, время ответа.
+# Клик по результату — отдельная запись с clicked_url (results/latency пусты).
+# Пишется пачками из буфера процесса, см. analytics/search_log.py.
+# -----------------------------------------
+class SearchQueryLog(models.Model):
+    query = models.CharField(max_length=200)  # нормализованный, как ключ кэша поиска
+    results = models.PositiveIntegerField(null=True, blank=True)
+    latency_ms = models.PositiveIntegerField(null=True, blank=True)
+    cached = models.BooleanField(default=False)
+    clicked_url = models.CharField(max_length=300, blank=True)
+    created_at = models.DateTimeField()
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at']),
+            # Топ запросов и запросы без результатов за период
+            models.Index(fields=['query', 'created_at']),
+        ]
+    def __str__(self):
+        target = f' → {self.clicked_url}' if self.clicked_url else f': {self.results}'
+        return f'«{self.query}»{target}'
@@ -0,0 +1,80 @@
+# analytics/search_log.py
+"""
+Журнал поиска (SearchQueryLog) с буферизацией в процессе.
+
+Запись в базу на каждый поиск — лишний INSERT в горячем пути. Вместо этого
+записи копятся в буфере процесса и сбрасываются одним bulk_create:
+- как только накопится SEARCH_LOG_BATCH_SIZE записей;
+- или с первой записью после SEARCH_LOG_FLUSH_INTERVAL секунд с прошлого сброса;
+- и при завершении процесса (atexit).
+
+Сброс идёт в фоновом потоке (library.concurrency.run_in_background), запрос его не ждёт.
+При аварийном завершении процесса несброшенные записи теряются — для
+аналитики поиска это допустимо.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from functools import partial
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+from library.concurrency import run_in_background
+from .models import SearchQueryLog
+
+logger = logging.getLogger(__name__)
+
+_buffer = []
+_lock = threading.Lock()
+_flushed_at = time.monotonic()
+
+
+def record(query, results=None, latency_ms=None, cached=False, clicked_url=''):
+    entry = SearchQueryLog(
+        query=query[:200],
+        results=results,
+        latency_ms=latency_ms,
+        cached=cached,
+        clicked_url=clicked_url[:300],
+        created_at=timezone.now(),
+    )
+    with _lock:
+        _buffer.append(entry)
+        due = (
+            len(_buffer) >= settings.SEARCH_LOG_BATCH_SIZE
+            or time.monotonic() - _flushed_at >= settings.SEARCH_LOG_FLUSH_INTERVAL
+        )
+        batch = _take() if due else None
+    if batch:
+        run_in_background('search-log', partial(_write, batch))
+
+
+def _take():
+    global _buffer, _flushed_at
+    batch, _buffer = _buffer, []
+    _flushed_at = time.monotonic()
+    return batch
+
+
+def _write(batch):
+    try:
+        SearchQueryLog.objects.bulk_create(batch, batch_size=500)
+    except DatabaseError:
+        logger.exception('Не удалось записать журнал поиска (%d записей)', len(batch))
+
+
+def flush():
+    """
+    Сбросить буфер синхронно (команды, завершение процесса).
+    """
+    with _lock:
+        batch = _take()
+    if batch:
+        _write(batch)
+
+
+atexit.register(flush)
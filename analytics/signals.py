@@ -0,0 +1,63 @@
+# analytics/signals.py
+from django.db import transaction
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from books.models import Book, BookView, DownloadLog
+from . import sketches
+from .models import DailyBookStats, ArchivedDownloadPair, HLLSketch
+
+
+def visitor_id(view):
+    """
+    Идентичность посетителя для скетчей: пользователь или анонимный ключ.
+    """
+    if view.user_id:
+        return f'u:{view.user_id}'
+    return f's:{view.session_key}'
+
+
+@receiver(post_save, sender=BookView)
+def sketch_book_view(sender, instance, created, **kwargs):
+    """
+    Новый просмотр → HLL-скетчи уникальных читателей.
+    В буфер процесса (analytics/sketches.py) — только после коммита:
+    откатившийся просмотр не считается.
+    """
+    if not created:
+        return
+    day = timezone.localdate(instance.created_at)
+    transaction.on_commit(
+        lambda: sketches.record_view(instance.book_id, visitor_id(instance), day),
+        using=kwargs['using'],
+    )
+
+
+@receiver(post_save, sender=DownloadLog)
+def sketch_download(sender, instance, created, **kwargs):
+    """
+    Успешное скачивание → HLL-скетчи уникальных скачавших.
+    """
+    if not created or instance.status != 'success':
+        return
+    day = timezone.localdate(instance.created_at)
+    transaction.on_commit(
+        lambda: sketches.record_download(instance.book_id, instance.user_id, day),
+        using=kwargs['using'],
+    )
+
+
+@receiver(post_delete, sender=Book)
+def delete_stats_on_book_delete(sender, instance, **kwargs):
+    """
+    Каскад для агрегатов книги (FK без ограничений в БД, см. library/routers.py).
+    """
+    DailyBookStats.objects.filter(book_id=instance.pk).delete()
+    ArchivedDownloadPair.objects.filter(book_id=instance.pk).delete()
+    HLLSketch.objects.filter(book_id=instance.pk).delete()
+
+
+@receiver(post_delete, sender=get_user_model())
+def delete_stats_on_user_delete(sender, instance, **kwargs):
+    ArchivedDownloadPair.objects.filter(user_id=instance.pk).delete()
@@ -0,0 +1,235 @@
+# analytics/sketches.py
+"""
+Работа с HLL-скетчами в базе: запись событий и оценки за произвольное окно.
+
+Каждое событие попадает в несколько «областей» (scope):
+- (книга, день), (книга, всё время) — для карточек и детальной страницы;
+- (сайт, день), (сайт, всё время) — для KPI дашборда.
+
+Запись буферизуется в процессе, как журнал поиска (analytics/search_log.py):
+событие только поднимает в памяти ранги регистров своих областей, а в базу
+изменения уходят пачкой — одна транзакция на SKETCH_FLUSH_BATCH_SIZE событий
+или на SKETCH_FLUSH_INTERVAL секунд, а не по select_for_update на каждую
+область каждого события. Общие строки сайта обновляются раз на пачку.
+При аварийном завершении процесса несброшенные события теряются —
+скетчи можно пересобрать командой rebuild_sketches. При обычном завершении
+буфер сбрасывается, только если соединение с базой скетчей ещё открыто
+(см. _flush_at_exit).
+"""
+
+import atexit
+import logging
+import threading
+import time
+from datetime import date
+from functools import partial
+
+from django.conf import settings
+from django.db import DatabaseError, connections, router, transaction
+from django.db.models import Q
+
+from library.concurrency import run_in_background
+from .hll import HyperLogLog
+from .models import HLLSketch
+
+logger = logging.getLogger(__name__)
+
+# (kind, book_id, day) → {индекс регистра: ранг} — только то, что подняли события
+_pending = {}
+_events = 0
+_lock = threading.Lock()
+_flushed_at = time.monotonic()
+
+
+def _add(kind, value, scopes):
+    idx, rank = HyperLogLog.position(value)
+    for book_id, day in scopes:
+        registers = _pending.setdefault((kind, book_id, day), {})
+        if registers.get(idx, 0) < rank:
+            registers[idx] = rank
+
+
+def _record(*updates):
+    """
+    Одно событие: [(kind, value, scopes), ...] — в буфер; пора — сброс в фоне.
+    """
+    global _events
+    with _lock:
+        for kind, value, scopes in updates:
+            _add(kind, value, scopes)
+        _events += 1
+        due = (
+            _events >= settings.SKETCH_FLUSH_BATCH_SIZE
+            or time.monotonic() - _flushed_at >= settings.SKETCH_FLUSH_INTERVAL
+        )
+        batch = _take() if due else None
+    if batch:
+        run_in_background('sketches', partial(_write, batch))
+
+
+def _take():
+    global _pending, _events, _flushed_at
+    batch, _pending, _events = _pending, {}, 0
+    _flushed_at = time.monotonic()
+    return batch
+
+
+def _lock_order(key):
+    kind, book_id, day = key
+    return kind, book_id is not None, book_id or 0, day is not None, day or date.min
+
+
+def write(pending):
+    """
+    Записывает накопленные ранги в скетчи.
+
+    Большинство событий не меняют регистры (посетитель уже учтён или ранг мал),
+    поэтому сначала читаем скетчи без блокировки и пишем только те области,
+    где ранг вырос, — одной транзакцией, блокируя строки всегда в одном
+    порядке, чтобы сбросы разных процессов не ждали друг друга по кругу.
+    """
+    if not pending:
+        return
+    book_ids = {book_id for _, book_id, _ in pending if book_id is not None}
+    days = {day for _, _, day in pending if day is not None}
+    existing = {
+        (s.kind, s.book_id, s.day): HyperLogLog.from_bytes(s.registers)
+        for s in HLLSketch.objects.filter(
+            Q(book_id__in=book_ids) | Q(book__isnull=True),
+            Q(day__in=days) | Q(day__isnull=True),
+            kind__in={kind for kind, _, _ in pending},
+        ).only('kind', 'book_id', 'day', 'registers')
+    }
+    changed = [
+        key for key, registers in pending.items()
+        if key not in existing
+        or any(existing[key].registers[idx] < rank for idx, rank in registers.items())
+    ]
+    if not changed:
+        return
+
+    with transaction.atomic(using=router.db_for_write(HLLSketch)):
+        for key in sorted(changed, key=_lock_order):
+            kind, book_id, day = key
+            sketch, _ = HLLSketch.objects.select_for_update().get_or_create(
+                kind=kind,
+                book_id=book_id,
+                day=day,
+                defaults={'registers': HyperLogLog().to_bytes()},
+            )
+            hll = HyperLogLog.from_bytes(sketch.registers)
+            grown = False
+            for idx, rank in pending[key].items():
+                grown |= hll.add_position(idx, rank)
+            if grown:
+                sketch.registers = hll.to_bytes()
+                sketch.save(update_fields=['registers', 'updated_at'])
+
+
+def _write(batch):
+    try:
+        write(batch)
+    except DatabaseError:
+        logger.exception('Не удалось записать HLL-скетчи (%d областей)', len(batch))
+
+
+def flush():
+    """
+    Сбросить буфер синхронно (команды, тесты, завершение процесса).
+    """
+    with _lock:
+        batch = _take()
+    if batch:
+        _write(batch)
+
+
+def _flush_at_exit():
+    """
+    Сброс при завершении процесса — только через уже открытое соединение.
+    Закрытое к этому моменту соединение новое не открывает: в конце прогона
+    тестов тестовая база уже удалена, и запись ушла бы в рабочую базу
+    (или упала бы на отсутствующей таблице).
+    """
+    if not _pending:
+        return
+    if connections[router.db_for_write(HLLSketch)].connection is None:
+        logger.debug('HLL-скетчи не сброшены при завершении: соединение закрыто (%d областей)', len(_pending))
+        return
+    flush()
+
+
+atexit.register(_flush_at_exit)
+
+
+def record_view(book_id, visitor, day):
+    scopes = [(book_id, day), (book_id, None), (None, day), (None, None)]
+    _record((HLLSketch.VIEWERS, visitor, scopes))
+
+
+def record_download(book_id, user_id, day):
+    scopes = [(book_id, day), (book_id, None), (None, day), (None, None)]
+    _record(
+        (HLLSketch.DOWNLOADERS, user_id, scopes),
+        (HLLSketch.DOWNLOAD_PAIRS, f'{user_id}:{book_id}', [(None, day), (None, None)]),
+    )
+
+
+def _window_q(start, end):
+    """
+    Без границ — готовый скетч «за всё время», иначе дневные скетчи окна.
+    """
+    if start is None and end is None:
+        return Q(day__isnull=True)
+    q = Q(day__isnull=False)
+    if start is not None:
+        q &= Q(day__gte=start)
+    if end is not None:
+        q &= Q(day__lte=end)
+    return q
+
+
+def estimate(kind, book_id=None, start=None, end=None):
+    """
+    Оценка числа уникальных значений для книги (или всего сайта) за окно [start, end].
+    """
+    hll = HyperLogLog()
+    book_q = Q(book__isnull=True) if book_id is None else Q(book_id=book_id)
+    sketches = HLLSketch.objects.filter(
+        book_q,
+        _window_q(start, end),
+        kind=kind,
+    ).values_list('registers', flat=True)
+    for registers in sketches:
+        hll.merge(HyperLogLog.from_bytes(registers))
+    return hll.count()
+
+
+def estimate_per_book(kind, book_ids, start=None, end=None):
+    """
+    Оценки сразу для набора книг: {book_id: count}. Один запрос на все книги.
+    """
+    merged = {}
+    sketches = HLLSketch.objects.filter(
+        _window_q(start, end),
+        kind=kind,
+        book_id__in=list(book_ids),
+    ).values_list('book_id', 'registers')
+    for book_id, registers in sketches.iterator():
+        hll = HyperLogLog.from_bytes(registers)
+        if book_id in merged:
+            merged[book_id].merge(hll)
+        else:
+            merged[book_id] = hll
+    return {book_id: merged[book_id].count() if book_id in merged else 0 for book_id in book_ids}
+
+
+def attach_unique_downloads(books):
+    """
+    Проставляет book.unique_downloads по скетчам (приближённый режим карточек).
+    Принимает любой итерируемый набор книг, возвращает список.
+    """
+    books = list(books)
+    counts = estimate_per_book(HLLSketch.DOWNLOADERS, [b.pk for b in books])
+    for book in books:
+        book.unique_downloads = counts[book.pk]
+    return books
@@ -0,0 +1,313 @@
+# analytics/stats.py
+"""
+Счётчики по журналам событий без JOIN'ов с каталогом.
+
+Журналы (BookView, DownloadLog) могут жить в отдельной базе 'analytics'
+(library/routers.py), поэтому счётчики считаются группировкой по book_id
+в базе журнала, а книги/жанры достаются отдельно по id.
+
+Счётчики «за всё время» (BookCounts) складывают живой журнал с агрегатами
+архива (archive_events): просмотры — с DailyBookStats, уникальные скачавшие —
+с ArchivedDownloadPair. После архивации итоги не уменьшаются.
+
+Рейтинги дашборда (top_by_score) тоже не тянут в Python счётчики всех книг:
+каждая часть score считается и сортируется в своей базе, а читаются только
+верхушки рейтингов — пока следующая непрочитанная книга не может обогнать
+уже найденный топ.
+"""
+
+import heapq
+import math
+from itertools import islice
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, router
+from django.db.models import Count, Sum
+
+from books.models import Book, BookView, DownloadLog
+from .models import ArchivedDownloadPair, DailyBookStats
+
+
+def count_by_book(queryset, field='id', distinct=False, book_ids=None):
+    """
+    {book_id: COUNT(field)} по queryset журнала (или Favorite).
+    book_ids — ограничить подсчёт этими книгами.
+    """
+    if book_ids is not None:
+        queryset = queryset.filter(book_id__in=list(book_ids))
+    return dict(
+        queryset
+            .order_by()
+            .values('book_id')
+            .annotate(n=Count(field, distinct=distinct))
+            .values_list('book_id', 'n')
+    )
+
+
+# Строк за раз при чтении рейтинга (BookCounts.ranked)
+RANKED_CHUNK_SIZE = 100
+
+
+class BookCounts:
+    """
+    Счётчик по книге из нескольких запросов одной базы — живого журнала и
+    агрегатов архива: SELECT key, aggregate FROM (q1 UNION ALL q2 ...) GROUP BY key.
+
+    querysets — .values() со столбцом key и столбцами, которые читает aggregate
+    (в одном порядке), например n для 'SUM(n)' или user_id для
+    'COUNT(DISTINCT user_id)'.
+    """
+
+    def __init__(self, querysets, aggregate, key='book_id'):
+        self.querysets = [queryset.order_by() for queryset in querysets]
+        self.aggregate = aggregate
+        self.key = key
+        self.db = self.querysets[0].db
+        assert all(queryset.db == self.db for queryset in self.querysets), 'запросы из разных баз'
+
+    def filter(self, *args, **kwargs):
+        return BookCounts([qs.filter(*args, **kwargs) for qs in self.querysets], self.aggregate, self.key)
+
+    def exclude(self, *args, **kwargs):
+        return BookCounts([qs.exclude(*args, **kwargs) for qs in self.querysets], self.aggregate, self.key)
+
+    def for_books(self, book_ids):
+        return self.filter(**{f'{self.key}__in': list(book_ids)})
+
+    def _rows_sql(self):
+        parts = []
+        for queryset in self.querysets:
+            try:
+                parts.append(queryset.query.get_compiler(self.db).as_sql())
+            except EmptyResultSet:
+                # Заведомо пустой запрос (например, book_id__in=[]) — без своей части
+                continue
+        if not parts:
+            raise EmptyResultSet
+        return ' UNION ALL '.join(sql for sql, _ in parts), [p for _, params in parts for p in params]
+
+    def _grouped_sql(self, min_count=None):
+        rows, params = self._rows_sql()
+        key = connections[self.db].ops.quote_name(self.key)
+        sql = f'SELECT t.{key}, {self.aggregate} AS n FROM ({rows}) t GROUP BY t.{key}'
+        if min_count is not None:
+            sql += f' HAVING {self.aggregate} >= %s'
+            params.append(min_count)
+        return sql, params
+
+    def as_dict(self, min_count=None):
+        """
+        {book_id: n}; книг без строк нет в словаре.
+        """
+        try:
+            sql, params = self._grouped_sql(min_count)
+        except EmptyResultSet:
+            return {}
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            # SUM в PostgreSQL — numeric
+            return {book_id: int(n) for book_id, n in cursor.fetchall()}
+
+    def ranked(self, min_count=None):
+        """
+        (book_id, n) по убыванию n, при равенстве — по убыванию id.
+        Читается пачками: в PostgreSQL — server-side курсором, как QuerySet.iterator().
+        """
+        try:
+            sql, params = self._grouped_sql(min_count)
+        except EmptyResultSet:
+            return
+        connection = connections[self.db]
+        if connection.settings_dict.get('DISABLE_SERVER_SIDE_CURSORS'):
+            cursor = connection.cursor()
+        else:
+            cursor = connection.chunked_cursor()
+        with cursor:
+            cursor.execute(f'{sql} ORDER BY 2 DESC, 1 DESC', params)
+            while rows := cursor.fetchmany(RANKED_CHUNK_SIZE):
+                for book_id, n in rows:
+                    yield book_id, int(n)
+
+    def by_genre(self):
+        """
+        {genre_id: сумма n по книгам жанра}. Журнал в одной базе с каталогом —
+        один запрос с JOIN через books_book_genres; иначе — счётчики по книгам
+        и сумма по жанрам в Python (genre_books).
+        """
+        through = Book.genres.through
+        if genres_db() != self.db:
+            counts = self.as_dict()
+            return {
+                genre_id: sum(counts.get(book_id, 0) for book_id in book_ids)
+                for genre_id, book_ids in genre_books().items()
+            }
+
+        try:
+            sql, params = self._grouped_sql()
+        except EmptyResultSet:
+            return {}
+        quote = connections[self.db].ops.quote_name
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'SELECT g.{quote("genre_id")}, SUM(b.n) FROM ({sql}) b '
+                f'JOIN {quote(through._meta.db_table)} g ON g.{quote("book_id")} = b.{quote(self.key)} '
+                f'GROUP BY g.{quote("genre_id")}',
+                params,
+            )
+            return {genre_id: int(n) for genre_id, n in cursor.fetchall()}
+
+    def max(self):
+        """
+        Наибольший n по книгам (0, если строк нет).
+        """
+        try:
+            sql, params = self._grouped_sql()
+        except EmptyResultSet:
+            return 0
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(f'SELECT MAX(g.n) FROM ({sql}) g', params)
+            return int(cursor.fetchone()[0] or 0)
+
+
+def grouped(queryset, count, key='book_id'):
+    """
+    BookCounts одного запроса: count по группам key (например, избранное по книгам).
+    """
+    return BookCounts([queryset.values(key).annotate(n=count)], 'SUM(n)', key)
+
+
+def view_counts(views=None):
+    """
+    Просмотры книги за всё время: BookView + DailyBookStats.views.
+    """
+    views = BookView.objects.all() if views is None else views
+    return BookCounts([
+        views.values('book_id').annotate(n=Count('id')),
+        DailyBookStats.objects.values('book_id').annotate(n=Sum('views')),
+    ], 'SUM(n)')
+
+
+def downloader_counts(downloads=None):
+    """
+    Уникальные скачавшие книгу за всё время: пользователи из downloads
+    (по умолчанию — успешные скачивания) и из ArchivedDownloadPair.
+    """
+    downloads = DownloadLog.objects.filter(status='success') if downloads is None else downloads
+    return BookCounts([
+        downloads.values('book_id', 'user_id'),
+        ArchivedDownloadPair.objects.values('book_id', 'user_id'),
+    ], 'COUNT(DISTINCT user_id)')
+
+
+def unique_downloads_by_book(book_ids=None):
+    """
+    Уникальные пользователи с успешным скачиванием, включая архив, — счётчик
+    «Скачано» на карточках. Без book_ids — по всем книгам.
+    """
+    counts = downloader_counts()
+    return (counts if book_ids is None else counts.for_books(book_ids)).as_dict()
+
+
+def attach_unique_downloads(books):
+    """
+    Проставляет book.unique_downloads (точный режим). Возвращает список.
+    """
+    books = list(books)
+    counts = unique_downloads_by_book([b.pk for b in books])
+    for book in books:
+        book.unique_downloads = counts.get(book.pk, 0)
+    return books
+
+
+def views_by_book(book_ids=None):
+    """
+    Просмотры за всё время, включая архив. Без book_ids — по всем книгам.
+    """
+    counts = view_counts()
+    return (counts if book_ids is None else counts.for_books(book_ids)).as_dict()
+
+
+def genres_db():
+    """
+    База связей книга—жанр (books_book_genres) — вместе с каталогом.
+    """
+    return router.db_for_read(Book.genres.through)
+
+
+def genre_books():
+    """
+    {genre_id: [book_id, ...]} — все книги жанра (как Count('books') в ORM).
+    """
+    mapping = {}
+    through = Book.genres.through.objects.values_list('genre_id', 'book_id')
+    for genre_id, book_id in through.iterator():
+        mapping.setdefault(genre_id, []).append(book_id)
+    return mapping
+
+
+def log_norm(value, max_value):
+    """
+    ln(value + 1) / ln(max + 1) — та же нормализация, что и в SQL-версии рейтингов.
+    """
+    return math.log(value + 1) / math.log(max_value + 1)
+
+
+def max_or_one(values):
+    """
+    Максимум по набору или 1 (как `... or 1` после aggregate(Max)).
+    """
+    return max(values, default=0) or 1
+
+
+# Строк за раз из каждого рейтинга в top_by_score
+TOP_BATCH_SIZE = 100
+
+
+def top_by_score(parts, limit, required=(), batch_size=TOP_BATCH_SIZE):
+    """
+    Top-N книг по сумме частей score, которые живут в разных базах
+    (threshold algorithm: рейтинги читаются сверху пачками, пока N-й
+    результат не станет больше максимума, который ещё может набрать
+    непрочитанная книга).
+
+    parts — {имя: ranking}; ranking(book_ids=None) возвращает пары
+    (book_id, score) с неотрицательным score. Без book_ids — все книги
+    по убыванию score (читаются по мере надобности), с book_ids — только эти
+    книги. Книги нет в рейтинге — её часть равна 0.
+    required — имена частей, без которых книга не участвует (например,
+    рейтинг активных книг или скачиваний с порогом).
+
+    Возвращает [(book_id, score), ...] по убыванию score; при равенстве
+    выше книга с большим id. Если у всех непрочитанных книг score 0, они
+    не дочитываются.
+    """
+    streams = {name: iter(ranking()) for name, ranking in parts.items()}
+    scores, seen = {}, set()
+    try:
+        while True:
+            batches = {name: list(islice(stream, batch_size)) for name, stream in streams.items()}
+
+            new_ids = {book_id for batch in batches.values() for book_id, _ in batch} - seen
+            seen |= new_ids
+            if new_ids:
+                values = {name: dict(ranking(new_ids)) for name, ranking in parts.items()}
+                for book_id in new_ids:
+                    if any(book_id not in values[name] for name in required):
+                        continue
+                    scores[book_id] = sum(part.get(book_id, 0) for part in values.values())
+
+            exhausted = {name for name, batch in batches.items() if len(batch) < batch_size}
+            # Все подходящие книги уже прочитаны
+            if exhausted & set(required) or exhausted == set(parts):
+                break
+            # Больше этого непрочитанная книга набрать не может
+            threshold = sum(batch[-1][1] for name, batch in batches.items() if name not in exhausted)
+            top = heapq.nlargest(limit, scores.values())
+            if len(top) == limit and (top[-1] > threshold or threshold == 0):
+                break
+    finally:
+        for stream in streams.values():
+            if hasattr(stream, 'close'):
+                stream.close()
+
+    return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
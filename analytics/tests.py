@@ -0,0 +1,417 @@
+# analytics/tests.py
+import io
+import math
+import tempfile
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connections, router
+from django.db.models import Count
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from books.models import Book, BookView, DownloadLog, Favorite, Genre
+from library.routers import ANALYTICS_DB, analytics_db_enabled
+
+from . import search_log, sketches
+from .archive import write_partition
+from .hll import HyperLogLog
+from .models import ArchivedDownloadPair, DailyBookStats, HLLSketch, SearchQueryLog
+from .stats import downloader_counts, grouped, log_norm, top_by_score, unique_downloads_by_book, view_counts
+from .views import site_analytics
+from .views.site_analytics import ranking
+
+# Книга → (просмотры, скачавшие, в избранном у)
+ACTIVITY = {
+    'a': (10, 5, 1),
+    'b': (2, 4, 3),
+    'c': (40, 3, 0),
+    'd': (7, 2, 6),  # меньше 3 скачавших — не в общем топе
+    'e': (0, 0, 0),
+    'hidden': (90, 6, 6),  # неактивная
+}
+
+
+class DashboardDataMixin:
+    # Журналы — в базе 'analytics', если она описана, иначе в 'default'
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        users = [get_user_model().objects.create_user(f'reader{i}') for i in range(6)]
+        novels = Genre.objects.create(name='Роман', slug='roman')
+        poems = Genre.objects.create(name='Поэзия', slug='poeziya')
+        cls.books = {}
+        for slug, (views, downloads, favorites) in ACTIVITY.items():
+            book = Book.objects.create(title=slug, slug=slug, is_active=slug != 'hidden')
+            book.genres.add(novels if slug in ('a', 'b', 'hidden') else poems)
+            cls.books[slug] = book
+            BookView.objects.bulk_create(BookView(book=book) for _ in range(views))
+            DownloadLog.objects.bulk_create(
+                DownloadLog(book=book, user=user, file_format='pdf') for user in users[:downloads]
+            )
+            # Повторное скачивание не добавляет скачавшего
+            DownloadLog.objects.bulk_create(
+                DownloadLog(book=book, user=user, file_format='epub') for user in users[:downloads]
+            )
+            Favorite.objects.bulk_create(Favorite(book=book, user=user) for user in users[:favorites])
+        cls.novels, cls.poems = novels, poems
+
+
+# ---------------------------------------
+# Две базы (library/routers.py)
+# ---------------------------------------
+@skipUnless(analytics_db_enabled(), "База 'analytics' не описана в DATABASES")
+class TwoDatabaseTests(DashboardDataMixin, TestCase):
+    def test_events_live_in_analytics_db(self):
+        self.assertEqual(BookView.objects.using(ANALYTICS_DB).count(), 149)
+        self.assertEqual(Favorite.objects.using('default').count(), 16)
+
+    def test_migrations_split_tables(self):
+        default_tables = set(connections['default'].introspection.table_names())
+        analytics_tables = set(connections[ANALYTICS_DB].introspection.table_names())
+        self.assertIn('books_book', default_tables)
+        self.assertNotIn('books_bookview', default_tables)
+        self.assertIn('books_bookview', analytics_tables)
+        self.assertIn('analytics_hllsketch', analytics_tables)
+        self.assertNotIn('books_book', analytics_tables)
+
+
+# ---------------------------------------
+# Рейтинги дашборда (analytics/stats.py, analytics/views/site_analytics.py)
+# ---------------------------------------
+class TopByScoreTests(DashboardDataMixin, TestCase):
+    def parts(self):
+        return {
+            'views': ranking(view_counts(), lambda n: n * 1),
+            'downloads': ranking(downloader_counts(DownloadLog.objects.all()), lambda n: n * 6),
+            'favorites': ranking(grouped(Book.objects.filter(is_active=True), Count('favorited_by'), key='id'),
+                                 lambda n: n * 3),
+        }
+
+    def expected(self):
+        scores = {
+            self.books[slug].pk: views + favorites * 3 + downloads * 6
+            for slug, (views, downloads, favorites) in ACTIVITY.items() if slug != 'hidden'
+        }
+        return sorted(scores.items(), key=lambda item: (item[1], item[0]), reverse=True)
+
+    def test_matches_full_scan_for_any_batch_size(self):
+        for batch_size in (1, 2, 3, 100):
+            for limit in (1, 3):
+                with self.subTest(batch_size=batch_size, limit=limit):
+                    top = top_by_score(self.parts(), limit, required=['favorites'], batch_size=batch_size)
+                    self.assertEqual(top, self.expected()[:limit])
+
+    def test_required_part(self):
+        top = top_by_score(self.parts(), 10, required=['favorites', 'views'], batch_size=2)
+        self.assertNotIn(self.books['e'].pk, dict(top))
+        self.assertNotIn(self.books['hidden'].pk, dict(top))
+
+    def test_empty_book_list(self):
+        counts = view_counts().for_books([])
+        self.assertEqual(counts.as_dict(), {})
+        self.assertEqual(list(counts.ranked()), [])
+        self.assertFalse(any(counts.by_genre().values()))
+        self.assertEqual(counts.max(), 0)
+        self.assertEqual(unique_downloads_by_book([]), {})
+
+
+class DashboardBlockTests(DashboardDataMixin, TestCase):
+    def test_top_books(self):
+        active = [slug for slug in ACTIVITY if slug != 'hidden']
+        max_views, max_downloads, max_favorites = (
+            max(ACTIVITY[slug][i] for slug in active) for i in range(3)
+        )
+        expected = sorted(
+            (
+                log_norm(views, max_views) + log_norm(favorites, max_favorites) * 3
+                + log_norm(downloads, max_downloads) * 6,
+                slug,
+            )
+            for slug, (views, downloads, favorites) in ACTIVITY.items()
+            if slug in active and downloads >= 3
+        )[::-1]
+
+        top_books = site_analytics.top_books_block(timezone.now())['top_books']
+        self.assertEqual([book.slug for book in top_books], [slug for _, slug in expected])
+        for book, (score, slug) in zip(top_books, expected):
+            self.assertTrue(math.isclose(book.score, score))
+            views, downloads, favorites = ACTIVITY[slug]
+            self.assertEqual((book.total_views, book.total_downloads, book.total_favorites),
+                             (views, downloads, favorites))
+
+    def test_book_of_week(self):
+        book = site_analytics.book_of_week_block(timezone.now())['book_of_week']
+        # c: 40 + 0*3 + 3*6 = 58 — больше, чем у остальных активных книг (у hidden — 144)
+        self.assertEqual(book.slug, 'c')
+        self.assertEqual((book.weekly_views, book.weekly_downloads, book.weekly_favorites, book.score),
+                         (40, 3, 0, 58))
+
+    def test_book_of_week_without_activity(self):
+        week_later = timezone.now() + timezone.timedelta(days=8)
+        Favorite.objects.update(created_at=timezone.now() - timezone.timedelta(days=30))
+        book = site_analytics.book_of_week_block(week_later)['book_of_week']
+        self.assertEqual(book, Book.objects.filter(is_active=True).order_by('-pk').first())
+        self.assertEqual(book.score, 0)
+
+    def test_top_genres(self):
+        genres = {g.slug: g for g in site_analytics.top_genres_block(timezone.now())['top_genres']}
+        # Неактивная книга в жанре считается, как и раньше (genre_books — все книги жанра);
+        # скачавшие — сумма по книгам жанра
+        self.assertEqual(
+            (genres['roman'].total_views, genres['roman'].total_downloads,
+             genres['roman'].total_favorites, genres['roman'].books_count),
+            (10 + 2 + 90, 5 + 4 + 6, 1 + 3 + 6, 3),
+        )
+        self.assertEqual(
+            (genres['poeziya'].total_views, genres['poeziya'].total_downloads,
+             genres['poeziya'].total_favorites, genres['poeziya'].books_count),
+            (40 + 7, 3 + 2, 6, 3),
+        )
+
+
+    def test_genre_totals_do_not_send_book_lists(self):
+        alias = router.db_for_read(BookView)
+        with CaptureQueriesContext(connections[alias]) as queries:
+            site_analytics.top_genres_block(timezone.now())
+        self.assertTrue(queries.captured_queries)
+        for query in queries.captured_queries:
+            if 'books_bookview' in query['sql'] or 'books_downloadlog' in query['sql']:
+                self.assertNotIn(' IN (', query['sql'])
+
+    def test_genre_totals_without_join(self):
+        counts = downloader_counts(DownloadLog.objects.all())
+        joined = counts.by_genre()
+        # Журнал в другой базе, чем каталог, — суммы по книгам в Python
+        with mock.patch('analytics.stats.genres_db', return_value='elsewhere'):
+            self.assertEqual(counts.by_genre(), joined)
+        self.assertEqual(joined, {self.novels.pk: 5 + 4 + 6, self.poems.pk: 3 + 2})
+
+
+# ---------------------------------------
+# Итоги после archive_events
+# ---------------------------------------
+class ArchivedTotalsTests(DashboardDataMixin, TestCase):
+    def totals(self):
+        now = timezone.now()
+        cards = {
+            book.slug: book.unique_downloads
+            for book in self.client.get(reverse('books:catalog')).context['page_obj'].object_list
+        }
+        genre_cards = {
+            book.slug: book.unique_downloads
+            for book in self.client.get(reverse('books:genre_detail', args=['roman'])).context['books']
+        }
+        top_books = [
+            (book.slug, book.total_views, book.total_downloads, book.total_favorites, round(book.score, 9))
+            for book in site_analytics.top_books_block(now)['top_books']
+        ]
+        top_genres = [
+            (genre.slug, genre.total_views, genre.total_downloads, round(genre.genre_score, 9))
+            for genre in site_analytics.top_genres_block(now)['top_genres']
+        ]
+        kpi = site_analytics.kpi_block(now)
+        return {
+            'cards': cards,
+            'genre_cards': genre_cards,
+            'unique_downloads': unique_downloads_by_book(),
+            'top_books': top_books,
+            'top_genres': top_genres,
+            'kpi': (kpi['total_views'], kpi['total_downloads']),
+        }
+
+    def test_totals_survive_archiving(self):
+        before = self.totals()
+        # Половина событий — старше порога архивации
+        old = timezone.now() - timedelta(days=200)
+        for model in (BookView, DownloadLog):
+            ids = list(model.objects.order_by('pk').values_list('pk', flat=True)[::2])
+            model.objects.filter(pk__in=ids).update(created_at=old)
+
+        with tempfile.TemporaryDirectory() as root:
+            call_command('archive_events', days=180, output=root, stdout=io.StringIO())
+        for model in (BookView, DownloadLog):
+            self.assertFalse(model.objects.filter(created_at__lte=old).exists())
+        self.assertTrue(DailyBookStats.objects.exists())
+        self.assertTrue(ArchivedDownloadPair.objects.exists())
+
+        self.assertEqual(self.totals(), before)
+
+
+# ---------------------------------------
+# HyperLogLog (analytics/hll.py)
+# ---------------------------------------
+class HyperLogLogTests(SimpleTestCase):
+    def sketch(self, values):
+        hll = HyperLogLog()
+        for value in values:
+            hll.add(value)
+        return hll
+
+    def test_small_sets_are_exact(self):
+        self.assertEqual(self.sketch(f'u:{i}' for i in range(100)).count(), 100)
+        self.assertEqual(self.sketch(['u:1', 'u:1', 'u:2']).count(), 2)
+
+    def test_error_within_documented_bound(self):
+        # ~99 % оценок — в ±5 % (docstring analytics/hll.py); хеш детерминирован
+        n = 100_000
+        for prefix in ('u', 's', 'pair'):
+            with self.subTest(prefix=prefix):
+                estimate = self.sketch(f'{prefix}:{i}' for i in range(n)).count()
+                self.assertLess(abs(estimate - n) / n, 0.05)
+
+    def test_merge_and_serialization(self):
+        halves = [self.sketch(f'u:{i}' for i in range(start, 100_000, 2)) for start in (0, 1)]
+        whole = self.sketch(f'u:{i}' for i in range(100_000))
+        merged = HyperLogLog.from_bytes(halves[0].to_bytes()).merge(halves[1])
+        self.assertEqual(merged.registers, whole.registers)
+        self.assertEqual(merged.count(), whole.count())
+
+
+# ---------------------------------------
+# HLL-скетчи (analytics/sketches.py, rebuild_sketches)
+# ---------------------------------------
+@override_settings(SKETCH_FLUSH_BATCH_SIZE=1000, SKETCH_FLUSH_INTERVAL=3600)
+class SketchBufferTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        sketches.flush()
+        self.addCleanup(sketches.flush)
+        self.users = [get_user_model().objects.create_user(f'reader{i}') for i in range(4)]
+        self.books = [Book.objects.create(title=f'Книга {i}', slug=f'kniga-{i}') for i in range(2)]
+
+    def test_events_are_written_in_one_batch(self):
+        with self.captureOnCommitCallbacks(using=router.db_for_write(BookView), execute=True):
+            for user in self.users:
+                for book in self.books:
+                    BookView.objects.create(book=book, user=user)
+            BookView.objects.create(book=self.books[0], session_key='anon')
+            DownloadLog.objects.create(book=self.books[0], user=self.users[0], file_format='pdf')
+        # До сброса в базе ничего нет
+        self.assertFalse(HLLSketch.objects.exists())
+
+        sketches.flush()
+        self.assertEqual(sketches.estimate(HLLSketch.VIEWERS), 5)
+        self.assertEqual(sketches.estimate(HLLSketch.VIEWERS, book_id=self.books[1].pk), 4)
+        self.assertEqual(sketches.estimate(HLLSketch.DOWNLOADERS, book_id=self.books[0].pk), 1)
+        self.assertEqual(sketches.estimate(HLLSketch.DOWNLOAD_PAIRS), 1)
+
+    def test_flush_merges_into_existing_sketches(self):
+        today = timezone.localdate()
+        sketches.record_view(self.books[0].pk, 'u:1', today)
+        sketches.flush()
+        sketches.record_view(self.books[0].pk, 'u:1', today)
+        sketches.record_view(self.books[0].pk, 'u:2', today)
+        sketches.flush()
+        self.assertEqual(sketches.estimate(HLLSketch.VIEWERS, book_id=self.books[0].pk), 2)
+        self.assertEqual(HLLSketch.objects.filter(kind=HLLSketch.VIEWERS).count(), 4)
+
+    def test_exit_flush_needs_open_connection(self):
+        with self.assertNumQueries(0, using=router.db_for_write(HLLSketch)):
+            sketches._flush_at_exit()
+
+        sketches.record_view(self.books[0].pk, 'u:1', timezone.localdate())
+        closed = {router.db_for_write(HLLSketch): mock.Mock(connection=None)}
+        with mock.patch.object(sketches, 'connections', closed):
+            sketches._flush_at_exit()
+        self.assertFalse(HLLSketch.objects.exists())
+
+        sketches._flush_at_exit()
+        self.assertEqual(sketches.estimate(HLLSketch.VIEWERS), 1)
+
+
+class RebuildSketchesTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [get_user_model().objects.create_user(f'reader{i}') for i in range(6)]
+        cls.book, cls.other = (Book.objects.create(title=f'Книга {i}', slug=f'kniga-{i}') for i in range(2))
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.archive_root = tmp.name
+        self.archived_day = timezone.localdate() - timedelta(days=200)
+        archived_at = timezone.now() - timedelta(days=200)
+        users = [user.pk for user in self.users]
+
+        # Архив: читатели 0–3 и аноним, скачавшие 0–2 (у 2 — неудачное скачивание)
+        views = [
+            {'id': i, 'user_id': user_id, 'book_id': self.book.pk, 'session_key': None, 'created_at': archived_at}
+            for i, user_id in enumerate(users[:4], start=1)
+        ]
+        views.append({'id': 5, 'user_id': None, 'book_id': self.other.pk, 'session_key': 'anon',
+                      'created_at': archived_at})
+        write_partition(self.archive_root, 'views', self.archived_day, views, 'test')
+        write_partition(self.archive_root, 'downloads', self.archived_day, [
+            {'id': i, 'user_id': user_id, 'book_id': self.book.pk, 'file_format': 'pdf', 'file_size': None,
+             'status': 'success' if i < 3 else 'failed', 'created_at': archived_at}
+            for i, user_id in enumerate(users[:3], start=1)
+        ], 'test')
+        ArchivedDownloadPair.objects.bulk_create(
+            ArchivedDownloadPair(user_id=user_id, book=self.book, first_downloaded_at=archived_at)
+            for user_id in users[:2]
+        )
+
+        # Живые логи: читатели 2–5, скачавшие 1–4
+        BookView.objects.bulk_create(BookView(book=self.book, user_id=user_id) for user_id in users[2:])
+        DownloadLog.objects.bulk_create(
+            DownloadLog(book=self.book, user_id=user_id, file_format='pdf') for user_id in users[1:5]
+        )
+        DownloadLog.objects.bulk_create([DownloadLog(book=self.other, user_id=users[0], file_format='pdf')])
+
+    def rebuild(self, **options):
+        out = io.StringIO()
+        call_command('rebuild_sketches', archive_root=self.archive_root, stdout=out, **options)
+        return out.getvalue()
+
+    def test_matches_exact_counts_including_archive(self):
+        self.rebuild()
+        # Читатели 0–5 и аноним
+        self.assertEqual(sketches.estimate(HLLSketch.VIEWERS), 7)
+        self.assertEqual(sketches.estimate(HLLSketch.VIEWERS, book_id=self.book.pk), 6)
+        # Скачавшие книгу: 0–1 из архива и 1–4 из логов
+        self.assertEqual(sketches.estimate(HLLSketch.DOWNLOADERS, book_id=self.book.pk), 5)
+        self.assertEqual(sketches.estimate(HLLSketch.DOWNLOAD_PAIRS), 6)
+        # Архивный день сохранил свои скетчи
+        day = self.archived_day
+        self.assertEqual(sketches.estimate(HLLSketch.VIEWERS, start=day, end=day), 5)
+        self.assertEqual(sketches.estimate(HLLSketch.DOWNLOADERS, book_id=self.book.pk, start=day, end=day), 2)
+
+    def test_rebuild_is_repeatable_and_verified(self):
+        self.rebuild()
+        count = HLLSketch.objects.count()
+        output = self.rebuild(verify=True)
+        self.assertEqual(HLLSketch.objects.count(), count)
+        self.assertNotIn('Вне допуска', output)
+        self.assertIn('точно 6, оценка 6', output)
+
+
+# ---------------------------------------
+# Журнал поиска (analytics/search_log.py)
+# ---------------------------------------
+@override_settings(SEARCH_LOG_BATCH_SIZE=1000, SEARCH_LOG_FLUSH_INTERVAL=3600)
+class SearchLogBufferTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        search_log.flush()
+        self.addCleanup(search_log.flush)
+
+    def test_records_are_written_on_flush(self):
+        search_log.record('толстой', results=3, latency_ms=12)
+        search_log.record('толстой', cached=True)
+        self.assertFalse(SearchQueryLog.objects.exists())
+
+        search_log.flush()
+        self.assertEqual(
+            list(SearchQueryLog.objects.order_by('pk').values_list('query', 'cached')),
+            [('толстой', False), ('толстой', True)],
+        )
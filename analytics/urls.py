@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from .views import site_analytics
 from analytics.views.user_analytics import profile_analytics
@@ -5,6 +6,7 @@ from . import views
 app_name = 'analytics'
 
 urlpatterns = [
-    path('', site_analytics.dashboard, name='dashboard'),
+    path('', site_analytics.dashboard_async if settings.ASYNC_VIEWS else site_analytics.dashboard,
+         name='dashboard'),
     path('profile/analytics/', profile_analytics, name='profile_analytics'),
 ]
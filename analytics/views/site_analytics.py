@@ -1,192 +1,329 @@
+import json
+import logging
+from functools import partial
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
-from django.db.models import Count, Q, F, Max, FloatField, ExpressionWrapper
+from django.db.models import Count, Q, Sum
 from django.utils import timezone
 from datetime import timedelta
-from django.db.models.functions import Cast, Log
+from django.conf import settings
 from books.models import Book, Author, Genre, DownloadLog, BookView, Favorite
+from analytics.models import DailyBookStats, ArchivedDownloadPair, HLLSketch
+from analytics import sketches
+from analytics.stats import (
+    count_by_book, downloader_counts, grouped, log_norm, max_or_one, top_by_score, view_counts,
+)
+from library.concurrency import get_pool, run_concurrently, run_with_timeouts
+from library.routers import analytics_db_enabled
 import math
-from django.db.models import Value
-from django.db.models.functions import Ln, Sqrt
-def dashboard(request):
-    """
-    Страница аналитики сайта (Обзор)
-    """
 
-    now = timezone.now()
-    week_ago = now - timedelta(days=7)
+logger = logging.getLogger(__name__)
+
 
-    # =========================
-    # БЛОК 1. KPI
-    # =========================
+# =========================
+# Блоки дашборда.
+# Каждый блок независим и возвращает свою часть контекста.
+# Счётчики берутся из журналов группировкой по book_id (журналы могут жить
+# в базе 'analytics'), книги и жанры — отдельным запросом по id.
+# Счётчики за всё время включают архив (analytics.stats.view_counts, downloader_counts).
+# Рейтинги считаются и сортируются в базах (ranking + top_by_score):
+# в Python попадают только верхушки рейтингов и строки топа.
+# =========================
 
+def kpi_block(now):
+    """
+    БЛОК 1. KPI
+    """
     total_books = Book.objects.filter(is_active=True).count()
     total_authors = Author.objects.count()
 
-    total_views = BookView.objects.count()
-    total_downloads = DownloadLog.objects.filter(status='success').values('user', 'book').distinct().count()  # Суммируем уникальные пары (пользователь + книга)
-    # =========================
-    # БЛОК 2. КНИГА НЕДЕЛИ (ТОЛЬКО ЗА 7 ДНЕЙ)
-    # =========================
+    # Живые логи + агрегаты заархивированных событий (archive_events)
+    archived_views = DailyBookStats.objects.aggregate(n=Sum('views'))['n'] or 0
+    total_views = BookView.objects.count() + archived_views
+    if settings.ANALYTICS_APPROXIMATE_COUNTS:
+        # Оценка по HLL-скетчу пар (пользователь, книга), ошибка ~1.6 %
+        total_downloads = sketches.estimate(HLLSketch.DOWNLOAD_PAIRS)
+    else:
+        total_downloads = (  # Суммируем уникальные пары (пользователь + книга)
+            DownloadLog.objects.filter(status='success').values('user', 'book').order_by()
+                .union(ArchivedDownloadPair.objects.values('user', 'book').order_by())
+                .count()
+        )
 
-    weekly_books = (
-        Book.objects
-            .filter(is_active=True)
-            .annotate(
-            weekly_downloads=Count(
-                'download_logs__user',
-                filter=Q(download_logs__created_at__gte=week_ago),
-                distinct=True
-            ),
-            weekly_views=Count(
-                'view_logs',
-                filter=Q(view_logs__created_at__gte=week_ago),
-                distinct=True
-            ),
-            weekly_favorites=Count(  # Новый: подсчёт избранного за неделю
-                'favorited_by',
-                filter=Q(favorited_by__created_at__gte=week_ago),
-                distinct=True
+    return {
+        'total_books': total_books,
+        'total_authors': total_authors,
+        'total_views': total_views,
+        'total_downloads': total_downloads,
+        'approximate_counts': settings.ANALYTICS_APPROXIMATE_COUNTS,
+    }
+
+
+def ranking(counts, score, min_count=None):
+    """
+    Рейтинг для top_by_score по счётчику counts (analytics.stats.BookCounts),
+    который считается и сортируется в своей базе.
+    score — неубывающая функция от n (поэтому порядок по n — это порядок по score),
+    min_count — книги с n меньше порога в рейтинг не попадают (HAVING).
+    """
+    def rank(book_ids=None):
+        if book_ids is None:
+            rows = counts.ranked(min_count)
+        else:
+            rows = counts.for_books(book_ids).as_dict(min_count).items()
+        return ((book_id, score(n)) for book_id, n in rows)
+    return rank
+
+
+def book_of_week_block(now):
+    """
+    БЛОК 2. КНИГА НЕДЕЛИ (ТОЛЬКО ЗА 7 ДНЕЙ)
+    score = просмотры * 1 + избранное * 3 + скачивания * 6
+    """
+    week_ago = now - timedelta(days=7)
+
+    # За неделю архива нет (archive_events уносит только старые дни) — только журналы
+    parts = {
+        # Журналы — в базе 'analytics'
+        'views': ranking(
+            grouped(BookView.objects.filter(created_at__gte=week_ago), Count('id')),
+            lambda n: n * 1,  # Вес 1 для просмотров
+        ),
+        'downloads': ranking(
+            grouped(DownloadLog.objects.filter(created_at__gte=week_ago), Count('user_id', distinct=True)),
+            lambda n: n * 6,  # Вес 6 для скачиваний
+        ),
+        # Активные книги и избранное — в основной базе
+        'favorites': ranking(
+            grouped(
+                Book.objects.filter(is_active=True),
+                Count('favorited_by', filter=Q(favorited_by__created_at__gte=week_ago)),
+                key='id',
             ),
-        )
-            .annotate(
-            total_downloads=Count('download_logs__user', distinct=True)
-        )
-            .annotate(
-            score=F('weekly_views') * 1 +  # Вес 1 для просмотров
-                  F('weekly_favorites') * 3 +  # Вес 3 для избранного (новый)
-                  F('weekly_downloads') * 6  # Вес 6 для скачиваний
-        )
-            .order_by('-score', '-weekly_downloads')
-    )
+            lambda n: n * 3,  # Вес 3 для избранного
+        ),
+    }
+    top = top_by_score(parts, limit=1, required=['favorites'])
+    if not top:
+        return {'book_of_week': None}
 
-    best_book = weekly_books.first()
+    best_id, best_score = top[0]
+    if not best_score:
+        # За неделю активности нет — как и раньше, берём самую новую книгу
+        best_id = Book.objects.filter(is_active=True).order_by('-pk').values_list('pk', flat=True).first()
 
-    # =========================
-    # НОВЫЙ БЛОК: КНИГА, ВЫБРАННАЯ ЧИТАТЕЛЯМИ (по общему числу избранного)
-    # =========================
-    readers_choice_qs = (
+    best_book = Book.objects.prefetch_related('authors').get(pk=best_id)
+    best_book.weekly_views = count_by_book(
+        BookView.objects.filter(created_at__gte=week_ago), book_ids=[best_id]
+    ).get(best_id, 0)
+    best_book.weekly_downloads = count_by_book(
+        DownloadLog.objects.filter(created_at__gte=week_ago), 'user_id', distinct=True, book_ids=[best_id]
+    ).get(best_id, 0)
+    best_book.weekly_favorites = count_by_book(
+        Favorite.objects.filter(created_at__gte=week_ago), book_ids=[best_id]
+    ).get(best_id, 0)
+    best_book.score = best_book.weekly_views + best_book.weekly_favorites * 3 + best_book.weekly_downloads * 6
+
+    return {'book_of_week': best_book}
+
+
+def readers_choice_block(now):
+    """
+    КНИГА, ВЫБРАННАЯ ЧИТАТЕЛЯМИ (по общему числу избранного)
+    Избранное в основной базе — считаем одним запросом с JOIN'ом.
+    """
+    first = (
         Book.objects
             .filter(is_active=True)
-            .annotate(
-            total_favorites=Count('favorited_by', distinct=True),
-            total_views=Count('view_logs', distinct=True),
-            total_downloads=Count('download_logs__user', distinct=True),
-        )
-        .filter(total_favorites__gte=2)
+            .annotate(total_favorites=Count('favorited_by', distinct=True))
+            .filter(total_favorites__gte=2)
             .order_by('-total_favorites', '-created_at')
+            .prefetch_related('authors')
+            .first()
     )
-
-    first = readers_choice_qs.first()
     readers_choice = first if first and first.total_favorites > 0 else None
 
-    # =========================
-    # БЛОК 3. ОБЩИЙ ТОП-5 КНИГ (С НОРМАЛИЗАЦИЕЙ)
-    # =========================
+    return {'readers_choice': readers_choice}
 
-    books_all = (
-        Book.objects
-            .filter(is_active=True)
-            .annotate(
-            total_downloads=Count('download_logs__user', distinct=True),
-            total_views=Count('view_logs', distinct=True),
-            total_favorites=Count('favorited_by', distinct=True),
-        )
-    )
 
-    # Сначала считаем max по ВСЕМ книгам
-    max_views = books_all.aggregate(Max('total_views'))['total_views__max'] or 1
-    max_downloads = books_all.aggregate(Max('total_downloads'))['total_downloads__max'] or 1
-    max_favorites = books_all.aggregate(Max('total_favorites'))['total_favorites__max'] or 1
-
-    # Теперь фильтр
-    books_filtered = books_all.filter(total_downloads__gte=3)
-
-    # Нормализованный score
-    top_books = (
-        books_filtered
-            .annotate(
-            views_norm=ExpressionWrapper(
-                Ln(F('total_views') + 1) / Ln(max_views + 1),
-                output_field=FloatField()
-            ),
-            downloads_norm=ExpressionWrapper(
-                Ln(F('total_downloads') + 1) / Ln(max_downloads + 1),
-                output_field=FloatField()
-            ),
-            favorites_norm=ExpressionWrapper(
-                Ln(F('total_favorites') + 1) / Ln(max_favorites + 1),
-                output_field=FloatField()
-            ),
-        )
-            .annotate(
-            score=ExpressionWrapper(
-                F('views_norm') * 1 +
-                F('favorites_norm') * 3 +
-                F('downloads_norm') * 6,
-                output_field=FloatField()
-            )
-        )
-            .order_by('-score')[:5]
-    )
+def top_books_block(now):
+    """
+    БЛОК 3. ОБЩИЙ ТОП-5 КНИГ (С НОРМАЛИЗАЦИЕЙ)
+    score = ln(v+1)/ln(max_v+1) * 1 + ln(f+1)/ln(max_f+1) * 3 + ln(d+1)/ln(max_d+1) * 6,
+    максимумы — по активным книгам, в топ попадают книги от 3 скачавших.
+    """
+    views = view_counts()
+    downloads = downloader_counts(DownloadLog.objects.all())
+    favorites = grouped(Book.objects.filter(is_active=True), Count('favorited_by'), key='id')
 
-    best_book_overall = top_books[0] if top_books else None
-    # =========================
-    # БЛОК 4. ТОП-5 ЖАНРОВ (СРЕДНИЙ SCORE КНИГ)
-    # =========================
+    # Неактивных книг немного — исключаем их из максимумов в базе журналов
+    inactive_ids = Book.objects.filter(is_active=False).values_list('pk', flat=True)
+    if analytics_db_enabled():
+        inactive_ids = list(inactive_ids)
+    max_views = views.exclude(book_id__in=inactive_ids).max() or 1
+    max_downloads = downloads.exclude(book_id__in=inactive_ids).max() or 1
+    max_favorites = favorites.max() or 1
 
-    genres_all = (
+    def norm(weight, max_value):
+        return lambda n: log_norm(n, max_value) * weight
+
+    parts = {
+        'views': ranking(views, norm(1, max_views)),
+        'downloads': ranking(downloads, norm(6, max_downloads), min_count=3),
+        'favorites': ranking(favorites, norm(3, max_favorites)),
+    }
+    top = top_by_score(parts, limit=5, required=['downloads', 'favorites'])
+
+    top_ids = [book_id for book_id, _ in top]
+    books_by_id = Book.objects.in_bulk(top_ids)
+    # Ещё раз по книгам топа: в рейтинге были только score
+    downloads = downloads.for_books(top_ids).as_dict()
+    views = views.for_books(top_ids).as_dict()
+    favorites = count_by_book(Favorite.objects.all(), book_ids=top_ids)
+
+    top_books = []
+    for book_id, score in top:
+        book = books_by_id[book_id]
+        book.total_views = views.get(book_id, 0)
+        book.total_downloads = downloads.get(book_id, 0)
+        book.total_favorites = favorites.get(book_id, 0)
+        book.score = score
+        top_books.append(book)
+
+    return {
+        'top_books': top_books,
+        'best_book_overall': top_books[0] if top_books else None,
+    }
+
+
+def top_genres_block(now):
+    """
+    БЛОК 4. ТОП-5 ЖАНРОВ (СРЕДНИЙ SCORE КНИГ)
+    Счётчики жанров — суммы счётчиков их книг за всё время (с архивом):
+    скачавший несколько книг жанра считается у каждой из них.
+    Суммы считает база журналов (BookCounts.by_genre), списки книг жанров в запрос не идут.
+    """
+    genres = (
         Genre.objects
-            .annotate(
-            total_downloads=Count('books__download_logs__user', distinct=True),
-            total_views=Count('books__view_logs', distinct=True),
-            total_favorites=Count('books__favorited_by', distinct=True),
-            books_count=Count('books', distinct=True)  # Возвращаем books_count
-        )
+            .annotate(total_favorites=Count('books__favorited_by'), books_count=Count('books', distinct=True))
+            .values_list('id', 'total_favorites', 'books_count')
     )
 
-    max_g_views = genres_all.aggregate(Max('total_views'))['total_views__max'] or 1
-    max_g_downloads = genres_all.aggregate(Max('total_downloads'))['total_downloads__max'] or 1
-    max_g_favorites = genres_all.aggregate(Max('total_favorites'))['total_favorites__max'] or 1
+    totals = {
+        genre_id: {'total_views': 0, 'total_downloads': 0, 'total_favorites': favorites, 'books_count': books_count}
+        for genre_id, favorites, books_count in genres
+    }
+    for name, counts in (
+        ('total_views', view_counts()),
+        ('total_downloads', downloader_counts(DownloadLog.objects.all())),
+    ):
+        for genre_id, n in counts.by_genre().items():
+            if genre_id in totals:
+                totals[genre_id][name] = n
+
+    max_g_views = max_or_one(t['total_views'] for t in totals.values())
+    max_g_downloads = max_or_one(t['total_downloads'] for t in totals.values())
+    max_g_favorites = max_or_one(t['total_favorites'] for t in totals.values())
 
-    top_genres = (
-        genres_all
-            .annotate(
-            views_norm=ExpressionWrapper(
-                Ln(F('total_views') + 1) / Ln(max_g_views + 1),
-                output_field=FloatField()
-            ),
-            downloads_norm=ExpressionWrapper(
-                Ln(F('total_downloads') + 1) / Ln(max_g_downloads + 1),
-                output_field=FloatField()
-            ),
-            favorites_norm=ExpressionWrapper(
-                Ln(F('total_favorites') + 1) / Ln(max_g_favorites + 1),
-                output_field=FloatField()
-            ),
-        )
-            .annotate(
-            genre_score=ExpressionWrapper(
-                (F('views_norm') * 1 +
-                 F('favorites_norm') * 3 +
-                 F('downloads_norm') * 6)
-                / Sqrt(Cast(F('books_count'), FloatField())),
-                output_field=FloatField()
-            )
-        )
-            .order_by('-genre_score')[:5]
+    for t in totals.values():
+        if not t['books_count']:
+            t['genre_score'] = 0.0
+            continue
+        t['genre_score'] = (
+            log_norm(t['total_views'], max_g_views) * 1 +
+            log_norm(t['total_favorites'], max_g_favorites) * 3 +
+            log_norm(t['total_downloads'], max_g_downloads) * 6
+        ) / math.sqrt(t['books_count'])
+
+    top_ids = sorted(totals, key=lambda g: -totals[g]['genre_score'])[:5]
+    genres_by_id = Genre.objects.in_bulk(top_ids)
+
+    top_genres = []
+    for genre_id in top_ids:
+        genre = genres_by_id[genre_id]
+        for name, value in totals[genre_id].items():
+            setattr(genre, name, value)
+        top_genres.append(genre)
+
+    return {'top_genres': top_genres}
+
+
+DASHBOARD_BLOCKS = [
+    kpi_block,
+    book_of_week_block,
+    readers_choice_block,
+    top_books_block,
+    top_genres_block,
+]
+
+
+def block_name(block):
+    return block.__name__.removesuffix('_block')
+
+
+def parallel_blocks(now):
+    """
+    Блоки в ограниченном пуле потоков (DASHBOARD_PARALLEL), у каждого своё
+    соединение и свой таймаут. Не уложившийся или упавший блок не роняет
+    страницу: его панель выводится как «временно недоступно».
+    Возвращает (контекст, множество имён недоступных блоков).
+    """
+    pool = get_pool('dashboard', settings.DASHBOARD_MAX_WORKERS)
+    results = run_with_timeouts(
+        pool,
+        {block_name(block): partial(block, now) for block in DASHBOARD_BLOCKS},
+        settings.DASHBOARD_BLOCK_TIMEOUT,
     )
 
+    context, unavailable = {}, set()
+    for name, result in results.items():
+        if result.ok:
+            context.update(result.value)
+            continue
+        unavailable.add(name)
+        if result.status == 'error':
+            logger.error('Блок дашборда %s упал', name, exc_info=result.error)
 
-    context = {
-        'total_books': total_books,
-        'total_authors': total_authors,
-        'total_views': total_views,
-        'total_downloads': total_downloads,
-        'book_of_week': best_book,
-        'top_books': top_books,
-        'best_book_overall': best_book_overall,
-        'top_genres': top_genres,
-        'readers_choice': readers_choice,
-    }
+    record = json.dumps({
+        'blocks': {name: round(result.elapsed * 1000, 1) for name, result in results.items()},
+        'unavailable': sorted(unavailable),
+    })
+    if unavailable:
+        logger.warning(record)
+    else:
+        logger.info(record)
+    return context, unavailable
+
+
+def dashboard(request):
+    """
+    Страница аналитики сайта (Обзор)
+    """
+
+    now = timezone.now()
+
+    if settings.DASHBOARD_PARALLEL:
+        context, unavailable = parallel_blocks(now)
+    else:
+        context, unavailable = {}, set()
+        for block in DASHBOARD_BLOCKS:
+            context.update(block(now))
+    context['unavailable'] = unavailable
+
+    return render(request, 'analytics/dashboard.html', context)
+
+
+async def dashboard_async(request):
+    """
+    То же, что dashboard, для library.asgi: блоки выполняются одновременно,
+    каждый на своём соединении, — время ответа равно самому медленному блоку,
+    а не сумме всех.
+    """
+    now = timezone.now()
+
+    context = {}
+    for part in await run_concurrently(*(partial(block, now) for block in DASHBOARD_BLOCKS)):
+        context.update(part)
 
-    return render(request, 'analytics/dashboard.html', context)
\ No newline at end of file
+    # Контекст-процессоры шаблона читают request.user (запрос к БД) — рендер синхронный
+    return await sync_to_async(render)(request, 'analytics/dashboard.html', context)
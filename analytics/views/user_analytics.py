@@ -1,18 +1,42 @@
 # analytics/user_analytics.py
 
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, F, Q, Max, ExpressionWrapper, FloatField
-from django.db.models.functions import TruncMonth
-from django.utils.timezone import now
-from datetime import timedelta
+from django.db.models import Count, Q
 from django.shortcuts import render
-import json
-import math
-from django.db.models import Value
-from django.db.models.functions import Ln
 from books.models import Book, Favorite, DownloadLog, BookView, Genre, Author
 from django.db.models.functions import TruncDate
-from datetime import date
+from analytics.stats import (
+    count_by_book, attach_unique_downloads, genre_books, log_norm, max_or_one, unique_downloads_by_book,
+    views_by_book,
+)
+
+# Журналы (DownloadLog, BookView) могут жить в базе 'analytics' —
+# никаких JOIN'ов журналов с книгами/жанрами, только выборки по id.
+
+
+def _rank_books(book_ids, downloads, views, favorites, maxes, limit):
+    """
+    id книг с наибольшим нормализованным score (views*1 + favorites*3 + downloads*6).
+    """
+    max_views, max_downloads, max_favorites = maxes
+
+    def score(book_id):
+        return (
+            log_norm(views.get(book_id, 0), max_views) * 1 +
+            log_norm(favorites.get(book_id, 0), max_favorites) * 3 +
+            log_norm(downloads.get(book_id, 0), max_downloads) * 6
+        )
+
+    return sorted(book_ids, key=lambda b: -score(b))[:limit]
+
+
+def _load_books(book_ids):
+    """
+    Книги для карточек в порядке book_ids (+ unique_downloads).
+    """
+    books = Book.objects.prefetch_related('authors', 'genres').in_bulk(book_ids)
+    return attach_unique_downloads(books[b] for b in book_ids if b in books)
+
 
 @login_required
 def profile_analytics(request):
@@ -52,14 +76,24 @@ def profile_analytics(request):
     )
     active_days = len(days)
 
-    # Любимый автор (по количеству скачиваний книг этого автора)
-    favorite_author = (
-        downloads
-            .values('book__authors__name', 'book__authors__slug')
-            .annotate(cnt=Count('book', distinct=True))  # Изменено: Count уникальных книг (book), а не логов (id)
+    downloaded_book_ids = set(downloads.order_by().values_list('book_id', flat=True).distinct())
+
+    # Любимый автор (по количеству уникальных скачанных книг этого автора)
+    author = (
+        Author.objects
+            .filter(books__id__in=downloaded_book_ids)
+            .annotate(cnt=Count('books', filter=Q(books__id__in=downloaded_book_ids), distinct=True))
             .order_by('-cnt')
+            .values('name', 'slug', 'cnt')
             .first()
     )
+    favorite_author = None
+    if author:
+        favorite_author = {
+            'book__authors__name': author['name'],
+            'book__authors__slug': author['slug'],
+            'cnt': author['cnt'],
+        }
 
     # ==================================================
     # 📚 ЛЮБИМЫЕ ФОРМАТЫ КНИГ (корректно)
@@ -78,17 +112,32 @@ def profile_analytics(request):
 
     # ----------------------------
     # ТОП-5 ЖАНРОВ ПОЛЬЗОВАТЕЛЯ
+    # Считаем уникальные книги пользователя в каждом жанре
     # ----------------------------
-    user_genres = Genre.objects.annotate(
-        user_downloads=Count('books__download_logs__book', filter=Q(books__download_logs__user=user), distinct=True),
-        # Изменено: Count уникальных книг (book) для скачиваний
-        user_views=Count('books__view_logs__book', filter=Q(books__view_logs__user=user), distinct=True),
-        # Аналогично для просмотров
-        user_favorites=Count('books__favorited_by__book', filter=Q(books__favorited_by__user=user), distinct=True),
-        # Для избранного (Favorite уже unique, но distinct на всякий)
-    ).annotate(
-        score=F('user_views') * 1 + F('user_favorites') * 3 + F('user_downloads') * 6
-    ).filter(score__gt=0).order_by('-score', '-user_downloads', '-user_favorites', '-user_views')[:5]
+    user_download_books = set(
+        DownloadLog.objects.filter(user=user).order_by().values_list('book_id', flat=True).distinct()
+    )
+    user_view_books = set(views.order_by().values_list('book_id', flat=True).distinct())
+    user_favorite_books = set(Favorite.objects.filter(user=user).values_list('book_id', flat=True))
+
+    genre_scores = {}
+    for genre_id, book_ids in genre_books().items():
+        book_ids = set(book_ids)
+        user_downloads = len(book_ids & user_download_books)
+        user_views = len(book_ids & user_view_books)
+        user_favorites = len(book_ids & user_favorite_books)
+        score = user_views * 1 + user_favorites * 3 + user_downloads * 6
+        if score > 0:
+            genre_scores[genre_id] = (score, user_downloads, user_favorites, user_views)
+
+    top_genre_ids = sorted(genre_scores, key=lambda g: tuple(-x for x in genre_scores[g]))[:5]
+    genres_by_id = Genre.objects.in_bulk(top_genre_ids)
+
+    user_genres = []
+    for genre_id in top_genre_ids:
+        genre = genres_by_id[genre_id]
+        genre.score, genre.user_downloads, genre.user_favorites, genre.user_views = genre_scores[genre_id]
+        user_genres.append(genre)
 
     favorite_genres = [{'name': g.name, 'slug': g.slug, 'cnt': g.score, 'views': g.user_views, 'downloads': g.user_downloads, 'favorites': g.user_favorites} for g in user_genres]  # Добавили views, downloads, favorites для шаблона
 
@@ -99,111 +148,74 @@ def profile_analytics(request):
     # ----------------------------
     # Глобальная статистика
     # ----------------------------
-    books_global = Book.objects.filter(is_active=True).annotate(
-        total_downloads=Count(
-            'download_logs__user',
-            filter=Q(download_logs__status='success'),
-            distinct=True
-        ),
-        total_views=Count('view_logs', distinct=True),
-        total_favorites=Count('favorited_by', distinct=True),
-    )
+    active_ids = list(Book.objects.filter(is_active=True).values_list('id', flat=True))
 
-    max_views = books_global.aggregate(Max('total_views'))['total_views__max'] or 1
-    max_downloads = books_global.aggregate(Max('total_downloads'))['total_downloads__max'] or 1
-    max_favorites = books_global.aggregate(Max('total_favorites'))['total_favorites__max'] or 1
+    # За всё время, включая архив
+    global_downloads = unique_downloads_by_book()
+    global_views = views_by_book()
+    global_favorites = count_by_book(Favorite.objects.all())
 
+    maxes = (
+        max_or_one(global_views.get(b, 0) for b in active_ids),
+        max_or_one(global_downloads.get(b, 0) for b in active_ids),
+        max_or_one(global_favorites.get(b, 0) for b in active_ids),
+    )
 
-    # ----------------------------
-    # Функция аннотации с нормализацией
-    # ----------------------------
-    def annotate_with_score(queryset):
-        return queryset.annotate(
-            views_norm=ExpressionWrapper(
-                Ln(F('total_views') + 1) / Ln(max_views + 1),
-                output_field=FloatField()
-            ),
-            downloads_norm=ExpressionWrapper(
-                Ln(F('total_downloads') + 1) / Ln(max_downloads + 1),
-                output_field=FloatField()
-            ),
-            favorites_norm=ExpressionWrapper(
-                Ln(F('total_favorites') + 1) / Ln(max_favorites + 1),
-                output_field=FloatField()
-            ),
-            unique_downloads=Count('download_logs__user', filter=Q(download_logs__status='success'), distinct=True),
-        ).annotate(
-            score=ExpressionWrapper(
-                F('views_norm') * 1 +
-                F('favorites_norm') * 3 +
-                F('downloads_norm') * 6,
-                output_field=FloatField()
-            )
-        ).order_by('-score')
+    def genre_candidates(genre_ids):
+        """
+        Активные нескачанные книги жанров + их счётчики (скачивания любого статуса).
+        """
+        book_ids = set(
+            Book.objects.filter(is_active=True, genres__in=genre_ids)
+                .exclude(id__in=downloaded_book_ids)
+                .values_list('id', flat=True)
+        )
+        all_downloads = count_by_book(DownloadLog.objects.all(), 'user_id', distinct=True, book_ids=book_ids)
+        return sorted(book_ids), all_downloads
 
-    # ----------------------------
-    # Исключаем уже скачанные книги
-    # ----------------------------
-    downloaded_book_ids = downloads.values_list('book_id', flat=True).distinct()
     # ==================================================
     # РЕЖИМ 1 — ХОЛОДНЫЙ СТАРТ
     # ==================================================
 
     if total_actions == 0:
 
-        recommended_books = annotate_with_score(
-            books_global
-        )[:3]
+        recommended_ids = _rank_books(
+            active_ids, global_downloads, global_views, global_favorites, maxes, 3
+        )
     # ==================================================
     # РЕЖИМ 2 — МЯГКАЯ ПЕРСОНАЛИЗАЦИЯ
     # ==================================================
     elif total_actions < 8:
-        top_user_genre = user_genres.first()
-
-        personal_books = Book.objects.filter(
-            is_active=True,
-            genres=top_user_genre
-        ).exclude(
-            id__in=downloaded_book_ids
-        ).annotate(
-            total_downloads=Count('download_logs__user', distinct=True),
-            total_views=Count('view_logs', distinct=True),
-            total_favorites=Count('favorited_by', distinct=True),
-        )
-
-        personal_books = annotate_with_score(personal_books)[:2]
+        personal_ids = []
+        if user_genres:
+            candidates, all_downloads = genre_candidates([user_genres[0].pk])
+            personal_ids = _rank_books(
+                candidates, all_downloads, global_views, global_favorites, maxes, 2
+            )
 
-        global_books = annotate_with_score(
-            books_global.exclude(id__in=downloaded_book_ids)
-        )[:2]
+        global_ids = _rank_books(
+            [b for b in active_ids if b not in downloaded_book_ids],
+            global_downloads, global_views, global_favorites, maxes, 2
+        )
         # объединяем без дубликатов
-        recommended_books = list(personal_books)
+        recommended_ids = list(personal_ids)
 
-        for book in global_books:
-            if book not in recommended_books:
-                recommended_books.append(book)
+        for book_id in global_ids:
+            if book_id not in recommended_ids:
+                recommended_ids.append(book_id)
 
-        recommended_books = recommended_books[:3]
+        recommended_ids = recommended_ids[:3]
 
     # ==================================================
     # РЕЖИМ 3 — ПОЛНАЯ ПЕРСОНАЛИЗАЦИЯ
     # ==================================================
     else:
-        top_user_genres = user_genres[:2]
-
-        recommended_books = Book.objects.filter(
-            is_active=True,
-            genres__in=top_user_genres
-        ).distinct() \
-            .exclude(
-            id__in=downloaded_book_ids
-        ).annotate(
-            total_downloads=Count('download_logs__user', distinct=True),
-            total_views=Count('view_logs', distinct=True),
-            total_favorites=Count('favorited_by', distinct=True),
+        candidates, all_downloads = genre_candidates([g.pk for g in user_genres[:2]])
+        recommended_ids = _rank_books(
+            candidates, all_downloads, global_views, global_favorites, maxes, 3
         )
-        recommended_books = annotate_with_score(recommended_books)[:3]
 
+    recommended_books = _load_books(recommended_ids)
 
 
     context = {
@@ -216,4 +228,4 @@ def profile_analytics(request):
         'formats_map': formats_map,
     }
 
-    return render(request, 'analytics/profile_analytics.html', context)
\ No newline at end of file
+    return render(request, 'analytics/profile_analytics.html', context)
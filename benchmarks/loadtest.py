@@ -0,0 +1,340 @@
+# benchmarks/loadtest.py
+"""
+Нагрузочный тест: тысячи виртуальных пользователей на asyncio.
+
+- HTTP/1.1-клиент на asyncio-потоках (keep-alive, cookies), без сторонних пакетов;
+- виртуальный пользователь в цикле выбирает действие по весам смеси трафика
+  и «думает» случайное время (экспоненциальное распределение);
+- вошедшие пользователи получают готовую сессию (make_sessions), чтобы не
+  замерять хэширование паролей при входе; несколько виртуальных пользователей
+  могут делить один аккаунт — так воспроизводятся гонки двойного клика;
+- время БД и число SQL по каждому запросу берутся из заголовка Server-Timing
+  (library/instrumentation.py, нужен SQL_INSTRUMENTATION=1 на сервере).
+"""
+
+import asyncio
+import random
+import re
+import time
+from importlib import import_module
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+
+from benchmarks.runner import percentile
+
+# Границы корзин гистограммы латентности, мс
+HISTOGRAM_BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+# Смесь трафика: действие → вес
+DEFAULT_MIX = {
+    'catalog': 30,
+    'catalog_filtered': 10,
+    'book_detail': 25,
+    'record_view': 15,
+    'search': 8,
+    'author_list': 2,
+    'dashboard': 2,
+    'favorite_toggle': 4,
+    'download_book': 4,
+}
+# Действия, доступные только вошедшим (анонимы вместо них открывают книгу)
+LOGIN_REQUIRED = {'favorite_toggle', 'download_book'}
+
+SERVER_TIMING_DB = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+def parse_mix(value):
+    """
+    'catalog=40,book_detail=30' → {'catalog': 40, 'book_detail': 30}
+    """
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise ValueError(f'Неизвестное действие: {name}')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def make_sessions(users):
+    """
+    Готовые сессии для вошедших виртуальных пользователей → список sessionid.
+    """
+    store = import_module(settings.SESSION_ENGINE).SessionStore
+    keys = []
+    for user in users:
+        session = store()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        keys.append(session.session_key)
+    return keys
+
+
+# ---------------------------------------
+# HTTP-клиент
+# ---------------------------------------
+class HttpClient:
+    """
+    Одно соединение keep-alive + cookie-jar одного виртуального пользователя.
+    """
+
+    def __init__(self, base_url, cookies=None):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.cookies = dict(cookies or {})
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=b'', headers=None):
+        reused = self.writer is not None
+        if not reused:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            return await self._exchange(method, path, body, headers or {})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            await self.close()
+            if not reused:
+                raise
+        # Сервер закрыл keep-alive соединение между запросами — повторяем на новом
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        return await self._exchange(method, path, body, headers or {})
+
+    async def _exchange(self, method, path, body, headers):
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}']
+        if self.cookies:
+            lines.append('Cookie: ' + '; '.join(f'{k}={v}' for k, v in self.cookies.items()))
+        if body or method in ('POST', 'PUT'):
+            lines.append(f'Content-Length: {len(body)}')
+        lines.extend(f'{k}: {v}' for k, v in headers.items())
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('соединение закрыто')
+        version, status = status_line.split()[:2]
+
+        response_headers = []
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers.append((name.strip().lower(), value.strip()))
+        header_map = dict(response_headers)
+
+        if 'content-length' in header_map:
+            content = await self.reader.readexactly(int(header_map['content-length']))
+        elif header_map.get('transfer-encoding') == 'chunked':
+            content = await self._read_chunked()
+        else:
+            content = await self.reader.read()
+
+        for name, value in response_headers:
+            if name == 'set-cookie':
+                self._store_cookie(value)
+
+        if version == b'HTTP/1.0' or header_map.get('connection', '').lower() == 'close' \
+                or 'content-length' not in header_map and 'transfer-encoding' not in header_map:
+            await self.close()
+
+        return int(status), header_map, content
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await self.reader.readline()
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readline()
+
+    def _store_cookie(self, header):
+        pair, _, attributes = header.partition(';')
+        name, _, value = pair.partition('=')
+        name, value = name.strip(), value.strip().strip('"')
+        if not value or 'max-age=0' in attributes.lower():
+            self.cookies.pop(name, None)
+        else:
+            self.cookies[name] = value
+
+
+# ---------------------------------------
+# Статистика
+# ---------------------------------------
+class EndpointStats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.statuses = {}
+        self.db_ms = 0.0
+        self.queries = 0
+        self.timed = 0
+
+    def add(self, elapsed_ms, status, headers):
+        self.latencies.append(elapsed_ms)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status >= 400 and status != 404:
+            self.errors += 1
+        match = SERVER_TIMING_DB.search(headers.get('server-timing', ''))
+        if match:
+            self.db_ms += float(match.group(1))
+            self.queries += int(match.group(2))
+            self.timed += 1
+
+    def add_failure(self):
+        self.errors += 1
+        self.statuses['exception'] = self.statuses.get('exception', 0) + 1
+
+    def summary(self, duration):
+        requests = sum(self.statuses.values())
+        latencies = self.latencies or [0]
+        histogram = {}
+        for bound in HISTOGRAM_BUCKETS + [None]:
+            label = f'<{bound}' if bound is not None else f'>={HISTOGRAM_BUCKETS[-1]}'
+            histogram[label] = 0
+        for value in self.latencies:
+            for bound in HISTOGRAM_BUCKETS:
+                if value < bound:
+                    histogram[f'<{bound}'] += 1
+                    break
+            else:
+                histogram[f'>={HISTOGRAM_BUCKETS[-1]}'] += 1
+        return {
+            'requests': requests,
+            'rps': round(requests / duration, 1) if duration else 0,
+            'error_rate': round(self.errors / requests, 4) if requests else 0,
+            'statuses': {str(k): v for k, v in sorted(self.statuses.items(), key=str)},
+            'p50_ms': round(percentile(latencies, 50), 1),
+            'p90_ms': round(percentile(latencies, 90), 1),
+            'p99_ms': round(percentile(latencies, 99), 1),
+            'max_ms': round(max(latencies), 1),
+            'histogram_ms': histogram,
+            'avg_queries': round(self.queries / self.timed, 1) if self.timed else None,
+            'avg_db_ms': round(self.db_ms / self.timed, 1) if self.timed else None,
+        }
+
+
+# ---------------------------------------
+# Виртуальный пользователь
+# ---------------------------------------
+class VirtualUser:
+    def __init__(self, client, data, mix, rng, logged_in):
+        self.client = client
+        self.data = data
+        self.rng = rng
+        self.logged_in = logged_in
+        names = [n for n in mix if logged_in or n not in LOGIN_REQUIRED]
+        self.actions = names
+        self.weights = [mix[n] for n in names]
+
+    def pick_book(self):
+        return self.data['books'].sample(self.rng, 1)[0]
+
+    async def csrf_headers(self):
+        if 'csrftoken' not in self.client.cookies:
+            # Страница книги содержит {% csrf_token %} — сервер выставит cookie
+            await self.client.request('GET', f"/catalog/{self.data['slugs'][self.pick_book()]}/")
+        return {
+            'X-CSRFToken': self.client.cookies.get('csrftoken', ''),
+            'Content-Type': 'application/x-www-form-urlencoded',
+        }
+
+    async def action(self, name):
+        """
+        Возвращает (method, path, body, headers) для действия name.
+        """
+        data = self.data
+        if name == 'catalog':
+            return 'GET', f"/catalog/?page={self.rng.randint(1, data['last_page'])}", b'', {}
+        if name == 'catalog_filtered':
+            query = urlencode({'genres': self.rng.choice(data['genres'])})
+            return 'GET', f'/catalog/?{query}', b'', {}
+        if name == 'book_detail':
+            return 'GET', f"/catalog/{data['slugs'][self.pick_book()]}/", b'', {}
+        if name == 'record_view':
+            return 'POST', f'/catalog/view/{self.pick_book()}/', b'', {}
+        if name == 'search':
+            return 'GET', f"/catalog/search/?{urlencode({'q': self.rng.choice(data['words'])})}", b'', {}
+        if name == 'author_list':
+            return 'GET', '/catalog/authors/', b'', {}
+        if name == 'dashboard':
+            return 'GET', '/analytics/', b'', {}
+        if name == 'favorite_toggle':
+            headers = await self.csrf_headers()
+            return 'POST', f'/catalog/{self.pick_book()}/favorite/', b'next=/catalog/', headers
+        if name == 'download_book':
+            return 'GET', f"/catalog/{data['download_book']}/download/pdf/", b'', {}
+        raise ValueError(name)
+
+    async def run(self, stats, deadline, think_time):
+        try:
+            while time.monotonic() < deadline:
+                name = self.rng.choices(self.actions, self.weights)[0]
+                if name in LOGIN_REQUIRED and not self.logged_in:
+                    name = 'book_detail'
+                endpoint = stats.setdefault(name, EndpointStats())
+                try:
+                    method, path, body, headers = await self.action(name)
+                    started = time.perf_counter()
+                    status, response_headers, _ = await self.client.request(method, path, body, headers)
+                    endpoint.add((time.perf_counter() - started) * 1000, status, response_headers)
+                except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError):
+                    endpoint.add_failure()
+                    await self.client.close()
+                if think_time:
+                    await asyncio.sleep(min(self.rng.expovariate(1 / think_time), deadline - time.monotonic()))
+        finally:
+            await self.client.close()
+
+
+async def run_load(base_url, data, mix, sessions, users, duration, ramp_up, think_time, seed,
+                   sample_connections=None):
+    """
+    Запускает users виртуальных пользователей на duration секунд.
+    sessions — список cookie sessionid для вошедших (переиспользуются по кругу).
+    sample_connections() вызывается раз в секунду в потоке и возвращает {состояние: число}.
+    """
+    stats = {}
+    connection_samples = []
+    started = time.monotonic()
+    deadline = started + ramp_up + duration
+    rng = random.Random(seed)
+
+    async def sampler():
+        loop = asyncio.get_running_loop()
+        while time.monotonic() < deadline:
+            connection_samples.append(await loop.run_in_executor(None, sample_connections))
+            await asyncio.sleep(1)
+
+    async def start_user(i):
+        # Плавный разгон: пользователи стартуют равномерно за ramp_up секунд
+        await asyncio.sleep(ramp_up * i / max(users, 1))
+        user_rng = random.Random(rng.random())
+        logged_in = bool(sessions) and user_rng.random() < data['logged_in_share']
+        cookies = {'sessionid': sessions[i % len(sessions)]} if logged_in else {}
+        user = VirtualUser(HttpClient(base_url, cookies), data, mix, user_rng, logged_in)
+        await user.run(stats, deadline, think_time)
+
+    tasks = [asyncio.create_task(start_user(i)) for i in range(users)]
+    if sample_connections is not None:
+        tasks.append(asyncio.create_task(sampler()))
+    await asyncio.gather(*tasks)
+
+    elapsed = time.monotonic() - started
+    return stats, connection_samples, elapsed
@@ -0,0 +1,63 @@
+# benchmarks/management/commands/bench_compare.py
+"""
+Сравнивает два результата bench_views и сообщает о регрессиях.
+Завершается с ошибкой, если регрессии есть (удобно для CI).
+"""
+
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.runner import COMPARED_METRICS, compare
+
+
+def load(path):
+    try:
+        return json.loads(Path(path).read_text(encoding='utf-8'))
+    except (OSError, ValueError) as exc:
+        raise CommandError(f'Не удалось прочитать {path}: {exc}')
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает результаты бенчмарка с базовой линией'
+
+    def add_arguments(self, parser):
+        parser.add_argument('baseline', help='JSON базовой линии')
+        parser.add_argument('current', help='JSON текущего прогона')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Допустимый рост метрики (0.2 = +20 %%); число SQL сравнивается строго')
+        parser.add_argument('--metric', choices=COMPARED_METRICS, action='append',
+                            help='Какие метрики сравнивать (по умолчанию все)')
+
+    def handle(self, *args, **options):
+        baseline = load(options['baseline'])
+        current = load(options['current'])
+
+        if baseline.get('dataset') != current.get('dataset'):
+            self.stderr.write(self.style.WARNING(
+                'Наборы данных различаются — сравнение может быть некорректным'
+            ))
+
+        metrics = options['metric'] or COMPARED_METRICS
+        for name, result in current['scenarios'].items():
+            before = baseline['scenarios'].get(name)
+            if before is None:
+                self.stdout.write(f'{name:<20} нет в базовой линии')
+                continue
+            changes = '  '.join(
+                f'{metric} {before[metric]} → {result[metric]}' for metric in metrics
+                if metric in before and metric in result
+            )
+            self.stdout.write(f'{name:<20} {changes}')
+
+        regressions = compare(baseline, current, options['threshold'], metrics)
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS('Регрессий нет'))
+            return
+
+        for name, metric, old, new, growth in regressions:
+            self.stdout.write(self.style.ERROR(
+                f'РЕГРЕССИЯ {name}: {metric} {old} → {new} (+{growth:.0%})'
+            ))
+        raise CommandError(f'Найдено регрессий: {len(regressions)}')
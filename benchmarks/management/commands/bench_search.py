@@ -0,0 +1,104 @@
+# benchmarks/management/commands/bench_search.py
+"""
+Бенчмарк нечёткого поиска (books/search.py: similar) на засеянной базе.
+
+bench_views меряет страницу поиска, но повторяет один и тот же запрос —
+после прогрева он отдаётся из кэша. Здесь каждый замер — новый запрос
+(опечатка в слове названия, название с опечаткой, фамилия автора в другой
+раскладке), и similar() вызывается напрямую, мимо кэша и точного поиска.
+
+    python manage.py seed_library --preset large
+    python manage.py bench_search --queries 300
+
+Порог и таймаут — из настроек (SEARCH_FUZZY_THRESHOLD, SEARCH_FUZZY_TIMEOUT_MS);
+замер, упёршийся в таймаут, считается отдельно. «Попаданий» — доля запросов,
+в ответе на которые есть исходное слово (название, фамилия) без опечатки.
+"""
+
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from books.models import Author, Book
+from books.search import query_variants, similar
+from benchmarks.runner import percentile
+from benchmarks.scenarios import misspell, transliterate
+
+
+def sample(queryset, field, count, rng):
+    """
+    count случайных значений field (воспроизводимо при одном зерне).
+    """
+    ids = list(queryset.values_list('id', flat=True))
+    if not ids:
+        raise CommandError('База пуста — сначала выполните seed_library')
+    picked = rng.sample(ids, min(count, len(ids)))
+    return list(queryset.filter(id__in=picked).order_by('id').values_list(field, flat=True))
+
+
+# Запрос и то, что должно найтись в ответе
+def word_typo(title):
+    word = max(title.split(), key=len)
+    return misspell(word), word
+
+
+def title_typo(title):
+    words = title.split()
+    longest = max(range(len(words)), key=lambda i: len(words[i]))
+    words[longest] = misspell(words[longest])
+    return ' '.join(words), title
+
+
+def surname_translit(name):
+    surname = name.split()[-1]
+    return transliterate(surname), surname
+
+
+class Command(BaseCommand):
+    help = 'Замеряет латентность нечёткого поиска (pg_trgm) на разных запросах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200,
+                            help='Запросов на сценарий')
+        parser.add_argument('--seed', type=int, default=42,
+                            help='Зерно выборки запросов')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        books = Book.objects.filter(is_active=True)
+        titles = sample(books, 'title', options['queries'], rng)
+        names = sample(Author.objects.all(), 'name', options['queries'], rng)
+
+        scenarios = [
+            ('word_typo', books, 'title', [word_typo(t) for t in titles]),
+            ('title_typo', books, 'title', [title_typo(t) for t in titles]),
+            ('author_translit', Author.objects.all(), 'name', [surname_translit(n) for n in names]),
+        ]
+
+        timeout_ms = settings.SEARCH_FUZZY_TIMEOUT_MS
+        self.stdout.write(
+            f'{books.count()} книг; порог {settings.SEARCH_FUZZY_THRESHOLD}, '
+            f'таймаут {timeout_ms} мс, LIMIT {settings.SEARCH_FUZZY_LIMIT}'
+        )
+        for name, queryset, field, queries in scenarios:
+            # Прогрев: кэш страниц индекса и соединение
+            similar(queryset, field, query_variants(queries[0][0]))
+
+            timings, found, hits = [], [], 0
+            for query, expected in queries:
+                started = time.perf_counter()
+                results = similar(queryset, field, query_variants(query))
+                timings.append((time.perf_counter() - started) * 1000)
+                found.append(len(results))
+                hits += any(expected.casefold() in getattr(obj, field).casefold() for obj in results)
+
+            timeouts = sum(1 for ms in timings if ms >= timeout_ms)
+            self.stdout.write(
+                f'{name:<16} p50 {percentile(timings, 50):>7.1f} мс  p90 {percentile(timings, 90):>7.1f} мс  '
+                f'p99 {percentile(timings, 99):>7.1f} мс  max {max(timings):>7.1f} мс  '
+                f'найдено {statistics.fmean(found):>4.1f}  попаданий {hits / len(queries):>4.0%}  '
+                f'таймаутов {timeouts}/{len(queries)}'
+            )
@@ -0,0 +1,113 @@
+# benchmarks/management/commands/bench_views.py
+"""
+Бенчмарк ключевых представлений на текущей (засеянной) базе.
+
+    python manage.py seed_library --preset medium
+    python manage.py bench_views --output benchmarks/baseline.json
+    ... изменения ...
+    python manage.py bench_views --output benchmarks/results/current.json
+    python manage.py bench_compare benchmarks/baseline.json benchmarks/results/current.json
+
+Поиск с опечатками и транслитерацией — на каталоге из 200 тыс. книг:
+    python manage.py seed_library --preset large
+    python manage.py bench_views --scenario search --scenario search_typo --scenario search_translit
+Эти сценарии повторяют один запрос и после прогрева попадают в кэш поиска;
+латентность самого нечёткого поиска на разных запросах — bench_search.
+"""
+
+import json
+import platform
+import subprocess
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from books.models import Book, Author, BookView, DownloadLog, Favorite
+from benchmarks.runner import run_scenario
+from benchmarks.scenarios import SCENARIOS, SCENARIO_NAMES, prepare
+
+DEFAULT_OUTPUT = Path(settings.BASE_DIR) / 'benchmarks' / 'results' / 'latest.json'
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Замеряет латентность, число SQL-запросов и память ключевых представлений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', choices=SCENARIO_NAMES, action='append',
+                            help='Какие сценарии запускать (по умолчанию все)')
+        parser.add_argument('--repeat', type=int, default=30,
+                            help='Замеряемых запросов на сценарий')
+        parser.add_argument('--warmup', type=int, default=3,
+                            help='Прогревочных запросов (не учитываются)')
+        parser.add_argument('--skip-writes', action='store_true',
+                            help='Пропустить сценарии, которые пишут в базу (download_book, record_view)')
+        parser.add_argument('--host', default='localhost',
+                            help='Значение Host для запросов (должно быть в ALLOWED_HOSTS)')
+        parser.add_argument('--output', default=str(DEFAULT_OUTPUT),
+                            help='Куда записать JSON с результатами')
+
+    def handle(self, *args, **options):
+        selected = options['scenario'] or SCENARIO_NAMES
+        scenarios = [s for s in SCENARIOS if s.name in selected]
+        if options['skip_writes']:
+            scenarios = [s for s in scenarios if not s.writes]
+
+        if settings.DEBUG:
+            self.stderr.write(self.style.WARNING(
+                'DEBUG=True: отладка шаблонов и журнал запросов искажают замеры'
+            ))
+
+        try:
+            data = prepare()
+        except LookupError as exc:
+            raise CommandError(str(exc))
+
+        results = {}
+        for scenario in scenarios:
+            result = run_scenario(scenario, data, options['repeat'], options['warmup'], options['host'])
+            results[scenario.name] = result
+            self.stdout.write(
+                f"{scenario.name:<20} p50 {result['p50_ms']:>8.1f} мс  p90 {result['p90_ms']:>8.1f} мс  "
+                f"p99 {result['p99_ms']:>8.1f} мс  SQL {result['queries']:>3}  "
+                f"память {result['peak_memory_kb']:>6} КБ  HTTP {result['status']}"
+            )
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'git': git_revision(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'debug': settings.DEBUG,
+            },
+            'dataset': {
+                'books': Book.objects.count(),
+                'authors': Author.objects.count(),
+                'users': get_user_model().objects.count(),
+                'favorites': Favorite.objects.count(),
+                'views': BookView.objects.count(),
+                'downloads': DownloadLog.objects.count(),
+            },
+            'scenarios': results,
+        }
+
+        output = Path(options['output'])
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        self.stdout.write(self.style.SUCCESS(f'Результаты записаны в {output}'))
@@ -0,0 +1,122 @@
+# benchmarks/management/commands/explain_plans.py
+"""
+Планы выполнения горячих запросов ключевых представлений на засеянной базе.
+
+    python manage.py seed_library --preset medium
+    python manage.py explain_plans --output benchmarks/plans_baseline.json
+    ... новый индекс или изменённый запрос ...
+    python manage.py explain_plans --baseline benchmarks/plans_baseline.json
+
+Сообщает о последовательных сканах BookView/DownloadLog, Seq Scan без
+подходящего индекса и расхождении оценки строк с фактом (benchmarks/plans.py).
+С --baseline печатает diff изменившихся планов и завершается с ошибкой,
+если появились новые проблемы.
+"""
+
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+from django.utils import timezone
+
+from benchmarks import plans
+from benchmarks.management.commands.bench_compare import load
+from benchmarks.management.commands.bench_views import git_revision
+from benchmarks.scenarios import SCENARIOS, SCENARIO_NAMES, prepare
+from library.instrumentation import fingerprint
+
+DEFAULT_OUTPUT = Path(settings.BASE_DIR) / 'benchmarks' / 'results' / 'plans.json'
+
+
+class Command(BaseCommand):
+    help = 'Снимает EXPLAIN ANALYZE горячих запросов и сравнивает планы с базовой линией'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', choices=SCENARIO_NAMES, action='append',
+                            help='Какие сценарии разбирать (по умолчанию все)')
+        parser.add_argument('--skip-writes', action='store_true',
+                            help='Пропустить сценарии, которые пишут в базу (download_book, record_view)')
+        parser.add_argument('--host', default='localhost',
+                            help='Значение Host для запросов (должно быть в ALLOWED_HOSTS)')
+        parser.add_argument('--baseline', help='JSON планов базовой линии для сравнения')
+        parser.add_argument('--output', default=str(DEFAULT_OUTPUT),
+                            help='Куда записать JSON с планами')
+
+    def handle(self, *args, **options):
+        selected = options['scenario'] or SCENARIO_NAMES
+        scenarios = [s for s in SCENARIOS if s.name in selected]
+        if options['skip_writes']:
+            scenarios = [s for s in scenarios if not s.writes]
+
+        baseline = load(options['baseline']) if options['baseline'] else None
+
+        try:
+            data = prepare()
+        except LookupError as exc:
+            raise CommandError(str(exc))
+
+        results = {}
+        for scenario in scenarios:
+            captured = plans.capture_queries(scenario, data, options['host'])
+            results[scenario.name] = queries = {}
+            for key, (alias, sql, params) in captured.items():
+                try:
+                    plan = plans.explain(alias, sql, params)
+                except (DatabaseError, NotImplementedError) as exc:
+                    self.stderr.write(self.style.WARNING(f'{scenario.name} [{key}]: EXPLAIN не выполнен: {exc}'))
+                    continue
+                queries[key] = {
+                    'alias': alias,
+                    'sql': fingerprint(sql),
+                    'shape': plans.shape(plan),
+                    'issues': plans.find_issues(plan),
+                    'execution_ms': plan['execution_ms'],
+                    'plan': plan['root'],
+                }
+            self.report_scenario(scenario.name, queries)
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'git': git_revision(),
+            'scenarios': results,
+        }
+        output = Path(options['output'])
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        self.stdout.write(self.style.SUCCESS(f'Планы записаны в {output}'))
+
+        if baseline is not None:
+            self.report_changes(plans.compare(baseline, report))
+
+    def report_scenario(self, name, queries):
+        issues = sum(len(q['issues']) for q in queries.values())
+        self.stdout.write(f'{name:<20} запросов {len(queries):>3}  проблем {issues}')
+        for key, query in queries.items():
+            for issue in query['issues']:
+                self.stdout.write(self.style.WARNING(f"  [{key}] {issue['kind']}: {issue['detail']}"))
+                self.stdout.write(f"      {query['sql'][:200]}")
+
+    def report_changes(self, changes):
+        if not changes:
+            self.stdout.write(self.style.SUCCESS('Планы совпадают с базовой линией'))
+            return
+
+        new_issues = 0
+        for name, change in changes.items():
+            self.stdout.write(f'{name}:')
+            for key in change['new']:
+                self.stdout.write(f'  + новый запрос [{key}]')
+            for key in change['removed']:
+                self.stdout.write(f'  - запрос исчез [{key}]')
+            for key, diff in change['changed'].items():
+                self.stdout.write(f'  ~ план изменился [{key}]')
+                for line in diff:
+                    self.stdout.write(f'      {line}')
+            for key, issue in change['new_issues']:
+                new_issues += 1
+                self.stdout.write(self.style.ERROR(f"  ! [{key}] {issue['kind']}: {issue['detail']}"))
+
+        if new_issues:
+            raise CommandError(f'Новых проблем в планах: {new_issues}')
@@ -0,0 +1,242 @@
+# benchmarks/management/commands/loadtest.py
+"""
+Нагрузочный тест: поднимает library.wsgi или library.asgi локально
+и гоняет смесь трафика тысячами виртуальных пользователей (benchmarks/loadtest.py).
+
+    python manage.py loadtest --app wsgi --users 2000 --duration 60
+    python manage.py loadtest --app asgi --workers 4 --mix catalog=50,book_detail=50
+    python manage.py loadtest --url http://127.0.0.1:8000   # уже запущенный сервер
+
+WSGI: gunicorn, если установлен, иначе многопоточный wsgiref (benchmarks/serve.py).
+ASGI: нужен uvicorn (pip install uvicorn).
+"""
+
+import asyncio
+import importlib.util
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from importlib import import_module
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from books.models import Book, Genre
+from benchmarks.loadtest import DEFAULT_MIX, make_sessions, parse_mix, run_load
+from benchmarks.scenarios import CATALOG_PAGE_SIZE, prepare
+from benchmarks.seed import Zipf, rng_for
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def server_command(app, port, workers):
+    if app == 'asgi':
+        if importlib.util.find_spec('uvicorn') is None:
+            raise CommandError('Для --app asgi нужен uvicorn: pip install uvicorn')
+        return [sys.executable, '-m', 'uvicorn', 'library.asgi:application',
+                '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers),
+                '--no-access-log']
+    if importlib.util.find_spec('gunicorn') is not None:
+        return [sys.executable, '-m', 'gunicorn', 'library.wsgi:application',
+                '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--threads', '4']
+    return [sys.executable, '-m', 'benchmarks.serve', '--port', str(port)]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f'Сервер не открыл порт {port} за {timeout} с')
+
+
+def sample_connections():
+    """
+    Соединения с каждой PostgreSQL-базой по состояниям (active, idle, idle in transaction).
+    """
+    sample = {}
+    for alias in connections:
+        connection = connections[alias]
+        if connection.vendor != 'postgresql':
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT COALESCE(state, 'unknown'), count(*) FROM pg_stat_activity "
+                "WHERE datname = current_database() AND pid <> pg_backend_pid() GROUP BY 1"
+            )
+            for state, count in cursor.fetchall():
+                sample[f'{alias}:{state}'] = count
+    connections.close_all()
+    return sample
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест WSGI/ASGI приложения смесью трафика виртуальных пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--app', choices=['wsgi', 'asgi'], default='wsgi',
+                            help='Какое приложение поднять')
+        parser.add_argument('--url', help='Не поднимать сервер, а нагружать уже запущенный')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--workers', type=int, default=4, help='Процессов сервера (gunicorn/uvicorn)')
+        parser.add_argument('--users', type=int, default=500, help='Виртуальных пользователей')
+        parser.add_argument('--logged-in-share', type=float, default=0.3,
+                            help='Доля вошедших виртуальных пользователей')
+        parser.add_argument('--accounts', type=int,
+                            help='Сколько аккаунтов делят вошедшие (меньше — больше гонок одного пользователя)')
+        parser.add_argument('--duration', type=int, default=60, help='Длительность теста, с')
+        parser.add_argument('--ramp-up', type=int, default=10, help='Разгон до полного числа пользователей, с')
+        parser.add_argument('--think-time', type=float, default=1.0,
+                            help='Средняя пауза пользователя между запросами, с (0 — без пауз)')
+        parser.add_argument('--mix', help='Смесь трафика: catalog=40,book_detail=30,... '
+                                          f'(по умолчанию {DEFAULT_MIX})')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Записать результаты в JSON')
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix']) if options['mix'] else dict(DEFAULT_MIX)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        self.raise_open_files_limit(options['users'])
+        data = self.prepare_data(options)
+        session_keys = self.prepare_sessions(options)
+
+        server = None
+        base_url = options['url']
+        if not base_url:
+            port = options['port']
+            env = {**os.environ, 'SQL_INSTRUMENTATION': '1'}  # Server-Timing с временем БД
+            server = subprocess.Popen(server_command(options['app'], port, options['workers']),
+                                      cwd=settings.BASE_DIR, env=env)
+            base_url = f'http://127.0.0.1:{port}'
+
+        try:
+            if server is not None:
+                wait_for_port(options['port'])
+            has_postgres = any(connections[a].vendor == 'postgresql' for a in connections)
+            stats, samples, elapsed = asyncio.run(run_load(
+                base_url, data, mix, session_keys,
+                users=options['users'],
+                duration=options['duration'],
+                ramp_up=options['ramp_up'],
+                think_time=options['think_time'],
+                seed=options['seed'],
+                sample_connections=sample_connections if has_postgres else None,
+            ))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=10)
+            self.delete_sessions(session_keys)
+
+        self.report(stats, samples, elapsed, options)
+
+    # ---------------------------------------
+    # Подготовка
+    # ---------------------------------------
+    def raise_open_files_limit(self, users):
+        if resource is None:
+            return
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        wanted = users * 2 + 256
+        if soft < wanted:
+            limit = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+            if limit < wanted:
+                self.stderr.write(self.style.WARNING(
+                    f'Лимит открытых файлов {limit} — может не хватить на {users} пользователей'
+                ))
+
+    def prepare_data(self, options):
+        try:
+            sample = prepare()
+        except LookupError as exc:
+            raise CommandError(str(exc))
+
+        slugs = dict(Book.objects.filter(is_active=True).values_list('id', 'slug'))
+        words = {w for title in Book.objects.values_list('title', flat=True)[:5000] for w in title.split()}
+        return {
+            'books': Zipf(slugs, 1.1, rng_for(options['seed'], 'loadtest')),
+            'slugs': slugs,
+            'genres': list(Genre.objects.values_list('slug', flat=True)),
+            'words': sorted(words) or ['книга'],
+            'last_page': max(1, len(slugs) // CATALOG_PAGE_SIZE),
+            'download_book': sample['book'].pk,
+            'logged_in_share': options['logged_in_share'],
+        }
+
+    def prepare_sessions(self, options):
+        logged_in = round(options['users'] * options['logged_in_share'])
+        if not logged_in:
+            return []
+        accounts = options['accounts'] or logged_in
+        users = list(get_user_model().objects.filter(is_active=True, is_staff=False).order_by('id')[:accounts])
+        if not users:
+            raise CommandError('Нет пользователей для вошедших виртуальных пользователей — выполните seed_library')
+        return make_sessions(users)
+
+    def delete_sessions(self, keys):
+        store = import_module(settings.SESSION_ENGINE).SessionStore
+        for key in keys:
+            store(session_key=key).delete()
+
+    # ---------------------------------------
+    # Отчёт
+    # ---------------------------------------
+    def report(self, stats, samples, elapsed, options):
+        duration = options['duration'] + options['ramp_up']
+        endpoints = {name: s.summary(duration) for name, s in sorted(stats.items())}
+        total = sum(e['requests'] for e in endpoints.values())
+        errors = sum(round(e['error_rate'] * e['requests']) for e in endpoints.values())
+
+        self.stdout.write(
+            f"{'endpoint':<18}{'req':>8}{'rps':>8}{'err%':>7}{'p50':>8}{'p90':>8}{'p99':>8}{'max':>9}{'SQL':>6}{'db ms':>8}"
+        )
+        for name, e in endpoints.items():
+            self.stdout.write(
+                f"{name:<18}{e['requests']:>8}{e['rps']:>8}{e['error_rate'] * 100:>7.2f}"
+                f"{e['p50_ms']:>8}{e['p90_ms']:>8}{e['p99_ms']:>8}{e['max_ms']:>9}"
+                f"{e['avg_queries'] if e['avg_queries'] is not None else '-':>6}"
+                f"{e['avg_db_ms'] if e['avg_db_ms'] is not None else '-':>8}"
+            )
+        self.stdout.write(
+            f'Всего: {total} запросов за {elapsed:.0f} с ({total / elapsed:.1f} rps), '
+            f'ошибок {errors} ({errors / total:.2%})' if total else 'Запросов не было'
+        )
+
+        connection_usage = {}
+        for sample in samples:
+            for key, count in sample.items():
+                usage = connection_usage.setdefault(key, {'max': 0, 'sum': 0})
+                usage['max'] = max(usage['max'], count)
+                usage['sum'] += count
+        for key, usage in sorted(connection_usage.items()):
+            usage['avg'] = round(usage.pop('sum') / len(samples), 1)
+            self.stdout.write(f"Соединения БД {key}: среднее {usage['avg']}, максимум {usage['max']}")
+
+        if options['output']:
+            output = Path(options['output'])
+            output.parent.mkdir(parents=True, exist_ok=True)
+            output.write_text(json.dumps({
+                'options': {k: options[k] for k in ('app', 'url', 'users', 'logged_in_share', 'accounts',
+                                                    'duration', 'ramp_up', 'think_time', 'seed', 'workers')},
+                'mix': parse_mix(options['mix']) if options['mix'] else DEFAULT_MIX,
+                'elapsed': round(elapsed, 1),
+                'endpoints': endpoints,
+                'db_connections': connection_usage,
+            }, ensure_ascii=False, indent=2), encoding='utf-8')
+            self.stdout.write(self.style.SUCCESS(f'Результаты записаны в {output}'))
@@ -0,0 +1,274 @@
+# benchmarks/management/commands/seed_library.py
+"""
+Синтетическая библиотека для бенчмарков: книги, авторы, жанры, пользователи,
+избранное и журналы просмотров/скачиваний с реалистичной популярностью (Ципф)
+и распределением во времени. См. benchmarks/seed.py.
+
+    python manage.py seed_library --preset large --seed 42
+
+Сигналы не вызываются (COPY мимо ORM), поэтому после загрузки:
+    python manage.py rebuild_sketches   — HLL-скетчи для приближённых счётчиков
+"""
+
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from books import versioning
+from books.models import Book, Author, Genre, Favorite, BookView, DownloadLog
+from benchmarks.seed import (
+    FIRST_NAMES, LAST_NAMES, WORDS, Timeline, Zipf, load_rows, rng_for,
+)
+
+User = get_user_model()
+
+PRESETS = {
+    'small': dict(books=2_000, authors=500, genres=30, users=5_000,
+                  views=200_000, downloads=20_000, favorites=10_000),
+    'medium': dict(books=20_000, authors=5_000, genres=40, users=100_000,
+                   views=5_000_000, downloads=500_000, favorites=200_000),
+    'large': dict(books=200_000, authors=50_000, genres=60, users=1_000_000,
+                  views=100_000_000, downloads=10_000_000, favorites=3_000_000),
+}
+
+SLUG_PREFIX = 'seed-'
+DOWNLOAD_STATUSES = (['success', 'failed', 'partial'], [95, 4, 1])
+DOWNLOAD_FORMATS = (['pdf', 'epub', 'fb2'], [50, 30, 20])
+
+
+class Command(BaseCommand):
+    help = 'Генерирует большую синтетическую библиотеку для бенчмарков (COPY в PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--preset', choices=sorted(PRESETS), default='small',
+                            help='Объёмы по умолчанию (small/medium/large)')
+        for name in PRESETS['small']:
+            parser.add_argument(f'--{name}', type=int, help=f'Сколько {name} создать (перекрывает preset)')
+        parser.add_argument('--seed', type=int, default=42,
+                            help='Зерно генератора: одинаковые параметры — одинаковые данные')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько последних дней генерировать события')
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help='Показатель Ципфа для популярности книг и авторов')
+        parser.add_argument('--user-zipf', type=float, default=0.8,
+                            help='Показатель Ципфа для активности пользователей')
+        parser.add_argument('--anonymous-share', type=float, default=0.5,
+                            help='Доля просмотров от анонимных посетителей')
+        parser.add_argument('--password', default='seed-password',
+                            help='Пароль всех сгенерированных пользователей')
+        parser.add_argument('--batch-size', type=int, default=50_000,
+                            help='Строк в одном куске COPY / пачке INSERT')
+
+    def handle(self, *args, **options):
+        volumes = dict(PRESETS[options['preset']])
+        for name in volumes:
+            if options[name] is not None:
+                volumes[name] = options[name]
+
+        if Book.objects.filter(slug__startswith=f'{SLUG_PREFIX}book-').exists():
+            raise CommandError('Синтетические данные уже загружены (книги seed-book-*). '
+                               'Загрузите их в чистую базу.')
+
+        self.options = options
+        self.seed = options['seed']
+        self.batch_size = options['batch_size']
+        self.timeline = Timeline(timezone.now(), options['days'])
+
+        genre_ids = self.seed_genres(volumes['genres'])
+        author_ids = self.seed_authors(volumes['authors'])
+        user_ids = self.seed_users(volumes['users'])
+        book_ids = self.seed_books(volumes['books'], genre_ids, author_ids)
+
+        rng = rng_for(self.seed, 'popularity')
+        books = Zipf(book_ids, options['zipf'], rng)
+        users = Zipf(user_ids, options['user_zipf'], rng)
+
+        self.seed_favorites(volumes['favorites'], books, users)
+        self.seed_views(volumes['views'], books, users)
+        self.seed_downloads(volumes['downloads'], books, users)
+
+        # Страницы с ETag должны увидеть новые данные
+        versioning.bump_version(versioning.CATALOG)
+        versioning.bump_version(versioning.DOWNLOADS)
+        self.stdout.write(self.style.SUCCESS(
+            'Готово. Для приближённых счётчиков выполните: manage.py rebuild_sketches'
+        ))
+
+    # ---------------------------------------
+    # Загрузка одной таблицы
+    # ---------------------------------------
+    def load(self, model, fields, rows, label=None):
+        """
+        Загружает строки (кортежи значений fields) в таблицу model
+        в одной транзакции, затем сбрасывает sequence и обновляет статистику.
+        """
+        alias = router.db_for_write(model)
+        connection = connections[alias]
+        columns = [model._meta.get_field(name).column for name in fields]
+        started = time.monotonic()
+
+        with transaction.atomic(using=alias):
+            count = load_rows(connection, model._meta.db_table, columns, rows, self.batch_size)
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), [model]):
+                    cursor.execute(sql)
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+
+        self.stdout.write(
+            f'{label or model._meta.db_table}: {count} строк за {time.monotonic() - started:.1f} с'
+        )
+        return count
+
+    def next_id(self, model):
+        alias = router.db_for_write(model)
+        return (model.objects.using(alias).aggregate(m=Max('id'))['m'] or 0) + 1
+
+    # ---------------------------------------
+    # Каталог и пользователи
+    # ---------------------------------------
+    def seed_genres(self, count):
+        first = self.next_id(Genre)
+        ids = range(first, first + count)
+        rng = rng_for(self.seed, 'genres')
+
+        def rows():
+            for i in ids:
+                created = self.timeline.random_before_start(rng)
+                yield (i, f'Жанр {i}', f'{SLUG_PREFIX}genre-{i}', '', created, created)
+
+        self.load(Genre, ['id', 'name', 'slug', 'description', 'created_at', 'updated_at'], rows())
+        return list(ids)
+
+    def seed_authors(self, count):
+        first = self.next_id(Author)
+        ids = range(first, first + count)
+        rng = rng_for(self.seed, 'authors')
+
+        def rows():
+            for i in ids:
+                created = self.timeline.random_before_start(rng)
+                name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+                yield (i, name, f'{SLUG_PREFIX}author-{i}', '', None, None, None, created, created)
+
+        self.load(Author, ['id', 'name', 'slug', 'bio', 'birth_date', 'death_date', 'photo',
+                           'created_at', 'updated_at'], rows())
+        return list(ids)
+
+    def seed_users(self, count):
+        first = self.next_id(User)
+        ids = range(first, first + count)
+        rng = rng_for(self.seed, 'users')
+        # Один хэш на всех: хэширование миллиона паролей заняло бы часы
+        password = make_password(self.options['password'])
+
+        def rows():
+            for i in ids:
+                joined = self.timeline.random_before_start(rng, years=3)
+                yield (i, password, None, False, f'{SLUG_PREFIX}user-{i}', '', '',
+                       f'{SLUG_PREFIX}user-{i}@example.com', False, True, joined)
+
+        self.load(User, ['id', 'password', 'last_login', 'is_superuser', 'username', 'first_name',
+                         'last_name', 'email', 'is_staff', 'is_active', 'date_joined'], rows())
+        return list(ids)
+
+    def seed_books(self, count, genre_ids, author_ids):
+        first = self.next_id(Book)
+        ids = range(first, first + count)
+        rng = rng_for(self.seed, 'books')
+
+        def rows():
+            for i in ids:
+                created = self.timeline.random_before_start(rng)
+                title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).capitalize()
+                yield (i, title, f'{SLUG_PREFIX}book-{i}', f'{title}. Синтетическое описание.',
+                       'covers/seed.jpg', f'books/pdf/{SLUG_PREFIX}{i}.pdf', None, None,
+                       rng.random() > 0.02, created, created)
+
+        self.load(Book, ['id', 'title', 'slug', 'description', 'cover', 'file_pdf', 'file_epub',
+                         'file_fb2', 'is_active', 'created_at', 'updated_at'], rows())
+
+        # Связи: 1–2 жанра, 1–3 автора (плодовитые авторы — по Ципфу)
+        rng = rng_for(self.seed, 'book_relations')
+        authors = Zipf(author_ids, self.options['zipf'], rng)
+
+        def genre_rows():
+            for book_id in ids:
+                for genre_id in set(rng.sample(genre_ids, 1 + (rng.random() < 0.3))):
+                    yield (book_id, genre_id)
+
+        def author_rows():
+            for book_id in ids:
+                k = rng.choices([1, 2, 3], [85, 12, 3])[0]
+                for author_id in set(authors.sample(rng, k)):
+                    yield (book_id, author_id)
+
+        self.load(Book.genres.through, ['book', 'genre'], genre_rows(), 'связи книга–жанр')
+        self.load(Book.authors.through, ['book', 'author'], author_rows(), 'связи книга–автор')
+        return list(ids)
+
+    # ---------------------------------------
+    # Избранное и журналы событий
+    # ---------------------------------------
+    def seed_favorites(self, count, books, users):
+        rng = rng_for(self.seed, 'favorites')
+        per_user = {}
+        for user_id in users.sample(rng, count):
+            per_user[user_id] = per_user.get(user_id, 0) + 1
+
+        def rows():
+            for user_id in sorted(per_user):
+                wanted = min(per_user[user_id], len(books.ids))
+                chosen = set()
+                while len(chosen) < wanted:
+                    chosen.update(books.sample(rng, wanted - len(chosen)))
+                for book_id in sorted(chosen):
+                    yield (user_id, book_id, self.timeline.random_before_start(rng, years=1))
+
+        self.load(Favorite, ['user', 'book', 'created_at'], rows())
+
+    def seed_views(self, count, books, users):
+        rng = rng_for(self.seed, 'views')
+        anonymous_share = self.options['anonymous_share']
+        visitors = len(users.ids) or 1
+
+        def rows():
+            for prefix, n in self.timeline.hours(count):
+                book_ids = books.sample(rng, n)
+                user_ids = users.sample(rng, n) if users.ids else [None] * n
+                for book_id, user_id, created in zip(book_ids, user_ids, self.timeline.stamps(rng, prefix, n)):
+                    if user_id is None or rng.random() < anonymous_share:
+                        # Анонимные посетители: ключ из пула размером с число пользователей
+                        yield (None, book_id, f'seedvisitor{rng.randrange(visitors):021d}', created)
+                    else:
+                        yield (user_id, book_id, None, created)
+
+        self.load(BookView, ['user', 'book', 'session_key', 'created_at'], rows())
+
+    def seed_downloads(self, count, books, users):
+        if not users.ids:
+            return
+        rng = rng_for(self.seed, 'downloads')
+        statuses, status_weights = DOWNLOAD_STATUSES
+        formats, format_weights = DOWNLOAD_FORMATS
+
+        def rows():
+            for prefix, n in self.timeline.hours(count):
+                book_ids = books.sample(rng, n)
+                user_ids = users.sample(rng, n)
+                hour_statuses = rng.choices(statuses, status_weights, k=n)
+                hour_formats = rng.choices(formats, format_weights, k=n)
+                stamps = self.timeline.stamps(rng, prefix, n)
+                for i in range(n):
+                    yield (user_ids[i], book_ids[i], hour_formats[i],
+                           rng.randrange(200_000, 20_000_000), hour_statuses[i], stamps[i])
+
+        self.load(DownloadLog, ['user', 'book', 'file_format', 'file_size', 'status', 'created_at'], rows())
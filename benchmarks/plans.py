@@ -0,0 +1,259 @@
+# benchmarks/plans.py
+"""
+Планы выполнения горячих запросов.
+
+Запросы не переписываются вручную: сценарий бенчмарка (benchmarks/scenarios.py)
+выполняется один раз через django.test.Client, и все его SELECT-ы перехватываются
+execute_wrapper-ом вместе с параметрами и псевдонимом базы. Затем каждый
+уникальный запрос (по fingerprint) прогоняется через
+EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) на той же базе — так план всегда
+соответствует коду представлений, а не его копии.
+
+План хранится в нормализованном виде: дерево узлов с типом, таблицей,
+индексом, оценкой и фактическим числом строк. С базовой линией сравнивается
+форма плана — типы узлов, таблицы и индексы без чисел.
+
+На SQLite (локальная проверка) используется EXPLAIN QUERY PLAN:
+без ANALYZE и оценок строк, но последовательные сканы видны.
+"""
+
+import difflib
+import hashlib
+from contextlib import ExitStack
+
+from django.db import connections, reset_queries, transaction
+from django.test import Client
+
+from library.instrumentation import fingerprint
+
+# Таблицы событий: последовательный скан по ним — всегда проблема
+HOT_TABLES = {'books_bookview', 'books_downloadlog'}
+
+# Seq Scan, отбрасывающий фильтром столько строк и больше, — кандидат на индекс...
+MISSING_INDEX_MIN_REMOVED = 1000
+# ...если возвращает не больше этой доли просмотренных строк
+MISSING_INDEX_SELECTIVITY = 0.1
+
+# Оценка планировщика и факт расходятся во столько раз и больше
+ROW_ESTIMATE_FACTOR = 10
+# Узлы, где и оценка, и факт меньше, не проверяются (шум на маленьких выборках)
+ROW_ESTIMATE_MIN_ROWS = 100
+
+
+def query_key(sql):
+    return hashlib.sha1(fingerprint(sql).encode()).hexdigest()[:12]
+
+
+# ---------------------------------------
+# Перехват запросов сценария
+# ---------------------------------------
+class QueryCapture:
+    """
+    execute_wrapper: запоминает первый экземпляр каждого SELECT (по fingerprint).
+    """
+
+    def __init__(self):
+        self.queries = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        head = sql.lstrip()[:6].upper()
+        if not many and head.startswith(('SELECT', 'WITH')):
+            key = query_key(sql)
+            if key not in self.queries:
+                self.queries[key] = (context['connection'].alias, sql, params)
+        return execute(sql, params, many, context)
+
+
+def capture_queries(scenario, data, host):
+    """
+    {ключ: (alias, sql, params)} — все SELECT-ы одного запроса сценария.
+    """
+    client = Client(HTTP_HOST=host)
+    if scenario.login:
+        client.force_login(data['user'])
+    url = scenario.url(data)
+
+    # Прогревочный запрос: для record_view второй запрос попадает в дедупликацию
+    getattr(client, scenario.method)(url).close()
+
+    capture = QueryCapture()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(capture))
+        response = getattr(client, scenario.method)(url)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        response.close()
+    reset_queries()
+    return capture.queries
+
+
+# ---------------------------------------
+# EXPLAIN и нормализация
+# ---------------------------------------
+def explain(alias, sql, params):
+    """
+    Нормализованный план запроса: {'root': узел, 'planning_ms', 'execution_ms'}.
+    ANALYZE выполняет запрос — делаем это в транзакции, которая откатывается.
+    """
+    connection = connections[alias]
+    with transaction.atomic(using=alias):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + sql, params)
+                raw = cursor.fetchone()[0]
+                plan = normalize_postgresql(raw[0] if isinstance(raw, list) else raw)
+            elif connection.vendor == 'sqlite':
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plan = normalize_sqlite(cursor.fetchall())
+            else:
+                raise NotImplementedError(f'EXPLAIN для {connection.vendor} не поддерживается')
+        transaction.set_rollback(True, using=alias)
+    return plan
+
+
+def _pg_node(node):
+    loops = node.get('Actual Loops') or 1
+    return {
+        'node': node['Node Type'],
+        'relation': node.get('Relation Name'),
+        'index': node.get('Index Name'),
+        'join': node.get('Join Type'),
+        'estimated_rows': node.get('Plan Rows'),
+        # Actual Rows — среднее на один проход
+        'actual_rows': node.get('Actual Rows'),
+        'loops': loops,
+        'rows_removed': node.get('Rows Removed by Filter', 0) + node.get('Rows Removed by Index Recheck', 0),
+        'shared_hit': node.get('Shared Hit Blocks'),
+        'shared_read': node.get('Shared Read Blocks'),
+        'children': [_pg_node(child) for child in node.get('Plans', [])],
+    }
+
+
+def normalize_postgresql(raw):
+    return {
+        'root': _pg_node(raw['Plan']),
+        'planning_ms': raw.get('Planning Time'),
+        'execution_ms': raw.get('Execution Time'),
+    }
+
+
+def normalize_sqlite(rows):
+    """
+    Строки EXPLAIN QUERY PLAN (id, parent, notused, detail) → то же дерево узлов.
+    """
+    root = {'node': 'QUERY PLAN', 'relation': None, 'index': None, 'children': []}
+    nodes = {0: root}
+    for node_id, parent, _, detail in rows:
+        words = detail.split()
+        scan = words[0] in ('SCAN', 'SEARCH') and len(words) > 1
+        node = {
+            'node': ' '.join(words[:1]) if scan else detail,
+            'relation': words[1] if scan else None,
+            'index': detail.split(' USING ', 1)[1] if scan and ' USING ' in detail else None,
+            'children': [],
+        }
+        nodes[node_id] = node
+        nodes.get(parent, root)['children'].append(node)
+    return {'root': root, 'planning_ms': None, 'execution_ms': None}
+
+
+def walk(node, depth=0):
+    yield node, depth
+    for child in node['children']:
+        yield from walk(child, depth + 1)
+
+
+def shape(plan):
+    """
+    Форма плана: строка на узел, без чисел — её и сравниваем с базовой линией.
+    """
+    lines = []
+    for node, depth in walk(plan['root']):
+        line = '  ' * depth + node['node']
+        if node.get('join'):
+            line += f" ({node['join']})"
+        if node['relation']:
+            line += f" on {node['relation']}"
+        if node['index']:
+            line += f" using {node['index']}"
+        lines.append(line)
+    return lines
+
+
+# ---------------------------------------
+# Проверки
+# ---------------------------------------
+def find_issues(plan):
+    """
+    [{'kind', 'relation', 'detail'}]:
+    - seq_scan — последовательный скан по таблице событий (HOT_TABLES);
+    - missing_index — Seq Scan, который отбрасывает фильтром почти всё, что прочитал;
+    - row_estimate — оценка строк планировщика расходится с фактом в ROW_ESTIMATE_FACTOR раз.
+    """
+    issues = []
+    for node, _ in walk(plan['root']):
+        relation = node['relation']
+        sequential = node['node'] == 'Seq Scan' or (node['node'] == 'SCAN' and not node['index'])
+
+        if sequential and relation in HOT_TABLES:
+            issues.append({'kind': 'seq_scan', 'relation': relation,
+                           'detail': f'последовательный скан {relation}'})
+        elif sequential and node.get('rows_removed', 0) >= MISSING_INDEX_MIN_REMOVED:
+            returned = (node['actual_rows'] or 0) * node['loops']
+            removed = node['rows_removed'] * node['loops']
+            if returned <= (returned + removed) * MISSING_INDEX_SELECTIVITY:
+                issues.append({'kind': 'missing_index', 'relation': relation,
+                               'detail': f'Seq Scan на {relation} отбрасывает {removed} строк, '
+                                         f'возвращает {returned}'})
+
+        estimated, actual = node.get('estimated_rows'), node.get('actual_rows')
+        if estimated is None or actual is None or max(estimated, actual) < ROW_ESTIMATE_MIN_ROWS:
+            continue
+        factor = max(estimated, actual) / max(min(estimated, actual), 1)
+        if factor >= ROW_ESTIMATE_FACTOR:
+            issues.append({'kind': 'row_estimate', 'relation': relation or node['node'],
+                           'detail': f"{node['node']}: оценка {estimated} строк, факт {actual} (×{factor:.0f})"})
+    return issues
+
+
+def issue_key(issue):
+    return f"{issue['kind']}:{issue['relation']}"
+
+
+# ---------------------------------------
+# Сравнение с базовой линией
+# ---------------------------------------
+def compare(baseline, current):
+    """
+    По сценариям: {'new', 'removed', 'changed': {ключ: diff}, 'new_issues': [(ключ, issue)]}.
+    Пустые сценарии не возвращаются.
+    """
+    report = {}
+    for name, queries in current['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            continue
+        changes = {
+            'new': sorted(set(queries) - set(before)),
+            'removed': sorted(set(before) - set(queries)),
+            'changed': {},
+            'new_issues': [],
+        }
+        for key, query in queries.items():
+            old = before.get(key)
+            if old is None:
+                changes['new_issues'].extend((key, issue) for issue in query['issues'])
+                continue
+            if old['shape'] != query['shape']:
+                changes['changed'][key] = list(difflib.unified_diff(
+                    old['shape'], query['shape'], 'baseline', 'current', lineterm='', n=2,
+                ))
+            known = {issue_key(issue) for issue in old['issues']}
+            changes['new_issues'].extend(
+                (key, issue) for issue in query['issues'] if issue_key(issue) not in known
+            )
+        if any(changes.values()):
+            report[name] = changes
+    return report
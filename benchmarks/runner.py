@@ -0,0 +1,114 @@
+# benchmarks/runner.py
+"""
+Прогон сценариев в процессе через django.test.Client и сравнение результатов.
+
+Для каждого сценария:
+- латентность: warmup прогонов отбрасываются, по repeat считаются p50/p90/p99;
+- SQL: число запросов и время БД за один запрос (library/instrumentation.py);
+- память: пик tracemalloc за один отдельный прогон (tracemalloc замедляет код,
+  поэтому в замеры времени он не попадает).
+"""
+
+import statistics
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+from django.db import connections, reset_queries
+from django.test import Client
+
+from library import instrumentation
+
+# Метрики, по которым ищутся регрессии (больше — хуже)
+COMPARED_METRICS = ['p50_ms', 'p90_ms', 'p99_ms', 'queries', 'peak_memory_kb']
+
+
+def percentile(values, pct):
+    """
+    Перцентиль методом ближайшего ранга.
+    """
+    ordered = sorted(values)
+    rank = max(1, round(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _request(client, url, method='get'):
+    stats, token = instrumentation.start()
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(stats))
+            started = time.perf_counter()
+            response = getattr(client, method)(url)
+            # Потоковые ответы (FileResponse) дочитываем — это часть запроса
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            elapsed = time.perf_counter() - started
+    finally:
+        instrumentation.stop(token)
+        reset_queries()  # при DEBUG=True connection.queries растёт без ограничений
+    response.close()
+    return response, elapsed, stats
+
+
+def run_scenario(scenario, data, repeat, warmup, host):
+    client = Client(HTTP_HOST=host)
+    if scenario.login:
+        client.force_login(data['user'])
+    url = scenario.url(data)
+
+    for _ in range(warmup):
+        _request(client, url, scenario.method)
+
+    timings, queries, db_times, statuses = [], [], [], set()
+    for _ in range(repeat):
+        response, elapsed, stats = _request(client, url, scenario.method)
+        timings.append(elapsed * 1000)
+        queries.append(stats.queries)
+        db_times.append(stats.db_time * 1000)
+        statuses.add(response.status_code)
+
+    tracemalloc.start()
+    try:
+        _request(client, url, scenario.method)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'url': url,
+        'status': sorted(statuses),
+        'repeat': repeat,
+        'mean_ms': round(statistics.fmean(timings), 2),
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p90_ms': round(percentile(timings, 90), 2),
+        'p99_ms': round(percentile(timings, 99), 2),
+        'max_ms': round(max(timings), 2),
+        'queries': max(queries),
+        'db_ms': round(statistics.fmean(db_times), 2),
+        'peak_memory_kb': round(peak / 1024),
+    }
+
+
+def compare(baseline, current, threshold, metrics=COMPARED_METRICS):
+    """
+    Список регрессий [(сценарий, метрика, было, стало, рост)], рост > threshold (0.2 = +20 %).
+    Число запросов сравнивается строго: любой лишний запрос — регрессия.
+    """
+    regressions = []
+    for name, result in current['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            continue
+        for metric in metrics:
+            old, new = before.get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            if metric == 'queries':
+                if new > old:
+                    regressions.append((name, metric, old, new, (new - old) / max(old, 1)))
+                continue
+            if old > 0 and (new - old) / old > threshold:
+                regressions.append((name, metric, old, new, (new - old) / old))
+    return regressions
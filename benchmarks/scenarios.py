@@ -0,0 +1,113 @@
+# benchmarks/scenarios.py
+"""
+Сценарии бенчмарка представлений.
+
+Каждый сценарий — имя, функция, строящая URL по подготовленным данным
+(prepare()), признак «нужен вошедший пользователь» и HTTP-метод.
+Данные берутся из текущей базы — обычно засеянной seed_library.
+"""
+
+import math
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Count
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from books.models import Book, Genre, Author, DownloadLog
+from books.search import to_cyrillic, to_latin
+
+CATALOG_PAGE_SIZE = 9  # как в catalog()
+
+
+def misspell(word):
+    """
+    Опечатка: две соседние буквы в середине слова переставлены.
+    """
+    if len(word) < 4:
+        return word + word[-1]
+    i = len(word) // 2
+    return word[:i - 1] + word[i] + word[i - 1] + word[i + 1:]
+
+
+def transliterate(text):
+    """
+    Имя в другой раскладке: «Иванов» → «ivanov», «Brown» → «бровн».
+    """
+    return to_cyrillic(text) if text.isascii() else to_latin(text)
+
+
+class Scenario:
+    def __init__(self, name, url, login=False, writes=False, method='get'):
+        self.name = name
+        self.url = url
+        self.login = login
+        # Сценарий пишет в базу (download_book создаёт DownloadLog)
+        self.writes = writes
+        self.method = method
+
+
+def prepare():
+    """
+    Образцы данных для сценариев: популярная книга, жанр, автор, активный пользователь.
+    """
+    books = Book.objects.filter(is_active=True)
+    book = books.exclude(file_pdf='').exclude(file_pdf__isnull=True).order_by('id').first()
+    if book is None:
+        raise LookupError('В базе нет активных книг с PDF — сначала выполните seed_library')
+
+    # У засеянных книг файлов нет — кладём заглушку, чтобы download_book отдал файл
+    if not default_storage.exists(book.file_pdf.name):
+        default_storage.save(book.file_pdf.name, ContentFile(b'%PDF-1.4\n% benchmark\n'))
+
+    genre = Genre.objects.annotate(n=Count('books')).order_by('-n').first()
+    author = Author.objects.annotate(n=Count('books')).order_by('-n').first()
+
+    # Самый активный пользователь — худший случай для profile_analytics
+    top = (
+        DownloadLog.objects.order_by().values('user_id')
+            .annotate(n=Count('id')).order_by('-n').first()
+    )
+    User = get_user_model()
+    user = User.objects.get(pk=top['user_id']) if top else User.objects.order_by('id').first()
+
+    return {
+        'book': book,
+        'genre': genre,
+        'author': author,
+        'user': user,
+        'word': book.title.split()[0],
+        # Поиск с опечаткой и в другой раскладке — точных совпадений нет, работает pg_trgm
+        'typo': misspell(max(book.title.split(), key=len)),
+        'translit': transliterate(author.name.split()[-1]),
+        'last_page': max(1, math.ceil(books.count() / CATALOG_PAGE_SIZE)),
+    }
+
+
+SCENARIOS = [
+    Scenario('catalog', lambda d: reverse('books:catalog')),
+    Scenario('catalog_filtered', lambda d: reverse('books:catalog') + '?' + urlencode(
+        {'genres': [d['genre'].slug], 'authors': [d['author'].slug]}, doseq=True)),
+    Scenario('catalog_deep_page', lambda d: reverse('books:catalog') + '?' + urlencode(
+        {'page': d['last_page']})),
+    Scenario('catalog_new', lambda d: reverse('books:catalog') + '?sort=new'),
+    Scenario('book_detail', lambda d: reverse('books:detail', args=[d['book'].slug])),
+    Scenario('book_detail_user', lambda d: reverse('books:detail', args=[d['book'].slug]), login=True),
+    Scenario('search', lambda d: reverse('books:search') + '?' + urlencode({'q': d['word']})),
+    Scenario('search_typo', lambda d: reverse('books:search') + '?' + urlencode({'q': d['typo']})),
+    Scenario('search_translit', lambda d: reverse('books:search') + '?' + urlencode({'q': d['translit']})),
+    Scenario('author_list', lambda d: reverse('books:author_list')),
+    Scenario('dashboard', lambda d: reverse('analytics:dashboard')),
+    Scenario('profile_analytics', lambda d: reverse('analytics:profile_analytics'), login=True),
+    Scenario('download_book', lambda d: reverse('books:download', args=[d['book'].pk, 'pdf']),
+             login=True, writes=True),
+    # Beacon просмотра: после первого запроса срабатывает дедупликация (один SELECT ... LIMIT 1)
+    Scenario('record_view', lambda d: reverse('books:record_view', args=[d['book'].pk]),
+             writes=True, method='post'),
+    Scenario('record_view_user', lambda d: reverse('books:record_view', args=[d['book'].pk]),
+             login=True, writes=True, method='post'),
+]
+
+SCENARIO_NAMES = [s.name for s in SCENARIOS]
@@ -0,0 +1,192 @@
+# benchmarks/seed.py
+"""
+Генераторы синтетических данных и потоковая загрузка в базу.
+
+- популярность книг, авторов и активность пользователей — распределение Ципфа
+  (вес ранга r = 1 / r^s, ранги перемешаны, чтобы не совпадать с id);
+- события распределены по дням с ростом к концу периода и по часам
+  с суточным профилем, внутри часа идут по времени;
+- в PostgreSQL строки уходят через COPY ... FROM STDIN кусками,
+  в остальных базах — executemany пачками (для SQLite в разработке);
+- метки времени — UTC без смещения: Django держит соединение в UTC (USE_TZ).
+
+Каждая таблица получает свой генератор random.Random(f'{seed}:{table}'),
+поэтому одинаковые параметры дают одинаковые данные.
+"""
+
+import itertools
+import random
+from datetime import timedelta, timezone as dt_timezone
+
+# Суточный профиль активности (доля по часам UTC, сумма не важна)
+HOURLY_PROFILE = [
+    2, 1, 1, 1, 1, 2, 3, 5, 7, 8, 8, 8,
+    9, 9, 8, 8, 8, 9, 10, 12, 13, 12, 8, 4,
+]
+
+WORDS = [
+    'тень', 'ветер', 'город', 'море', 'ночь', 'сад', 'дорога', 'зима', 'огонь',
+    'звезда', 'память', 'тайна', 'остров', 'песня', 'сердце', 'время', 'лес',
+    'река', 'мост', 'дом', 'письмо', 'путь', 'небо', 'свет', 'камень', 'птица',
+    'shadow', 'river', 'winter', 'garden', 'empire', 'machine', 'signal', 'harbor',
+]
+FIRST_NAMES = [
+    'Анна', 'Иван', 'Мария', 'Пётр', 'Елена', 'Сергей', 'Ольга', 'Дмитрий',
+    'Наталья', 'Алексей', 'John', 'Emily', 'Michael', 'Sarah', 'David', 'Laura',
+]
+LAST_NAMES = [
+    'Иванов', 'Смирнова', 'Кузнецов', 'Попова', 'Соколов', 'Лебедева', 'Морозов',
+    'Волкова', 'Новиков', 'Фёдорова', 'Smith', 'Brown', 'Taylor', 'Wilson', 'Clarke',
+]
+
+
+def rng_for(seed, table):
+    return random.Random(f'{seed}:{table}')
+
+
+class Zipf:
+    """
+    Выборка id с вероятностью ∝ 1 / rank^s; ранги — случайная перестановка ids.
+    """
+
+    def __init__(self, ids, s, rng):
+        self.ids = list(ids)
+        rng.shuffle(self.ids)
+        self.cum_weights = list(itertools.accumulate(1.0 / (r ** s) for r in range(1, len(self.ids) + 1)))
+
+    def sample(self, rng, k):
+        return rng.choices(self.ids, cum_weights=self.cum_weights, k=k)
+
+
+def allocate(total, weights):
+    """
+    Делит total на целые части пропорционально weights (метод наибольших остатков).
+    """
+    weight_sum = sum(weights)
+    exact = [total * w / weight_sum for w in weights]
+    parts = [int(x) for x in exact]
+    rest = total - sum(parts)
+    by_remainder = sorted(range(len(weights)), key=lambda i: exact[i] - parts[i], reverse=True)
+    for i in by_remainder[:rest]:
+        parts[i] += 1
+    return parts
+
+
+class Timeline:
+    """
+    Метки времени событий за days дней до end: рост к концу периода (growth)
+    и суточный профиль. Отдаёт (префикс 'YYYY-MM-DD HH:', число событий) по часам.
+    """
+
+    def __init__(self, end, days, growth=2.0):
+        end = end.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+        self.start = end - timedelta(days=days)
+        self.days = days
+        self.day_weights = [1 + growth * i / max(days - 1, 1) for i in range(days)]
+
+    def hours(self, total):
+        per_day = allocate(total, self.day_weights)
+        for day, day_total in enumerate(per_day):
+            if not day_total:
+                continue
+            base = self.start + timedelta(days=day)
+            for hour, n in enumerate(allocate(day_total, HOURLY_PROFILE)):
+                if n:
+                    yield (base + timedelta(hours=hour)).strftime('%Y-%m-%d %H:'), n
+
+    def stamps(self, rng, prefix, n):
+        """
+        n меток времени внутри часа prefix, по возрастанию.
+        """
+        seconds = sorted(rng.randrange(3600) for _ in range(n))
+        return [f'{prefix}{s // 60:02d}:{s % 60:02d}' for s in seconds]
+
+    def random_before_start(self, rng, years=5):
+        """
+        Случайный момент за years лет до начала периода (дата добавления книги/пользователя).
+        """
+        offset = rng.randrange(years * 365 * 86400)
+        return (self.start - timedelta(seconds=offset)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+# ---------------------------------------
+# Загрузка строк
+# ---------------------------------------
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    value = str(value)
+    if '\\' in value or '\t' in value or '\n' in value or '\r' in value:
+        value = (value.replace('\\', '\\\\').replace('\t', '\\t')
+                      .replace('\n', '\\n').replace('\r', '\\r'))
+    return value
+
+
+def _copy_chunks(rows, batch_size):
+    """
+    Строки в текстовом формате COPY, кусками по batch_size строк.
+    """
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return
+        yield ''.join(
+            '\t'.join(_copy_value(v) for v in row) + '\n' for row in batch
+        ).encode('utf-8')
+
+
+class _ChunkReader:
+    """
+    Файлоподобный объект поверх генератора байтов (для psycopg2 copy_expert).
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.chunk = b''
+        self.pos = 0
+
+    def read(self, size=-1):
+        if self.pos >= len(self.chunk):
+            self.chunk, self.pos = next(self.chunks, b''), 0
+        end = len(self.chunk) if size < 0 else self.pos + size
+        data = self.chunk[self.pos:end]
+        self.pos += len(data)
+        return data
+
+    readline = read
+
+
+def load_rows(connection, table, columns, rows, batch_size):
+    """
+    Потоково загружает строки (итератор кортежей) в table. Возвращает число строк.
+    """
+    counter = itertools.count()
+    rows = (row for row, _ in zip(rows, counter))
+    qn = connection.ops.quote_name
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            sql = f'COPY {qn(table)} ({", ".join(qn(c) for c in columns)}) FROM STDIN'
+            raw = cursor.cursor
+            chunks = _copy_chunks(rows, batch_size)
+            if hasattr(raw, 'copy_expert'):  # psycopg2
+                raw.copy_expert(sql, _ChunkReader(chunks), size=1 << 16)
+            else:  # psycopg 3
+                with raw.copy(sql) as copy:
+                    for chunk in chunks:
+                        copy.write(chunk)
+        else:
+            placeholders = ', '.join(['%s'] * len(columns))
+            sql = f'INSERT INTO {qn(table)} ({", ".join(qn(c) for c in columns)}) VALUES ({placeholders})'
+            while True:
+                batch = list(itertools.islice(rows, batch_size))
+                if not batch:
+                    break
+                cursor.executemany(sql, batch)
+
+    # zip() сначала берёт строку, поэтому на исчерпании rows counter не сдвигается
+    return next(counter)
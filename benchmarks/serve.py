@@ -0,0 +1,38 @@
+# benchmarks/serve.py
+"""
+Многопоточный WSGI-сервер из стандартной библиотеки для нагрузочного теста,
+когда gunicorn не установлен:
+
+    python -m benchmarks.serve --port 8765
+"""
+
+import argparse
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, required=True)
+    args = parser.parse_args()
+
+    from library.wsgi import application
+
+    server = make_server(args.host, args.port, application,
+                         server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
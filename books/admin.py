@@ -1,5 +1,8 @@
 # books/admin.py
 from django.contrib import admin
+
+from analytics import export
+from library.admin_tables import AutocompleteFilter, AutocompleteFilterMixin, LargeTableAdminMixin
 from .models import Genre, Author, Book, Favorite, DownloadLog, BookView
 
 
@@ -66,16 +69,35 @@ class BookAdmin(admin.ModelAdmin):
 # Favorite
 # -----------------------------------------
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     list_display = ('user', 'book', 'created_at')
     search_fields = ('user__username', 'book__title')
-    list_filter = ('created_at', 'user')
+    list_filter = ('created_at', ('user', AutocompleteFilter))
+    autocomplete_fields = ('user', 'book')
+
+# -----------------------------------------
+# Выгрузка журналов (analytics/export.py): отмеченные строки или, через
+# «выбрать все», весь отфильтрованный список — например, за период
+# фильтра created_at. Ответ идёт потоком, без загрузки строк в память.
+# -----------------------------------------
+@admin.action(description='Выгрузить в CSV', permissions=['view'])
+def export_csv(modeladmin, request, queryset):
+    return export.streaming_response(queryset, 'csv')
+
+
+@admin.action(description='Выгрузить в JSONL', permissions=['view'])
+def export_jsonl(modeladmin, request, queryset):
+    return export.streaming_response(queryset, 'jsonl')
+
 
 # -----------------------------------------
 # DownloadLog
+# Журналы — большие таблицы (и, возможно, в базе 'analytics'):
+# оценка числа строк, keyset-страницы, поиск по индексам —
+# см. library/admin_tables.py
 # -----------------------------------------
 @admin.register(DownloadLog)
-class DownloadLogAdmin(admin.ModelAdmin):
+class DownloadLogAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = (
         'user',
         'book',
@@ -84,16 +106,24 @@ class DownloadLogAdmin(admin.ModelAdmin):
         'status',
         'created_at',
     )
-    search_fields = ('user__username', 'book__title')
-    list_filter = ('file_format', 'status')
+    list_prefetch_related = ('user', 'book')
+    # Логин — по началу (индекс username_like), название — по части (book_title_trgm_idx)
+    search_fields = ('user__username__startswith', 'book__title__icontains')
+    search_help_text = 'Начало логина (с учётом регистра) или часть названия книги'
+    list_filter = ('created_at', 'file_format', 'status', ('user', AutocompleteFilter), ('book', AutocompleteFilter))
+    autocomplete_fields = ('user', 'book')
+    actions = (export_csv, export_jsonl)
 
 
 # -----------------------------------------
 # BookView (НОВАЯ регистрация)
 # -----------------------------------------
 @admin.register(BookView)
-class BookViewAdmin(admin.ModelAdmin):
+class BookViewAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'book', 'created_at')
-    search_fields = ('user__username', 'book__title')
-    list_filter = ('created_at', 'user')
-
+    list_prefetch_related = ('user', 'book')
+    search_fields = ('user__username__startswith', 'book__title__icontains')
+    search_help_text = 'Начало логина (с учётом регистра) или часть названия книги'
+    list_filter = ('created_at', ('user', AutocompleteFilter), ('book', AutocompleteFilter))
+    autocomplete_fields = ('user', 'book')
+    actions = (export_csv, export_jsonl)
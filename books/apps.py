@@ -7,3 +7,7 @@ class BooksConfig(AppConfig):
 
     def ready(self):
         import books.signals
+        from django.core.signals import request_started
+        from books import typeahead
+        # Индекс подсказок строится в фоне с первым запросом к процессу
+        request_started.connect(typeahead.warm_up, dispatch_uid='books.typeahead.warm_up')
@@ -0,0 +1,63 @@
+# books/conditional.py
+"""
+Conditional GET (ETag) для HTML-страниц каталога.
+
+ETag страницы = версии данных на странице + кто смотрит
+(пользователь и его избранное влияют на разметку).
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+from .favorites import get_favorite_ids
+
+
+def page_etag(request, *parts):
+    user = request.user
+    if user.is_authenticated:
+        viewer = f'u{user.pk}:{get_favorite_ids(user).digest}'
+    else:
+        viewer = 'anon'
+    raw = '|'.join(str(p) for p in (*parts, viewer))
+    return '"%s"' % hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def not_modified(request, etag):
+    """
+    HttpResponseNotModified, если у клиента актуальная версия, иначе None.
+    Ожидающие flash-сообщения выводятся в разметке — в этом случае всегда рендерим.
+    """
+    if len(get_messages(request)):
+        return None
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        finalize(request, response, etag)
+    return response
+
+
+def finalize(request, response, etag):
+    response['ETag'] = etag
+    messages = getattr(request, '_messages', None)
+    if request.user.is_authenticated:
+        # Браузер хранит копию, но каждый раз перепроверяет её через ETag
+        patch_cache_control(response, no_cache=True, private=True)
+    elif messages is not None and messages.used:
+        # В разметку попали flash-сообщения — такую страницу делить нельзя
+        patch_cache_control(response, no_store=True, private=True)
+    else:
+        # Анонимная страница не зависит от посетителя: общий кэш может
+        # отдавать её ANONYMOUS_SHARED_MAX_AGE секунд, браузер — перепроверять
+        patch_cache_control(
+            response, public=True, max_age=0,
+            s_maxage=settings.ANONYMOUS_SHARED_MAX_AGE,
+        )
+        if settings.VISITOR_COOKIE_NAME in request.COOKIES:
+            # Cookie посетителя старого формата (path=/): из-за неё запросы
+            # этого браузера не попадают в общую копию. Новая живёт только
+            # под VISITOR_COOKIE_PATH и сюда не приходит
+            response.delete_cookie(settings.VISITOR_COOKIE_NAME, samesite='Lax')
+    patch_vary_headers(response, ('Cookie',))
+    return response
@@ -0,0 +1,13 @@
+# books/context_processors.py
+from django.utils.functional import SimpleLazyObject
+from .favorites import get_favorite_ids
+
+
+def favorites(request):
+    """
+    favorite_ids — множество id избранных книг текущего пользователя.
+    Ленивое: кэш читается только если шаблон действительно проверяет избранное.
+    """
+    return {
+        'favorite_ids': SimpleLazyObject(lambda: get_favorite_ids(request.user)),
+    }
@@ -0,0 +1,97 @@
+# books/favorites.py
+"""
+Кэш множества избранных книг пользователя.
+
+После первого обращения id избранных книг лежат в кэше, поэтому
+проверка «в избранном ли книга» для любой карточки — O(1) без запросов.
+Для очень больших библиотек множество хранится компактным битсетом
+(1 бит на id книги) — см. FAVORITES_BITSET_THRESHOLD.
+Кэш сбрасывается сигналами Favorite (добавление/удаление, в т.ч. из favorite_toggle и админки).
+
+Ключ кэша содержит версию избранного пользователя (books/versioning.py),
+а сброс — это смена версии. Версия читается до запроса к базе, поэтому
+запрос, начатый до изменения избранного, положит устаревшее множество под
+старый ключ, и его уже никто не прочтёт.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Favorite
+from .versioning import bump_version, favorites, get_version
+
+CACHE_KEY = 'favorites:{user_id}:{version}'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+class FavoriteIds:
+    """
+    Неизменяемое множество id книг: set для обычных пользователей,
+    битсет для пользователей с тысячами избранных книг.
+    """
+
+    def __init__(self, ids):
+        ids = list(ids)
+        threshold = getattr(settings, 'FAVORITES_BITSET_THRESHOLD', 2000)
+        if len(ids) > threshold:
+            bits = bytearray(max(ids) // 8 + 1)
+            for book_id in ids:
+                bits[book_id >> 3] |= 1 << (book_id & 7)
+            self.bits = bytes(bits)
+            self.ids = None
+        else:
+            self.bits = None
+            self.ids = frozenset(ids)
+        self.size = len(ids)
+        # Отпечаток содержимого — часть ETag страниц со звёздочками избранного
+        self.digest = hashlib.md5(','.join(map(str, sorted(ids))).encode('ascii')).hexdigest()[:12]
+
+    def __contains__(self, book_id):
+        try:
+            book_id = int(book_id)
+        except (TypeError, ValueError):
+            return False
+        if self.ids is not None:
+            return book_id in self.ids
+        byte = book_id >> 3
+        return 0 <= byte < len(self.bits) and bool(self.bits[byte] & (1 << (book_id & 7)))
+
+    def __len__(self):
+        return self.size
+
+    def __bool__(self):
+        return self.size > 0
+
+
+EMPTY = FavoriteIds([])
+
+
+def get_favorite_ids(user):
+    """
+    Множество id избранных книг пользователя.
+    Кэшируется в django cache и на объекте пользователя (в пределах запроса).
+    """
+    if not user.is_authenticated:
+        return EMPTY
+
+    cached = getattr(user, '_favorite_ids', None)
+    if cached is not None:
+        return cached
+
+    key = CACHE_KEY.format(user_id=user.pk, version=get_version(favorites(user.pk)))
+    favorite_ids = cache.get(key)
+    if favorite_ids is None:
+        favorite_ids = FavoriteIds(
+            Favorite.objects.filter(user=user).values_list('book_id', flat=True).order_by()
+        )
+        # add, а не set: не перезаписываем множество, уже положенное другим запросом
+        cache.add(key, favorite_ids, CACHE_TIMEOUT)
+
+    user._favorite_ids = favorite_ids
+    return favorite_ids
+
+
+def invalidate_favorite_ids(user_id):
+    bump_version(favorites(user_id))
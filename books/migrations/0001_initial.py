@@ -78,8 +78,8 @@ class Migration(migrations.Migration):
                 ('file_size', models.PositiveIntegerField(blank=True, null=True)),
                 ('status', models.CharField(choices=[('success', 'Success'), ('failed', 'Failed'), ('partial', 'Partial')], default='success', max_length=16)),
                 ('created_at', models.DateTimeField(auto_now_add=True)),
-                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='download_logs', to='books.book')),
-                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='download_logs', to=settings.AUTH_USER_MODEL)),
+                ('book', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='download_logs', to='books.book')),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='download_logs', to=settings.AUTH_USER_MODEL)),
             ],
             options={
                 'ordering': ['-created_at'],
@@ -55,12 +55,12 @@ class Migration(migrations.Migration):
         migrations.AddField(
             model_name='bookview',
             name='book',
-            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_logs', to='books.book'),
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='view_logs', to='books.book'),
         ),
         migrations.AddField(
             model_name='bookview',
             name='user',
-            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='book_views', to=settings.AUTH_USER_MODEL),
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='book_views', to=settings.AUTH_USER_MODEL),
         ),
         migrations.AddIndex(
             model_name='bookview',
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0006_remove_book_books_book_title_s_ae82d5_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bookview',
+            name='book',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='view_logs', to='books.book'),
+        ),
+        migrations.AlterField(
+            model_name='bookview',
+            name='user',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='book_views', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='downloadlog',
+            name='book',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='download_logs', to='books.book'),
+        ),
+        migrations.AlterField(
+            model_name='downloadlog',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='download_logs', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
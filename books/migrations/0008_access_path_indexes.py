@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:47
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently, TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE/DROP INDEX CONCURRENTLY не блокирует запись в таблицы,
+    # но не может выполняться внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('books', '0007_event_fk_without_db_constraint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name='author',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='author_name_trgm_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='book',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['title'], name='book_active_title_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='book',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at'], name='book_active_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='book',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('title'), name='gin_trgm_ops'), name='book_title_trgm_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='bookview',
+            index=models.Index(condition=models.Q(('user__isnull', False)), fields=['user', 'book', 'created_at'], name='bookview_user_book_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='bookview',
+            index=models.Index(condition=models.Q(('session_key__isnull', False)), fields=['session_key', 'book', 'created_at'], name='bookview_session_book_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='downloadlog',
+            index=models.Index(condition=models.Q(('status', 'success')), fields=['book', 'user'], name='download_success_book_user_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='downloadlog',
+            index=models.Index(condition=models.Q(('status', 'success')), fields=['user', '-created_at'], include=('book',), name='download_success_user_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='genre',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='genre_name_trgm_idx'),
+        ),
+        # Старые индексы дедупликации — после того, как построены новые
+        RemoveIndexConcurrently(
+            model_name='bookview',
+            name='books_bookv_user_id_3894bc_idx',
+        ),
+        RemoveIndexConcurrently(
+            model_name='bookview',
+            name='books_bookv_session_fe9455_idx',
+        ),
+    ]
@@ -1,10 +1,21 @@
 # books/models.py
 from django.db import models
+from django.db.models.functions import Upper
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex, OpClass
 
 # Получаем модель пользователя (обычно auth.User)
 User = get_user_model()
 
+
+def trigram_index(field, name):
+    """
+    GIN-индекс pg_trgm для field__icontains: Django строит
+    UPPER(field) LIKE UPPER('%...%'), поэтому индекс — по UPPER(field).
+    """
+    return GinIndex(OpClass(Upper(field), name='gin_trgm_ops'), name=name)
+
+
 # -----------------------------------------
 # Genre — жанр книги (Фантастика, Роман и т.д.)
 # -----------------------------------------
@@ -19,6 +30,7 @@ class Genre(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [trigram_index('name', 'genre_name_trgm_idx')]
 
     def __str__(self):
         return self.name
@@ -43,6 +55,7 @@ class Author(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [trigram_index('name', 'author_name_trgm_idx')]
 
     def __str__(self):
         return self.name
@@ -84,6 +97,12 @@ class Book(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Каталог: только активные книги, по названию или сначала новые
+            models.Index(fields=['title'], condition=models.Q(is_active=True), name='book_active_title_idx'),
+            models.Index(fields=['-created_at'], condition=models.Q(is_active=True), name='book_active_created_idx'),
+            trigram_index('title', 'book_title_trgm_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -129,12 +148,14 @@ class DownloadLog(models.Model):
     ]
     user = models.ForeignKey(
         User,
-        on_delete=models.CASCADE,
+        on_delete=models.DO_NOTHING,  # каскад — сигналом, см. books/signals.py
+        db_constraint=False,  # журнал может жить в отдельной базе 'analytics'
         related_name='download_logs'
     )
     book = models.ForeignKey(
         Book,
-        on_delete=models.CASCADE,
+        on_delete=models.DO_NOTHING,  # каскад — сигналом, см. books/signals.py
+        db_constraint=False,  # журнал может жить в отдельной базе 'analytics'
         related_name='download_logs'
     )
     file_format = models.CharField(
@@ -156,6 +177,12 @@ class DownloadLog(models.Model):
         indexes = [
             models.Index(fields=['user', 'created_at']),
             models.Index(fields=['book', 'created_at']),
+            # Счётчики «Скачано»: COUNT(DISTINCT user) по book_id только из индекса
+            models.Index(fields=['book', 'user'], condition=models.Q(status='success'),
+                         name='download_success_book_user_idx'),
+            # Профиль: успешные скачивания пользователя, последние сверху, book — без чтения таблицы
+            models.Index(fields=['user', '-created_at'], include=['book'], condition=models.Q(status='success'),
+                         name='download_success_user_idx'),
         ]
     def __str__(self):
         return f'{self.user} → {self.book} ({self.file_format})'
@@ -169,12 +196,14 @@ class BookView(models.Model):
         User,
         null=True,
         blank=True,
-        on_delete=models.SET_NULL,
+        on_delete=models.DO_NOTHING,  # SET_NULL — сигналом, см. books/signals.py
+        db_constraint=False,  # журнал может жить в отдельной базе 'analytics'
         related_name='book_views'
     )
     book = models.ForeignKey(
         Book,
-        on_delete=models.CASCADE,
+        on_delete=models.DO_NOTHING,  # каскад — сигналом, см. books/signals.py
+        db_constraint=False,  # журнал может жить в отдельной базе 'analytics'
         related_name='view_logs'
     )
     session_key = models.CharField(max_length=40, null=True, blank=True)
@@ -183,8 +212,12 @@ class BookView(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['book', 'created_at']),
-            models.Index(fields=['user', 'created_at']),
-            models.Index(fields=['session_key', 'created_at'])
+            # Дедупликация просмотров (books/tracking.py): user/посетитель + книга + окно по времени.
+            # Префикс user/session_key обслуживает и выборки по пользователю.
+            models.Index(fields=['user', 'book', 'created_at'], condition=models.Q(user__isnull=False),
+                         name='bookview_user_book_idx'),
+            models.Index(fields=['session_key', 'book', 'created_at'], condition=models.Q(session_key__isnull=False),
+                         name='bookview_session_book_idx'),
         ]
     def __str__(self):
         if self.user:
@@ -0,0 +1,112 @@
+# books/pagination.py
+"""
+Курсорная (keyset) пагинация.
+
+Вместо OFFSET передаём в курсоре значения ключа сортировки последней записи,
+поэтому глубокие страницы стоят столько же, сколько первая.
+Ключ всегда заканчивается на id — это делает порядок однозначным.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils import timezone
+
+# Порядок выдачи: имя → [(поле, по убыванию?), ...]
+ORDERINGS = {
+    'title': [('title', False), ('id', False)],
+    'new': [('created_at', True), ('id', True)],
+    'name': [('name', False), ('id', False)],
+}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(obj, ordering):
+    values = []
+    for field, _ in ORDERINGS[ordering]:
+        value = getattr(obj, field)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        values.append(value)
+    raw = json.dumps(values, ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, ordering):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+
+    fields = ORDERINGS[ordering]
+    if not isinstance(values, list) or len(values) != len(fields):
+        raise InvalidCursor(cursor)
+
+    return [_decode_value(field, value, cursor) for (field, _), value in zip(fields, values)]
+
+
+def _decode_value(field, value, cursor):
+    """
+    Значение ключа из курсора — того же типа, что и поле: курсор присылает
+    клиент, и подделанное значение не должно дойти до запроса (там это 500).
+    """
+    if field == 'id':
+        # bool — подкласс int, но id им быть не может
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise InvalidCursor(cursor)
+        return value
+    if field == 'created_at':
+        try:
+            value = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise InvalidCursor(cursor)
+        # encode_cursor пишет aware-время (USE_TZ); naive — чужой курсор
+        if timezone.is_naive(value):
+            raise InvalidCursor(cursor)
+        return value
+    if not isinstance(value, str):
+        raise InvalidCursor(cursor)
+    return value
+
+
+def order_by_args(ordering):
+    return [f'-{field}' if desc else field for field, desc in ORDERINGS[ordering]]
+
+
+def paginate(queryset, ordering, cursor=None, limit=20):
+    """
+    Возвращает (объекты страницы, курсор следующей страницы или None).
+    Выбирает limit + 1 запись, чтобы узнать, есть ли следующая страница.
+    """
+    queryset = queryset.order_by(*order_by_args(ordering))
+
+    if cursor:
+        values = decode_cursor(cursor, ordering)
+        queryset = queryset.filter(_after(ORDERINGS[ordering], values))
+
+    items = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1], ordering)
+    return items, next_cursor
+
+
+def _after(fields, values):
+    """
+    (a, b) > (va, vb)  ⇔  a > va  OR  (a = va AND b > vb)
+    """
+    q = Q()
+    for i, (field, desc) in enumerate(fields):
+        lookup = 'lt' if desc else 'gt'
+        step = Q(**{f'{field}__{lookup}': values[i]})
+        for j, (prev_field, _) in enumerate(fields[:i]):
+            step &= Q(**{prev_field: values[j]})
+        q |= step
+    return q
@@ -0,0 +1,219 @@
+# books/search.py
+"""
+Поиск с опечатками и транслитерацией (используется в search()).
+
+1. Запрос дополняется транслитерацией: «Tolstoy» → «толстой», «Чехов» → «chekhov».
+   Точные совпадения (icontains) ищутся по всем вариантам сразу.
+   Точных совпадений берётся не больше SEARCH_RESULTS_LIMIT на каждый вид объектов.
+2. Если точных совпадений меньше SEARCH_FUZZY_MIN_RESULTS, добавляются похожие
+   по pg_trgm: word_similarity(запрос, UPPER(поле)) не ниже SEARCH_FUZZY_THRESHOLD.
+   Оператор %> обслуживается GIN-индексами *_trgm_idx по UPPER(поле)
+   (books/models.py, trigram_index), поэтому время ограничено порогом,
+   LIMIT SEARCH_FUZZY_LIMIT и statement_timeout SEARCH_FUZZY_TIMEOUT_MS.
+
+Нечёткий поиск есть только в PostgreSQL; на других базах остаётся
+точный поиск с транслитерацией.
+
+Результаты по нормализованному запросу кэшируются (cached_search) до
+изменения каталога: версия CATALOG входит в ключ.
+"""
+
+import hashlib
+import logging
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import OperationalError, connections, router, transaction
+from django.db.models import Q, Value
+from django.db.models.functions import Greatest, Upper
+
+from .models import Book, Author, Genre
+from .versioning import get_version, CATALOG
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------
+# Транслитерация
+# ---------------------------------------
+# Сочетания латиницы проверяются раньше одиночных букв (длинные — первыми)
+LATIN_TO_CYRILLIC = [
+    ('shch', 'щ'), ('sch', 'щ'),
+    ('zh', 'ж'), ('kh', 'х'), ('ch', 'ч'), ('sh', 'ш'), ('ts', 'ц'),
+    ('yu', 'ю'), ('ya', 'я'), ('yo', 'ё'), ('ye', 'е'),
+    ('iy', 'ий'), ('yy', 'ый'), ('oy', 'ой'), ('ay', 'ай'), ('ey', 'ей'), ('uy', 'уй'),
+    ('a', 'а'), ('b', 'б'), ('c', 'к'), ('d', 'д'), ('e', 'е'), ('f', 'ф'),
+    ('g', 'г'), ('h', 'х'), ('i', 'и'), ('j', 'й'), ('k', 'к'), ('l', 'л'),
+    ('m', 'м'), ('n', 'н'), ('o', 'о'), ('p', 'п'), ('q', 'к'), ('r', 'р'),
+    ('s', 'с'), ('t', 'т'), ('u', 'у'), ('v', 'в'), ('w', 'в'), ('x', 'кс'),
+    ('y', 'ы'), ('z', 'з'),
+]
+
+CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e',
+    'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+}
+
+# «Dostoevsky» → «достоевский»: y в конце слова после согласной — это «ий»
+_FINAL_Y = re.compile(r'(?<=[bcdfghjklmnpqrstvwxz])y\b')
+# «Достоевский» → «dostoevsky»
+_FINAL_IY = re.compile(r'ий\b')
+
+_LATIN = re.compile(r'[a-z]')
+_CYRILLIC = re.compile(r'[а-яё]')
+
+
+def to_cyrillic(text):
+    text = _FINAL_Y.sub('ий', text.lower())
+    result = []
+    i = 0
+    while i < len(text):
+        for latin, cyrillic in LATIN_TO_CYRILLIC:
+            if text.startswith(latin, i):
+                result.append(cyrillic)
+                i += len(latin)
+                break
+        else:
+            result.append(text[i])
+            i += 1
+    return ''.join(result)
+
+
+def to_latin(text):
+    text = _FINAL_IY.sub('y', text.lower())
+    return ''.join(CYRILLIC_TO_LATIN.get(char, char) for char in text)
+
+
+def query_variants(query):
+    """
+    Запрос и его транслитерации (в каждую сторону, если в запросе есть такие буквы).
+    """
+    variants = [query]
+    lowered = query.lower()
+    if _LATIN.search(lowered):
+        variants.append(to_cyrillic(lowered))
+    if _CYRILLIC.search(lowered):
+        variants.append(to_latin(lowered))
+
+    unique = []
+    for variant in variants:
+        if variant.casefold() not in {v.casefold() for v in unique}:
+            unique.append(variant)
+    return unique
+
+
+def contains_any(field, variants):
+    """
+    Q: field__icontains любого из вариантов запроса.
+    """
+    condition = Q()
+    for variant in variants:
+        condition |= Q(**{f'{field}__icontains': variant})
+    return condition
+
+
+# ---------------------------------------
+# Похожие по триграммам
+# ---------------------------------------
+def similar(queryset, field, variants, limit=None):
+    """
+    Объекты queryset, у которых field похоже на один из вариантов запроса,
+    по убыванию похожести (атрибут similarity). Вне PostgreSQL и при
+    превышении SEARCH_FUZZY_TIMEOUT_MS — пустой список.
+    """
+    alias = router.db_for_read(queryset.model)
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return []
+
+    patterns = [variant.upper() for variant in variants]
+    # WHERE: оператор %> — по нему работает GIN-индекс UPPER(field) gin_trgm_ops
+    condition = Q()
+    for pattern in patterns:
+        condition |= Q(fuzzy_key__trigram_word_similar=pattern)
+    scores = [TrigramWordSimilarity(Value(pattern), Upper(field)) for pattern in patterns]
+
+    queryset = (
+        queryset
+            .using(alias)
+            .alias(fuzzy_key=Upper(field))
+            .filter(condition)
+            .annotate(similarity=Greatest(*scores) if len(scores) > 1 else scores[0])
+            .order_by('-similarity', field)
+    )[:limit or settings.SEARCH_FUZZY_LIMIT]
+
+    try:
+        with transaction.atomic(using=alias):
+            with connection.cursor() as cursor:
+                # Порог оператора %> и таймаут — только на эту транзакцию
+                cursor.execute(
+                    "SELECT set_config('pg_trgm.word_similarity_threshold', %s, true), "
+                    "set_config('statement_timeout', %s, true)",
+                    [str(settings.SEARCH_FUZZY_THRESHOLD), str(settings.SEARCH_FUZZY_TIMEOUT_MS)],
+                )
+            return list(queryset)
+    except OperationalError:
+        logger.warning('Нечёткий поиск %s по %r прерван по таймауту', queryset.model.__name__, variants)
+        return []
+
+
+def search_with_fallback(queryset, field, query):
+    """
+    Точные совпадения по запросу и его транслитерациям (не больше
+    SEARCH_RESULTS_LIMIT); если их меньше SEARCH_FUZZY_MIN_RESULTS —
+    дополняются похожими. Возвращает список.
+    """
+    variants = query_variants(query)
+    found = list(queryset.filter(contains_any(field, variants)).distinct()[:settings.SEARCH_RESULTS_LIMIT])
+    if len(found) < settings.SEARCH_FUZZY_MIN_RESULTS:
+        found += similar(queryset.exclude(pk__in=[obj.pk for obj in found]), field, variants)
+    return found
+
+
+# ---------------------------------------
+# Поиск по сайту с кэшем
+# ---------------------------------------
+def normalize_query(query):
+    """
+    Ключ запроса: без лишних пробелов и регистра. Поиск и так нечувствителен
+    к регистру, поэтому «Толстой» и «толстой » — один и тот же запрос.
+    """
+    return ' '.join(query.split()).casefold()
+
+
+def find(query):
+    """
+    Книги, авторы и жанры по запросу. Уникальные скачивания книг сюда не входят:
+    они меняются с каждым скачиванием и считаются после кэша.
+    """
+    return {
+        'books': search_with_fallback(
+            Book.objects.filter(is_active=True).prefetch_related('authors', 'genres'),
+            'title', query,
+        ),
+        'authors': search_with_fallback(Author.objects.all(), 'name', query),
+        'genres': search_with_fallback(Genre.objects.all(), 'name', query),
+    }
+
+
+def cached_search(query):
+    """
+    (результаты find(), взяты ли из кэша) для нормализованного запроса.
+    Ответы больше SEARCH_CACHE_MAX_RESULTS объектов не кэшируются:
+    это редкие короткие запросы, а значение в кэше было бы огромным.
+    """
+    digest = hashlib.md5(query.encode('utf-8')).hexdigest()
+    key = f'search:{get_version(CATALOG)}:{digest}'
+    results = cache.get(key)
+    if results is not None:
+        return results, True
+
+    results = find(query)
+    if sum(len(found) for found in results.values()) <= settings.SEARCH_CACHE_MAX_RESULTS:
+        cache.set(key, results, settings.SEARCH_CACHE_TIMEOUT)
+    return results, False
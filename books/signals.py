@@ -1,9 +1,15 @@
 # books/signals.py
 import os
-from django.db.models.signals import pre_save, post_delete
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.utils import timezone
+from django.contrib.auth import get_user_model
 from django.dispatch import receiver
 from django.conf import settings
-from .models import Book
+from .models import Book, Author, Genre, Favorite, BookView, DownloadLog
+from .favorites import invalidate_favorite_ids
+from . import typeahead, versioning
+from library import replicas
 
 # Утилита: удалить файл в MEDIA_ROOT по относительному пути
 def delete_file_if_exists(path):
@@ -55,3 +61,109 @@ def delete_files_on_delete(sender, instance, **kwargs):
         f = getattr(instance, field)
         if f:
             delete_file_if_exists(f.name)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def reset_favorite_cache(sender, instance, **kwargs):
+    """
+    Избранное изменилось → сбрасываем кэш множества избранного пользователя.
+    - triggered after save() / delete()
+    """
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_favorite_ids(user_id))
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+@receiver(m2m_changed, sender=Book.genres.through)
+def touch_book_on_relations_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Смена авторов/жанров книги не трогает Book.updated_at сама по себе.
+    Обновляем его, чтобы ETag'и API и страниц видели изменение.
+    - triggered after add/remove/clear (с обеих сторон связи)
+    """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # instance — Author/Genre; для clear pk_set пуст, берём всё
+        books = Book.objects.filter(pk__in=pk_set) if pk_set else None
+    else:
+        books = Book.objects.filter(pk=instance.pk)
+    if books is not None:
+        books.update(updated_at=timezone.now())
+    transaction.on_commit(lambda: versioning.bump_version(versioning.CATALOG))
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def bump_catalog_version(sender, **kwargs):
+    """
+    Любое изменение каталога → новая версия CATALOG (ETag'и страниц, кэши поиска).
+    - triggered after save() / delete()
+    """
+    transaction.on_commit(lambda: versioning.bump_version(versioning.CATALOG))
+
+
+@receiver(post_save, sender=DownloadLog)
+def bump_download_stats(sender, instance, created, **kwargs):
+    """
+    Успешное скачивание меняет счётчики книги и карточек в списках.
+    """
+    if created and instance.status == 'success':
+        book_id = instance.book_id
+
+        def bump():
+            versioning.bump_version(versioning.book_stats(book_id))
+            versioning.bump_version(versioning.DOWNLOADS)
+
+        transaction.on_commit(bump, using=kwargs['using'])
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=DownloadLog)
+def pin_writer_to_primary(sender, instance, **kwargs):
+    """
+    Read-your-writes: пользователь, который только что записал избранное
+    или скачивание, какое-то время читает с primary, а не с реплики.
+    """
+    replicas.pin_to_primary()
+
+
+# -----------------------------------------
+# Каскады для журналов событий.
+# FK журналов объявлены без ограничений в БД (журналы могут жить в базе
+# 'analytics'), поэтому удаляем/обнуляем связанные записи сами — запросом
+# в базу журнала, без JOIN'ов.
+# -----------------------------------------
+@receiver(post_delete, sender=Book)
+def delete_events_on_book_delete(sender, instance, **kwargs):
+    BookView.objects.filter(book_id=instance.pk).delete()
+    DownloadLog.objects.filter(book_id=instance.pk).delete()
+
+
+@receiver(post_delete, sender=get_user_model())
+def detach_events_on_user_delete(sender, instance, **kwargs):
+    BookView.objects.filter(user_id=instance.pk).update(user=None)
+    DownloadLog.objects.filter(user_id=instance.pk).delete()
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def update_typeahead_index(sender, instance, **kwargs):
+    """
+    Изменение книги/автора/жанра → индекс подсказок этого процесса.
+    Другие процессы подхватят изменение по версии CATALOG.
+    """
+    kind = {Book: typeahead.BOOK, Author: typeahead.AUTHOR, Genre: typeahead.GENRE}[sender]
+    pk = instance.pk
+    deleted = 'created' not in kwargs
+    transaction.on_commit(lambda: typeahead.apply_change(kind, pk, instance, deleted=deleted))
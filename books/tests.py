@@ -0,0 +1,511 @@
+# books/tests.py
+import base64
+import json
+import time
+from datetime import datetime, timezone as dt_timezone
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.conf import settings
+from django.db import connections, router
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .favorites import CACHE_KEY, FavoriteIds, get_favorite_ids
+from . import typeahead
+from .models import Author, Book, BookView, DownloadLog, Favorite, Genre
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+from .search import cached_search, query_variants, search_with_fallback, to_cyrillic, to_latin
+from .versioning import CATALOG, DOWNLOADS, book_stats, bump_version, favorites, get_version
+from .views import catalog_views
+
+
+def make_cursor(values):
+    raw = json.dumps(values).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+# ---------------------------------------
+# Курсоры (books/pagination.py)
+# ---------------------------------------
+class CursorDecodingTests(SimpleTestCase):
+    def test_round_trip(self):
+        book = Book(id=42, title='Война и мир', created_at=datetime(2024, 5, 1, 12, tzinfo=dt_timezone.utc))
+        self.assertEqual(decode_cursor(encode_cursor(book, 'title'), 'title'), ['Война и мир', 42])
+        self.assertEqual(decode_cursor(encode_cursor(book, 'new'), 'new'), [book.created_at, 42])
+
+    def test_rejects_garbage(self):
+        for cursor in ('', '!!!', 'e30', make_cursor(['a'])):
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                decode_cursor(cursor, 'title')
+
+    def test_rejects_non_integer_id(self):
+        for value in ('abc', '42', 4.2, True, None):
+            with self.subTest(value=value), self.assertRaises(InvalidCursor):
+                decode_cursor(make_cursor(['Война и мир', value]), 'title')
+
+    def test_rejects_non_string_title(self):
+        with self.assertRaises(InvalidCursor):
+            decode_cursor(make_cursor([{'a': 1}, 42]), 'title')
+
+    def test_rejects_naive_or_invalid_datetime(self):
+        for value in ('2024-05-01T12:00:00', 'вчера', 20240501):
+            with self.subTest(value=value), self.assertRaises(InvalidCursor):
+                decode_cursor(make_cursor([value, 42]), 'new')
+
+
+class CursorEndpointTests(TestCase):
+    # Запрос будит индекс подсказок, а он читает журналы (база 'analytics')
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(3):
+            Book.objects.create(title=f'Книга {i}', slug=f'kniga-{i}')
+
+    def test_forged_cursor_is_bad_request(self):
+        cursor = make_cursor(['Книга 1', 'abc'])
+        for url in (reverse('books:api_book_list'), reverse('books:catalog_books_fragment')):
+            with self.subTest(url=url):
+                response = self.client.get(url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+
+    def test_next_page(self):
+        response = self.client.get(reverse('books:api_book_list'), {'limit': 2})
+        self.assertEqual([b['title'] for b in response.json()['results']], ['Книга 0', 'Книга 1'])
+        response = self.client.get(response.json()['next'])
+        self.assertEqual([b['title'] for b in response.json()['results']], ['Книга 2'])
+        self.assertIsNone(response.json()['next'])
+
+
+# ---------------------------------------
+# Версии (books/versioning.py)
+# ---------------------------------------
+class VersioningTests(TestCase):
+    def test_version_is_stable_until_bumped(self):
+        version = get_version('tests')
+        self.assertEqual(get_version('tests'), version)
+        bumped = bump_version('tests')
+        self.assertNotEqual(bumped, version)
+        self.assertEqual(get_version('tests'), bumped)
+
+    def test_evicted_version_does_not_repeat(self):
+        version = get_version('tests')
+        cache.delete('version:tests')
+        self.assertNotEqual(get_version('tests'), version)
+
+
+# ---------------------------------------
+# ETag API и страниц каталога
+# ---------------------------------------
+class ApiEtagTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(name='Лев Толстой', slug='tolstoy')
+        cls.genre = Genre.objects.create(name='Роман', slug='roman')
+        book = Book.objects.create(title='Война и мир', slug='voyna-i-mir')
+        book.authors.add(cls.author)
+        book.genres.add(cls.genre)
+
+    def get(self, url, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.get(url, **headers)
+
+    def test_not_modified(self):
+        url = reverse('books:api_book_list')
+        etag = self.get(url)['ETag']
+        self.assertEqual(self.get(url, etag).status_code, 304)
+
+    def test_author_rename_changes_etag(self):
+        url = reverse('books:api_book_list')
+        etag = self.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.slug = 'lev-tolstoy'
+            self.author.save()
+        response = self.get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['authors'], ['lev-tolstoy'])
+
+    def test_book_detail_views_do_not_write_versions(self):
+        self.client.force_login(get_user_model().objects.create_user('reader'))
+        book = Book.objects.get()
+        url = reverse('books:detail', args=[book.slug])
+        version = get_version(book_stats(book.pk))
+        now = time.time()
+        with mock.patch('books.views.catalog_views.time.time', return_value=now):
+            etag = self.get(url)['ETag']
+            # Просмотр учтён, но версия статистики та же — страница не изменилась
+            self.assertEqual(BookView.objects.filter(book=book).count(), 1)
+            self.assertEqual(get_version(book_stats(book.pk)), version)
+            self.assertEqual(self.get(url, etag).status_code, 304)
+
+        # Через BOOK_VIEWS_ETAG_WINDOW ETag меняется — счётчик просмотров обновится
+        later = now + settings.BOOK_VIEWS_ETAG_WINDOW
+        with mock.patch('books.views.catalog_views.time.time', return_value=later):
+            self.assertEqual(self.get(url, etag).status_code, 200)
+
+    def test_catalog_fragment_not_modified_until_catalog_changes(self):
+        url = reverse('books:catalog_books_fragment')
+        etag = self.get(url)['ETag']
+        self.assertEqual(self.get(url, etag).status_code, 304)
+        bump_version(CATALOG)
+        self.assertEqual(self.get(url, etag).status_code, 200)
+
+
+# ---------------------------------------
+# Кэш избранного (books/favorites.py)
+# ---------------------------------------
+class FavoriteIdsCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('reader', password='secret')
+        cls.book = Book.objects.create(title='Война и мир', slug='voyna-i-mir')
+
+    def favorite_ids(self):
+        # Новый объект пользователя — без кэша в пределах запроса
+        return get_favorite_ids(get_user_model().objects.get(pk=self.user.pk))
+
+    def test_signal_invalidates_cache(self):
+        self.assertNotIn(self.book.pk, self.favorite_ids())
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorite.objects.create(user=self.user, book=self.book)
+        self.assertIn(self.book.pk, self.favorite_ids())
+
+    def test_late_write_does_not_override_invalidation(self):
+        # Запрос прочитал версию и пустое избранное, а до записи в кэш пользователь добавил книгу
+        version = get_version(favorites(self.user.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorite.objects.create(user=self.user, book=self.book)
+        cache.add(CACHE_KEY.format(user_id=self.user.pk, version=version), FavoriteIds([]))
+        self.assertIn(self.book.pk, self.favorite_ids())
+
+
+# ---------------------------------------
+# Beacon просмотра и cookie посетителя (books/tracking.py)
+# ---------------------------------------
+class VisitorCookieTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title='Война и мир', slug='voyna-i-mir')
+
+    def test_beacon_sets_cookie_scoped_to_beacon_path(self):
+        url = reverse('books:record_view', args=[self.book.pk])
+        self.assertTrue(url.startswith(settings.VISITOR_COOKIE_PATH))
+
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 204)
+        cookie = response.cookies[settings.VISITOR_COOKIE_NAME]
+        self.assertEqual(cookie['path'], settings.VISITOR_COOKIE_PATH)
+
+        # Тот же посетитель в окне дедупликации — просмотр не дублируется
+        response = self.client.post(url)
+        self.assertNotIn(settings.VISITOR_COOKIE_NAME, response.cookies)
+        self.assertEqual(BookView.objects.filter(book=self.book).count(), 1)
+
+    def test_anonymous_page_is_shared(self):
+        response = self.client.get(reverse('books:detail', args=[self.book.slug]))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertEqual(response.cookies, {})
+
+    def test_anonymous_page_drops_legacy_cookie(self):
+        self.client.cookies[settings.VISITOR_COOKIE_NAME] = 'legacy'
+        response = self.client.get(reverse('books:detail', args=[self.book.slug]))
+        cookie = response.cookies[settings.VISITOR_COOKIE_NAME]
+        self.assertEqual((cookie.value, cookie['path']), ('', '/'))
+
+
+# ---------------------------------------
+# API избранного (books:favorite_api)
+# ---------------------------------------
+class FavoriteApiTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('reader', password='secret')
+        cls.book = Book.objects.create(title='Война и мир', slug='voyna-i-mir')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.url = reverse('books:favorite_api', args=[self.book.pk])
+
+    def call(self, method):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['favorited']
+
+    def test_put_and_delete_are_idempotent(self):
+        for _ in range(2):
+            self.assertTrue(self.call('put'))
+            self.assertEqual(Favorite.objects.filter(user=self.user, book=self.book).count(), 1)
+        for _ in range(2):
+            self.assertFalse(self.call('delete'))
+            self.assertFalse(Favorite.objects.filter(user=self.user, book=self.book).exists())
+
+    def test_get_returns_current_state(self):
+        self.assertFalse(self.call('get'))
+        self.call('put')
+        self.assertTrue(self.call('get'))
+
+    def test_changes_reset_favorites_cache(self):
+        self.call('put')
+        self.assertIn(self.book.pk, get_favorite_ids(get_user_model().objects.get(pk=self.user.pk)))
+        self.call('delete')
+        self.assertNotIn(self.book.pk, get_favorite_ids(get_user_model().objects.get(pk=self.user.pk)))
+
+    def test_delete_is_one_statement(self):
+        self.call('put')
+        with CaptureQueriesContext(connections[router.db_for_write(Favorite)]) as queries, \
+                mock.patch('books.views.interaction_views.replicas.pin_to_primary') as pin:
+            self.assertFalse(self.call('delete'))
+        favorite_queries = [q['sql'] for q in queries.captured_queries if 'books_favorite' in q['sql']]
+        self.assertEqual(len(favorite_queries), 1)
+        self.assertTrue(favorite_queries[0].startswith('DELETE'))
+        pin.assert_called_once()
+
+    def test_anonymous_and_missing_book(self):
+        self.assertEqual(self.client.put(reverse('books:favorite_api', args=[0])).status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.client.put(self.url).status_code, 401)
+
+
+# ---------------------------------------
+# Поиск с транслитерацией (books/search.py)
+# ---------------------------------------
+class TransliterationTests(SimpleTestCase):
+    def test_latin_to_cyrillic(self):
+        for latin, cyrillic in (('Tolstoy', 'толстой'), ('Dostoevsky', 'достоевский'), ('Shchedrin', 'щедрин')):
+            with self.subTest(latin=latin):
+                self.assertEqual(to_cyrillic(latin), cyrillic)
+
+    def test_cyrillic_to_latin(self):
+        for cyrillic, latin in (('Чехов', 'chekhov'), ('Достоевский', 'dostoevsky'), ('Щедрин', 'shchedrin')):
+            with self.subTest(cyrillic=cyrillic):
+                self.assertEqual(to_latin(cyrillic), latin)
+
+    def test_query_variants(self):
+        self.assertEqual(query_variants('Tolstoy'), ['Tolstoy', 'толстой'])
+        self.assertEqual(query_variants('Чехов'), ['Чехов', 'chekhov'])
+        self.assertEqual(query_variants('1984'), ['1984'])
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Author.objects.create(name='Lev Tolstoy', slug='tolstoy')
+        Author.objects.create(name='Anton Chekhov', slug='chekhov')
+        for i in range(5):
+            Author.objects.create(name=f'Толстой {i}', slug=f'tolstoy-{i}')
+
+    def names(self, query):
+        return [author.name for author in search_with_fallback(Author.objects.all(), 'name', query)]
+
+    def test_finds_transliterated(self):
+        self.assertIn('Lev Tolstoy', self.names('толстой'))
+        self.assertEqual(self.names('Чехов'), ['Anton Chekhov'])
+
+    @override_settings(SEARCH_RESULTS_LIMIT=3)
+    def test_exact_matches_are_limited(self):
+        self.assertEqual(len(self.names('Толстой')), 3)
+
+    def test_cached_until_catalog_changes(self):
+        results, cached = cached_search('chekhov')
+        self.assertFalse(cached)
+        self.assertEqual(cached_search('chekhov'), (results, True))
+        bump_version(CATALOG)
+        self.assertFalse(cached_search('chekhov')[1])
+
+
+# ---------------------------------------
+# Подсказки поиска (books/typeahead.py)
+# ---------------------------------------
+class TypeaheadIndexTests(SimpleTestCase):
+    def index(self, *items):
+        entries = [
+            typeahead.Entry(typeahead.BOOK, pk, label, f'book-{pk}', popularity)
+            for pk, (label, popularity) in enumerate(items, start=1)
+        ]
+        return typeahead.PrefixIndex(entries)
+
+    def labels(self, index, query, limit=8):
+        return [entry.label for entry in index.search(query, limit)]
+
+    def test_normalize(self):
+        self.assertEqual(typeahead.normalize('  Ёжик  В ТУМАНЕ '), 'ежик в тумане')
+        self.assertEqual(typeahead.normalize('Straße'), 'strasse')
+
+    def test_keys_start_at_every_word(self):
+        self.assertEqual(list(typeahead._keys('Лев  Толстой')), ['лев толстой', 'толстой'])
+        index = self.index(('Лев Толстой', 0))
+        self.assertEqual(self.labels(index, 'лев т'), ['Лев Толстой'])
+        self.assertEqual(self.labels(index, 'ТОЛСТ'), ['Лев Толстой'])
+        self.assertEqual(self.labels(index, 'ёлка'), [])
+        self.assertEqual(self.labels(index, 'олст'), [])
+
+    def test_ranked_by_popularity(self):
+        index = self.index(('Книга А', 1), ('Книга Б', 5), ('Книга В', 3), ('Другая', 10))
+        self.assertEqual(self.labels(index, 'кни'), ['Книга Б', 'Книга В', 'Книга А'])
+        self.assertEqual(self.labels(index, 'к', limit=2), ['Книга Б', 'Книга В'])
+        self.assertEqual(self.labels(index, 'книга а'), ['Книга А'])
+
+    def test_put_and_remove(self):
+        index = self.index(('Анна Каренина', 7))
+        index.put(typeahead.Entry(typeahead.BOOK, 1, 'Воскресение', 'book-1'))
+        self.assertEqual(self.labels(index, 'анна'), [])
+        [entry] = index.search('воскр')
+        self.assertEqual(entry.popularity, 7)
+        self.assertEqual(self.labels(index, 'в'), ['Воскресение'])
+        index.remove(typeahead.BOOK, 1)
+        self.assertEqual(self.labels(index, 'воскр'), [])
+        self.assertEqual(len(index), 0)
+
+    @override_settings(TYPEAHEAD_MAX_ENTRIES=1)
+    def test_put_respects_max_entries(self):
+        index = self.index(('Анна Каренина', 0))
+        index.put(typeahead.Entry(typeahead.BOOK, 2, 'Воскресение', 'book-2'))
+        self.assertEqual(self.labels(index, 'воскр'), [])
+        self.assertEqual(len(index), 1)
+
+
+class TypeaheadTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [get_user_model().objects.create_user(f'reader{i}') for i in range(3)]
+        cls.author = Author.objects.create(name='Лев Толстой', slug='tolstoy')
+        cls.genre = Genre.objects.create(name='Проза', slug='proza')
+        cls.books = [Book.objects.create(title=f'Роман {i}', slug=f'roman-{i}') for i in range(3)]
+        cls.books[2].authors.add(cls.author)
+        # Уникальные скачивания: Роман 2 — 3, Роман 1 — 1 (повтор не считается)
+        for user in cls.users:
+            DownloadLog.objects.create(book=cls.books[2], user=user, file_format='pdf')
+        for _ in range(2):
+            DownloadLog.objects.create(book=cls.books[1], user=cls.users[0], file_format='pdf')
+
+    def setUp(self):
+        patcher = mock.patch.object(typeahead, '_index', typeahead.build_index())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def labels(self, query):
+        return [entry.label for entry in typeahead.get_index().search(query)]
+
+    def test_popularity_from_unique_downloads(self):
+        self.assertEqual(self.labels('роман'), ['Роман 2', 'Роман 1', 'Роман 0'])
+        [author] = typeahead.get_index().search('толстой')
+        self.assertEqual((author.kind, author.popularity), (typeahead.AUTHOR, 3))
+
+    @override_settings(TYPEAHEAD_MAX_ENTRIES=3)
+    def test_load_keeps_most_popular(self):
+        labels = sorted(entry.label for entry in typeahead.load_entries())
+        self.assertEqual(labels, ['Лев Толстой', 'Роман 1', 'Роман 2'])
+
+    def test_signals_update_index(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            book = Book.objects.create(title='Хаджи-Мурат', slug='hadzhi-murat')
+        self.assertEqual(self.labels('хаджи'), ['Хаджи-Мурат'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book.title = 'Казаки'
+            book.save()
+        self.assertEqual(self.labels('хаджи'), [])
+        self.assertEqual(self.labels('казаки'), ['Казаки'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book.is_active = False
+            book.save()
+        self.assertEqual(self.labels('казаки'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.genre.delete()
+        self.assertEqual(self.labels('проза'), [])
+
+    def test_rebuilds_after_downloads(self):
+        index = typeahead.get_index()
+        with mock.patch.object(typeahead, 'rebuild_in_background') as rebuild, \
+                mock.patch.object(typeahead, '_checked_at', 0.0):
+            typeahead.get_index()
+            rebuild.assert_not_called()
+
+            bump_version(DOWNLOADS)  # успешное скачивание (bump_download_stats)
+            typeahead._checked_at = 0.0
+            typeahead.get_index()
+            # Индекс ещё свежий — скачивания подождут POPULARITY_REFRESH_INTERVAL
+            rebuild.assert_not_called()
+
+            index.built_at -= typeahead.POPULARITY_REFRESH_INTERVAL
+            typeahead._checked_at = 0.0
+            typeahead.get_index()
+            rebuild.assert_called_once()
+
+
+# ---------------------------------------
+# Фрагменты каталога (catalog_books_fragment, catalog_filters_fragment)
+# ---------------------------------------
+class CatalogFragmentTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.genre = Genre.objects.create(name='Роман', slug='roman')
+        for i in range(12):
+            book = Book.objects.create(title=f'Книга {i:02}', slug=f'kniga-{i}')
+            if i % 2:
+                book.genres.add(cls.genre)
+
+    def test_books_fragment_pages_through_filtered_books(self):
+        url = reverse('books:catalog_books_fragment')
+        response = self.client.get(url, {'genres': 'roman'})
+        self.assertEqual(len(response.context['books']), 6)
+        self.assertNotIn('X-Next-Page', response)
+
+        response = self.client.get(url)
+        self.assertEqual(len(response.context['books']), 9)
+        response = self.client.get(response['X-Next-Page'])
+        self.assertEqual([b.title for b in response.context['books']], ['Книга 09', 'Книга 10', 'Книга 11'])
+        self.assertNotIn('X-Next-Page', response)
+
+    def test_filters_fragment_counts_found_books(self):
+        response = self.client.get(reverse('books:catalog_filters_fragment'), {'genres': 'roman'})
+        self.assertEqual(response.context['found_count'], 6)
+        self.assertContains(response, 'Найдено книг: <strong>6</strong>')
+
+
+# ---------------------------------------
+# Async-версия book_detail (book_detail_async)
+# ---------------------------------------
+class AsyncBookDetailTests(TransactionTestCase):
+    # Блоки выполняются в своих потоках и соединениях: данные должны быть закоммичены
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('reader', password='secret')
+        self.book = Book.objects.create(title='Война и мир', slug='voyna-i-mir')
+        self.book.authors.add(Author.objects.create(name='Лев Толстой', slug='tolstoy'))
+        Favorite.objects.create(user=self.user, book=self.book)
+
+    def render_args(self, view):
+        request = RequestFactory().get('/')
+        request.user = get_user_model().objects.get(pk=self.user.pk)
+        with mock.patch.object(catalog_views, '_render_book_detail') as render:
+            view(request, self.book.slug)
+        _, book, _, *counters = render.call_args.args
+        return [author.name for author in book.authors.all()], counters
+
+    def test_same_context_as_sync_view(self):
+        sync = self.render_args(catalog_views.book_detail)
+        # Повторный просмотр того же пользователя не учитывается, счётчики совпадают
+        self.assertEqual(self.render_args(async_to_sync(catalog_views.book_detail_async)), sync)
+        self.assertEqual(sync, (['Лев Толстой'], [True, 1, 0]))
@@ -0,0 +1,89 @@
+# books/tracking.py
+"""
+Учёт просмотров книг и идентичность анонимного посетителя.
+
+Анонимный посетитель определяется подписанной (HMAC, SECRET_KEY) cookie
+со случайным id — без записи в таблицу сессий. Этот id хранится в
+BookView.session_key, поэтому дедупликация просмотров работает как раньше.
+
+Cookie ставится с path=VISITOR_COOKIE_PATH — её видит только beacon просмотра.
+Запросы страниц приходят без неё, и общий кэш (Vary: Cookie) отдаёт всем
+анонимам одну копию. Cookie старого формата (path=/) страницы удаляют
+(conditional.finalize).
+"""
+
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import BookView
+
+# Повторный просмотр той же книги в течение этого окна не учитывается
+VIEW_TIMEOUT = timedelta(minutes=6)
+
+VISITOR_SALT = 'books.tracking.visitor'
+
+
+def get_visitor_id(request):
+    """
+    id анонимного посетителя из подписанной cookie.
+    Если cookie нет или подпись неверна — выдаём новый id
+    (cookie выставит remember_visitor на ответе).
+    """
+    visitor_id = getattr(request, '_visitor_id', None)
+    if visitor_id:
+        return visitor_id
+
+    visitor_id = request.get_signed_cookie(
+        settings.VISITOR_COOKIE_NAME,
+        default=None,
+        salt=VISITOR_SALT,
+    )
+    if not visitor_id:
+        visitor_id = f'v:{uuid.uuid4().hex}'  # 34 символа, влезает в session_key
+        request._new_visitor = True
+
+    request._visitor_id = visitor_id
+    return visitor_id
+
+
+def remember_visitor(request, response):
+    if getattr(request, '_new_visitor', False):
+        response.set_signed_cookie(
+            settings.VISITOR_COOKIE_NAME,
+            request._visitor_id,
+            salt=VISITOR_SALT,
+            max_age=settings.VISITOR_COOKIE_AGE,
+            path=settings.VISITOR_COOKIE_PATH,
+            httponly=True,
+            samesite='Lax',
+            secure=request.is_secure(),
+        )
+    return response
+
+
+def record_book_view(book, user=None, visitor_id=None):
+    """
+    Создаёт BookView, если этот пользователь/посетитель не смотрел книгу
+    в последние VIEW_TIMEOUT. Возвращает True, если просмотр записан.
+    """
+    threshold = timezone.now() - VIEW_TIMEOUT
+
+    if user is not None:
+        lookup = {'user': user}
+    else:
+        lookup = {'session_key': visitor_id}
+
+    recent_view = BookView.objects.filter(
+        book=book,
+        created_at__gte=threshold,
+        **lookup
+    ).exists()
+
+    if recent_view:
+        return False
+
+    BookView.objects.create(book=book, **lookup)
+    return True
@@ -0,0 +1,303 @@
+# books/typeahead.py
+"""
+Префиксный индекс для подсказок поиска (api_autocomplete) — в памяти процесса.
+
+Ключи — нормализованные названия книг и имена авторов/жанров (casefold, ё → е),
+начиная с каждого слова: «Лев Толстой» находится и по «лев т», и по «толст».
+Ключи лежат в отсортированном списке, поиск — bisect по префиксу.
+Для коротких префиксов (1–2 символа) совпадений тысячи, поэтому лучшие
+TOP_K записей для них считаются заранее — поиск всегда доли миллисекунды.
+
+Ранжирование — по популярности: у книги это уникальные скачивания
+(как «Скачано» на карточке), у автора и жанра — сумма по их книгам.
+
+Актуальность:
+- изменения в этом процессе — сразу, сигналами Book/Author/Genre;
+- изменения в других процессах — по версии CATALOG (books/versioning.py):
+  раз в VERSION_CHECK_INTERVAL секунд версия сверяется, и при расхождении
+  индекс перестраивается в фоне (до этого отдаётся прежний);
+- популярность — по версии DOWNLOADS: скачивания каталог не меняют, поэтому
+  индекс, построенный больше POPULARITY_REFRESH_INTERVAL секунд назад,
+  перестраивается, если с тех пор были скачивания. Чаще не нужно — на каждое
+  скачивание перестраивать индекс слишком дорого, а порядок подсказок
+  от одного скачивания почти не меняется.
+
+Поиск и изменения из сигналов идут под одной блокировкой: вставка ключа —
+это две вставки (keys и refs), и читатель между ними увидел бы чужую позицию.
+
+Память ограничена settings.TYPEAHEAD_MAX_ENTRIES: при большем каталоге
+в индекс попадают самые популярные записи.
+"""
+
+import bisect
+import heapq
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from analytics.stats import unique_downloads_by_book
+from .models import Book, Author, Genre
+from .versioning import get_version, CATALOG, DOWNLOADS
+
+logger = logging.getLogger(__name__)
+
+# Префиксы такой длины и короче отвечаются заранее посчитанными списками
+TOP_PREFIX_LEN = 2
+TOP_K = 20
+# Сколько совпадений длинного префикса просматривается для ранжирования
+SCAN_LIMIT = 5000
+# Ключ — не длиннее (длиннее запросы сравниваются по первым KEY_MAX_LEN символам)
+KEY_MAX_LEN = 48
+# Ключи начинаются не более чем с этого числа первых слов названия
+MAX_WORD_STARTS = 8
+VERSION_CHECK_INTERVAL = 1.0
+POPULARITY_REFRESH_INTERVAL = 300.0
+
+BOOK, AUTHOR, GENRE = 'book', 'author', 'genre'
+
+
+def normalize(text):
+    return ' '.join(text.casefold().replace('ё', 'е').split())
+
+
+def _keys(label):
+    words = normalize(label).split()
+    for i in range(min(len(words), MAX_WORD_STARTS)):
+        yield ' '.join(words[i:])[:KEY_MAX_LEN]
+
+
+class Entry:
+    __slots__ = ('kind', 'pk', 'label', 'slug', 'popularity')
+
+    def __init__(self, kind, pk, label, slug, popularity=0):
+        self.kind = kind
+        self.pk = pk
+        self.label = label
+        self.slug = slug
+        self.popularity = popularity
+
+
+class PrefixIndex:
+    def __init__(self, entries, version=None, downloads_version=None):
+        self.version = version
+        self.downloads_version = downloads_version
+        self.built_at = time.monotonic()
+        self.entries = []      # позиция → Entry (None — удалена)
+        self.positions = {}    # (kind, pk) → позиция
+        self.keys = []         # отсортированные ключи
+        self.refs = []         # позиция записи для каждого ключа
+        self.top = {}          # короткий префикс → [позиции] по убыванию популярности
+        self._lock = threading.Lock()
+
+        pairs = []
+        for entry in entries:
+            position = self._append(entry)
+            pairs.extend((key, position) for key in _keys(entry.label))
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.refs = [position for _, position in pairs]
+        self._build_top()
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _append(self, entry):
+        position = len(self.entries)
+        self.entries.append(entry)
+        self.positions[(entry.kind, entry.pk)] = position
+        return position
+
+    def _rank(self, position):
+        entry = self.entries[position]
+        return entry.popularity, -position
+
+    def _build_top(self):
+        candidates = {}
+        for key, position in zip(self.keys, self.refs):
+            for size in range(1, min(TOP_PREFIX_LEN, len(key)) + 1):
+                candidates.setdefault(key[:size], set()).add(position)
+        self.top = {
+            prefix: heapq.nlargest(TOP_K, positions, key=self._rank)
+            for prefix, positions in candidates.items()
+        }
+
+    # ---------------------------------------
+    # Поиск
+    # ---------------------------------------
+    def search(self, query, limit=8):
+        prefix = normalize(query)[:KEY_MAX_LEN]
+        if not prefix:
+            return []
+        with self._lock:
+            return self._search(prefix, limit)
+
+    def _search(self, prefix, limit):
+        if len(prefix) <= TOP_PREFIX_LEN:
+            positions = self.top.get(prefix, ())
+            found = [self.entries[p] for p in positions if self.entries[p] is not None]
+            return found[:limit]
+
+        seen = set()
+        start = bisect.bisect_left(self.keys, prefix)
+        for i in range(start, min(start + SCAN_LIMIT, len(self.keys))):
+            if not self.keys[i].startswith(prefix):
+                break
+            position = self.refs[i]
+            if self.entries[position] is not None:
+                seen.add(position)
+        return [self.entries[p] for p in heapq.nlargest(limit, seen, key=self._rank)]
+
+    # ---------------------------------------
+    # Изменения из сигналов
+    # ---------------------------------------
+    def put(self, entry):
+        with self._lock:
+            old = self.positions.get((entry.kind, entry.pk))
+            if old is not None:
+                entry.popularity = self.entries[old].popularity
+                if self.entries[old].label == entry.label:
+                    self.entries[old] = entry
+                    return
+                self.entries[old] = None
+            elif len(self.positions) >= settings.TYPEAHEAD_MAX_ENTRIES:
+                return
+
+            position = self._append(entry)
+            for key in _keys(entry.label):
+                i = bisect.bisect_left(self.keys, key)
+                self.keys.insert(i, key)
+                self.refs.insert(i, position)
+                for size in range(1, min(TOP_PREFIX_LEN, len(key)) + 1):
+                    top = self.top.setdefault(key[:size], [])
+                    if len(top) < TOP_K and position not in top:
+                        top.append(position)
+
+    def remove(self, kind, pk):
+        with self._lock:
+            position = self.positions.pop((kind, pk), None)
+            if position is not None:
+                # Ключи остаются до перестроения, поиск пропускает пустые позиции
+                self.entries[position] = None
+
+
+# ---------------------------------------
+# Построение из базы
+# ---------------------------------------
+def load_entries():
+    downloads = unique_downloads_by_book()
+
+    books = [
+        Entry(BOOK, pk, title, slug, downloads.get(pk, 0))
+        for pk, title, slug in Book.objects.filter(is_active=True).values_list('id', 'title', 'slug').iterator()
+    ]
+
+    by_author, by_genre = {}, {}
+    for book_id, author_id in Book.authors.through.objects.values_list('book_id', 'author_id').iterator():
+        by_author[author_id] = by_author.get(author_id, 0) + downloads.get(book_id, 0)
+    for book_id, genre_id in Book.genres.through.objects.values_list('book_id', 'genre_id').iterator():
+        by_genre[genre_id] = by_genre.get(genre_id, 0) + downloads.get(book_id, 0)
+
+    authors = [
+        Entry(AUTHOR, pk, name, slug, by_author.get(pk, 0))
+        for pk, name, slug in Author.objects.values_list('id', 'name', 'slug').iterator()
+    ]
+    genres = [
+        Entry(GENRE, pk, name, slug, by_genre.get(pk, 0))
+        for pk, name, slug in Genre.objects.values_list('id', 'name', 'slug')
+    ]
+
+    entries = genres + authors + books
+    if len(entries) > settings.TYPEAHEAD_MAX_ENTRIES:
+        entries = heapq.nlargest(settings.TYPEAHEAD_MAX_ENTRIES, entries, key=lambda e: e.popularity)
+    return entries
+
+
+def build_index():
+    started = time.perf_counter()
+    # Версии — до чтения данных: изменение во время построения даст новую версию
+    version = get_version(CATALOG)
+    downloads_version = get_version(DOWNLOADS)
+    index = PrefixIndex(load_entries(), version, downloads_version)
+    logger.info('Индекс подсказок: %d записей, %d ключей за %.0f мс',
+                len(index), len(index.keys), (time.perf_counter() - started) * 1000)
+    return index
+
+
+# ---------------------------------------
+# Индекс процесса
+# ---------------------------------------
+_index = None
+_build_lock = threading.Lock()
+_rebuilding = threading.Event()
+_checked_at = 0.0
+
+
+def _rebuild():
+    global _index
+    try:
+        _index = build_index()
+    except Exception:
+        logger.exception('Не удалось перестроить индекс подсказок')
+    finally:
+        # Соединения фонового потока больше не понадобятся
+        connections.close_all()
+        _rebuilding.clear()
+
+
+def rebuild_in_background():
+    if _rebuilding.is_set():
+        return
+    _rebuilding.set()
+    threading.Thread(target=_rebuild, name='typeahead-rebuild', daemon=True).start()
+
+
+def get_index():
+    """
+    Индекс процесса. Первый вызов строит его синхронно; дальше раз в
+    VERSION_CHECK_INTERVAL секунд сверяет версию каталога (а для индекса старше
+    POPULARITY_REFRESH_INTERVAL — и версию скачиваний) и при изменении
+    перестраивает индекс в фоне.
+    """
+    global _index, _checked_at
+    if _index is None:
+        with _build_lock:
+            if _index is None:
+                _index = build_index()
+                _checked_at = time.monotonic()
+        return _index
+
+    now = time.monotonic()
+    if now - _checked_at >= VERSION_CHECK_INTERVAL:
+        _checked_at = now
+        if get_version(CATALOG) != _index.version:
+            rebuild_in_background()
+        elif (now - _index.built_at >= POPULARITY_REFRESH_INTERVAL
+              and get_version(DOWNLOADS) != _index.downloads_version):
+            rebuild_in_background()
+    return _index
+
+
+def warm_up(**kwargs):
+    """
+    Строит индекс в фоне при первом запросе к процессу (request_started),
+    чтобы первый пользователь подсказок его не ждал.
+    """
+    if _index is None:
+        rebuild_in_background()
+
+
+def apply_change(kind, pk, instance, deleted=False):
+    """
+    Изменение из сигнала. Если индекс ещё не построен — ничего делать не нужно.
+    pk передаётся отдельно: после delete() у instance он уже None.
+    """
+    if _index is None:
+        return
+    if deleted or (kind == BOOK and not instance.is_active):
+        _index.remove(kind, pk)
+    else:
+        label = instance.title if kind == BOOK else instance.name
+        _index.put(Entry(kind, pk, label, instance.slug))
@@ -1,16 +1,32 @@
 # books/urls.py
+from django.conf import settings
 from django.urls import path
 from . import views
-from .views.catalog_views import catalog, genre_list, book_detail, genre_detail, author_detail, author_list, search
-from .views.interaction_views import favorite_toggle, download_book
+from .views.catalog_views import catalog, genre_list, book_detail, book_detail_async, genre_detail, author_detail, author_list, search
+from .views.catalog_views import catalog_books_fragment, catalog_filters_fragment
+from .views.interaction_views import favorite_toggle, favorite_api, download_book, record_view, search_click
+from .views import api_views
 app_name = 'books'
 
 urlpatterns = [
     # /catalog/  -> список книг
     path('', views.catalog, name='catalog'),
+    # Фрагменты каталога: порция карточек по курсору и боковая панель фильтров
+    path('fragments/books/', catalog_books_fragment, name='catalog_books_fragment'),
+    path('fragments/filters/', catalog_filters_fragment, name='catalog_filters_fragment'),
 
 # Поиск — ДО детальной книги!
     path('search/', search, name='search'),
+    path('search/click/', search_click, name='search_click'),
+
+# JSON API (только чтение) — ДО детальной книги!
+    path('api/books/', api_views.api_book_list, name='api_book_list'),
+    path('api/books/<slug:slug>/', api_views.api_book_detail, name='api_book_detail'),
+    path('api/authors/', api_views.api_author_list, name='api_author_list'),
+    path('api/authors/<slug:slug>/', api_views.api_author_detail, name='api_author_detail'),
+    path('api/genres/', api_views.api_genre_list, name='api_genre_list'),
+    path('api/genres/<slug:slug>/', api_views.api_genre_detail, name='api_genre_detail'),
+    path('api/autocomplete/', api_views.api_autocomplete, name='api_autocomplete'),
 
 # Списки жанров и авторов — ДО детальной книги!
     path('genres/', genre_list, name='genre_list'),
@@ -20,9 +36,13 @@ urlpatterns = [
     path('genres/<slug:slug>/', genre_detail, name='genre_detail'),
     path('authors/<slug:slug>/', author_detail, name='author_detail'),
 
+    # Beacon просмотра: отдельный префикс — под ним живёт cookie посетителя (VISITOR_COOKIE_PATH)
+    path('view/<int:pk>/', record_view, name='record_view'),
+
     # /catalog/<pk>/ -> детальная страница книги
-    path('<slug:slug>/', book_detail, name='detail'),
+    path('<slug:slug>/', book_detail_async if settings.ASYNC_VIEWS else book_detail, name='detail'),
     # Скачивание и избранное
     path('<int:pk>/download/<str:fmt>/', download_book, name='download'),
     path('<int:pk>/favorite/', favorite_toggle, name='favorite_toggle'),
+    path('<int:pk>/favorite/api/', favorite_api, name='favorite_api'),
 ]
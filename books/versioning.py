@@ -0,0 +1,58 @@
+# books/versioning.py
+"""
+Версии данных в кэше — дешёвые валидаторы для ETag и инвалидации кэшей.
+
+- CATALOG — любое изменение Book / Author / Genre;
+- DOWNLOADS — любое успешное скачивание (счётчики на карточках);
+- book_stats(id) — скачивания конкретной книги (просмотры версию не меняют:
+  это была бы запись в кэш на каждый просмотр — см. BOOK_VIEWS_ETAG_WINDOW);
+- favorites(user_id) — избранное пользователя (books/favorites.py).
+
+Версии должны быть общими для всех процессов, поэтому кэш — общий
+(CACHES в library/settings.py: Redis или таблица в базе, не LocMem).
+
+Версия — случайная метка, а не счётчик: bump_version просто записывает новую.
+Так не нужен атомарный incr (у DatabaseCache его нет — это get + set), и
+версия, заведённая заново после вытеснения ключа, не совпадёт со старой.
+Сравнивать версии можно только на равенство.
+"""
+
+import secrets
+
+from django.core.cache import cache
+
+CATALOG = 'catalog'
+DOWNLOADS = 'downloads'
+VERSION_TIMEOUT = None  # без срока жизни
+
+
+def book_stats(book_id):
+    return f'stats:book:{book_id}'
+
+
+def favorites(user_id):
+    return f'favorites:user:{user_id}'
+
+
+def _key(name):
+    return f'version:{name}'
+
+
+def _new_version():
+    return secrets.token_hex(8)
+
+
+def get_version(name):
+    key = _key(name)
+    version = cache.get(key)
+    if version is None:
+        version = _new_version()
+        if not cache.add(key, version, VERSION_TIMEOUT):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(name):
+    version = _new_version()
+    cache.set(_key(name), version, VERSION_TIMEOUT)
+    return version
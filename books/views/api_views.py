@@ -0,0 +1,301 @@
+# books/views/api_views.py
+"""
+Read-only JSON API каталога: книги, авторы, жанры.
+
+- курсорная пагинация (?cursor=..., ?limit=...), см. books/pagination.py;
+- разреженные поля (?fields=id,title,authors);
+- те же фильтры, что и в catalog() (?genres=...&authors=...);
+- ETag по updated_at и версии каталога: при совпадении If-None-Match — 304
+  без сериализации. Версия CATALOG нужна, потому что в ответах есть slug'и
+  авторов и жанров: их переименование не меняет Book.updated_at.
+"""
+
+import hashlib
+
+from django.db.models import Count, Max
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.urls import reverse
+from django.views.decorators.http import require_safe
+
+from .. import typeahead
+from ..models import Book, Author, Genre
+from ..pagination import paginate, InvalidCursor
+from ..versioning import get_version, CATALOG
+from .catalog_views import filter_catalog_books
+
+API_DEFAULT_LIMIT = 20
+API_MAX_LIMIT = 100
+
+AUTOCOMPLETE_DEFAULT_LIMIT = 8
+AUTOCOMPLETE_MAX_LIMIT = 20
+
+
+def _media_url(field):
+    return field.url if field else None
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+# ---------------------------------------
+# Описание полей ресурсов
+# поле → (функция сериализации, колонки модели для only(), prefetch)
+# ---------------------------------------
+BOOK_FIELDS = {
+    'id': (lambda b: b.pk, [], None),
+    'slug': (lambda b: b.slug, ['slug'], None),
+    'title': (lambda b: b.title, ['title'], None),
+    'description': (lambda b: b.description, ['description'], None),
+    'authors': (lambda b: [a.slug for a in b.authors.all()], [], 'authors'),
+    'genres': (lambda b: [g.slug for g in b.genres.all()], [], 'genres'),
+    'cover': (lambda b: _media_url(b.cover), ['cover'], None),
+    'formats': (
+        lambda b: [fmt for fmt in ('pdf', 'epub', 'fb2') if getattr(b, f'file_{fmt}')],
+        ['file_pdf', 'file_epub', 'file_fb2'],
+        None,
+    ),
+    'created_at': (lambda b: _iso(b.created_at), ['created_at'], None),
+    'updated_at': (lambda b: _iso(b.updated_at), ['updated_at'], None),
+}
+BOOK_DEFAULT_FIELDS = ['id', 'slug', 'title', 'authors', 'genres', 'cover', 'formats', 'updated_at']
+
+AUTHOR_FIELDS = {
+    'id': (lambda a: a.pk, [], None),
+    'slug': (lambda a: a.slug, ['slug'], None),
+    'name': (lambda a: a.name, ['name'], None),
+    'bio': (lambda a: a.bio, ['bio'], None),
+    'birth_date': (lambda a: _iso(a.birth_date), ['birth_date'], None),
+    'death_date': (lambda a: _iso(a.death_date), ['death_date'], None),
+    'photo': (lambda a: _media_url(a.photo), ['photo'], None),
+    'updated_at': (lambda a: _iso(a.updated_at), ['updated_at'], None),
+}
+AUTHOR_DEFAULT_FIELDS = ['id', 'slug', 'name', 'photo', 'updated_at']
+
+GENRE_FIELDS = {
+    'id': (lambda g: g.pk, [], None),
+    'slug': (lambda g: g.slug, ['slug'], None),
+    'name': (lambda g: g.name, ['name'], None),
+    'description': (lambda g: g.description, ['description'], None),
+    'updated_at': (lambda g: _iso(g.updated_at), ['updated_at'], None),
+}
+GENRE_DEFAULT_FIELDS = ['id', 'slug', 'name', 'updated_at']
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _error(message, status=400):
+    return JsonResponse({'error': message}, status=status, json_dumps_params={'ensure_ascii': False})
+
+
+def _parse_fields(request, spec, default):
+    raw = request.GET.get('fields')
+    if not raw:
+        return default
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in spec]
+    if unknown:
+        raise BadRequest(f'Неизвестные поля: {", ".join(unknown)}')
+    return fields
+
+
+def _parse_limit(request):
+    try:
+        limit = int(request.GET.get('limit', API_DEFAULT_LIMIT))
+    except ValueError:
+        raise BadRequest('limit должен быть числом')
+    return max(1, min(limit, API_MAX_LIMIT))
+
+
+def _shape(queryset, spec, fields, ordering_columns=()):
+    """
+    Ограничивает выборку нужными колонками и prefetch только для запрошенных связей.
+    """
+    columns = {'id', 'updated_at', *ordering_columns}
+    prefetch = []
+    for name in fields:
+        _, cols, related = spec[name]
+        columns.update(cols)
+        if related:
+            prefetch.append(related)
+    return queryset.only(*columns).prefetch_related(*prefetch)
+
+
+def _serialize(obj, spec, fields):
+    return {name: spec[name][0](obj) for name in fields}
+
+
+def _etag(*parts):
+    return '"%s"' % hashlib.md5('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+
+
+def _respond(request, etag, build):
+    """
+    304, если клиентская версия актуальна, иначе JSON из build().
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(build(), json_dumps_params={'ensure_ascii': False})
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+    return response
+
+
+# ---------------------------------------
+# Общие списки и детальные ответы
+# ---------------------------------------
+def _list(request, queryset, spec, default_fields, ordering, ordering_columns):
+    try:
+        fields = _parse_fields(request, spec, default_fields)
+        limit = _parse_limit(request)
+        cursor = request.GET.get('cursor')
+
+        # Версия коллекции: число записей + последнее изменение + версия каталога + параметры запроса
+        stats = queryset.order_by().aggregate(n=Count('id', distinct=True), last=Max('updated_at'))
+        etag = _etag(
+            queryset.model.__name__, stats['n'], _iso(stats['last']),
+            get_version(CATALOG), request.GET.urlencode(),
+        )
+
+        def build():
+            items, next_cursor = paginate(
+                _shape(queryset, spec, fields, ordering_columns), ordering, cursor, limit
+            )
+            next_url = None
+            if next_cursor:
+                params = request.GET.copy()
+                params['cursor'] = next_cursor
+                next_url = f'{request.path}?{params.urlencode()}'
+            return {
+                'results': [_serialize(obj, spec, fields) for obj in items],
+                'next': next_url,
+            }
+
+        return _respond(request, etag, build)
+    except (BadRequest, InvalidCursor) as exc:
+        return _error(str(exc) if isinstance(exc, BadRequest) else 'Некорректный cursor')
+
+
+def _detail(request, queryset, slug, spec, default_fields):
+    try:
+        fields = _parse_fields(request, spec, default_fields)
+    except BadRequest as exc:
+        return _error(str(exc))
+
+    # Дешёвый запрос только за версией ресурса
+    stub = get_object_or_404(queryset.only('id', 'updated_at'), slug=slug)
+    etag = _etag(queryset.model.__name__, stub.pk, _iso(stub.updated_at), get_version(CATALOG), ','.join(fields))
+
+    def build():
+        obj = _shape(queryset.filter(pk=stub.pk), spec, fields).get()
+        return _serialize(obj, spec, fields)
+
+    return _respond(request, etag, build)
+
+
+# ---------------------------------------
+# Книги
+# ---------------------------------------
+@require_safe
+def api_book_list(request):
+    """
+    GET /catalog/api/books/?genres=..&authors=..&sort=title|new&fields=..&cursor=..&limit=..
+    """
+    sort = 'new' if request.GET.get('sort') == 'new' else 'title'
+    books = filter_catalog_books(
+        Book.objects.filter(is_active=True),
+        request.GET.getlist('genres'),
+        request.GET.getlist('authors'),
+    )
+    columns = ('created_at',) if sort == 'new' else ('title',)
+    return _list(request, books, BOOK_FIELDS, BOOK_DEFAULT_FIELDS, sort, columns)
+
+
+@require_safe
+def api_book_detail(request, slug):
+    books = Book.objects.filter(is_active=True)
+    return _detail(request, books, slug, BOOK_FIELDS, BOOK_DEFAULT_FIELDS + ['description'])
+
+
+# ---------------------------------------
+# Авторы и жанры
+# Фильтры — как «доступные» авторы/жанры в боковой панели каталога
+# ---------------------------------------
+@require_safe
+def api_author_list(request):
+    """
+    GET /catalog/api/authors/?genres=..  — авторы, у которых есть книги этих жанров
+    """
+    authors = Author.objects.all()
+    selected_genres = request.GET.getlist('genres')
+    if selected_genres:
+        authors = authors.filter(
+            books__genres__slug__in=selected_genres,
+            books__is_active=True
+        ).distinct()
+    return _list(request, authors, AUTHOR_FIELDS, AUTHOR_DEFAULT_FIELDS, 'name', ('name',))
+
+
+@require_safe
+def api_author_detail(request, slug):
+    return _detail(request, Author.objects.all(), slug, AUTHOR_FIELDS, AUTHOR_DEFAULT_FIELDS + ['bio', 'birth_date', 'death_date'])
+
+
+@require_safe
+def api_genre_list(request):
+    """
+    GET /catalog/api/genres/?authors=..  — жанры, в которых писали эти авторы
+    """
+    genres = Genre.objects.all()
+    selected_authors = request.GET.getlist('authors')
+    if selected_authors:
+        genres = genres.filter(
+            books__authors__slug__in=selected_authors,
+            books__is_active=True
+        ).distinct()
+    return _list(request, genres, GENRE_FIELDS, GENRE_DEFAULT_FIELDS, 'name', ('name',))
+
+
+@require_safe
+def api_genre_detail(request, slug):
+    return _detail(request, Genre.objects.all(), slug, GENRE_FIELDS, GENRE_DEFAULT_FIELDS + ['description'])
+
+
+# ---------------------------------------
+# Подсказки поиска
+# ---------------------------------------
+AUTOCOMPLETE_URLS = {
+    typeahead.BOOK: 'books:detail',
+    typeahead.AUTHOR: 'books:author_detail',
+    typeahead.GENRE: 'books:genre_detail',
+}
+
+
+@require_safe
+def api_autocomplete(request):
+    """
+    GET /catalog/api/autocomplete/?q=..&limit=..
+    Ответ из индекса в памяти процесса (books/typeahead.py), без запросов к БД.
+    """
+    query = request.GET.get('q', '')
+    try:
+        limit = int(request.GET.get('limit', AUTOCOMPLETE_DEFAULT_LIMIT))
+    except ValueError:
+        return _error('limit должен быть числом')
+    limit = max(1, min(limit, AUTOCOMPLETE_MAX_LIMIT))
+
+    results = [
+        {
+            'type': entry.kind,
+            'label': entry.label,
+            'url': reverse(AUTOCOMPLETE_URLS[entry.kind], kwargs={'slug': entry.slug}),
+        }
+        for entry in typeahead.get_index().search(query, limit)
+    ]
+    response = JsonResponse({'query': query, 'results': results}, json_dumps_params={'ensure_ascii': False})
+    response['Cache-Control'] = 'public, max-age=60'
+    return response
@@ -3,45 +3,74 @@
 Функции просмотра каталога: списки, детали, поиск
 """
 
-from django.shortcuts import render, get_object_or_404
+import time
+from functools import partial
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, get_object_or_404, aget_object_or_404
 from django.core.paginator import Paginator
-from django.db.models import Q, F, Count
-from django.db.models.functions import Lower
-from ..models import Book, Author, Genre, Favorite, BookView
-from django.utils import timezone
-from datetime import timedelta
+from django.http import HttpResponseBadRequest
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.views.decorators.http import require_safe
+from django.db.models import Sum, Max, prefetch_related_objects
+from ..models import Book, Author, Genre
+from django.conf import settings
+from analytics import search_log, sketches, stats
+from ..favorites import get_favorite_ids
+from ..tracking import record_book_view
+from ..search import cached_search, normalize_query
+from ..conditional import page_etag, not_modified, finalize
+from ..pagination import paginate, encode_cursor, order_by_args, InvalidCursor
+from ..versioning import get_version, book_stats, CATALOG, DOWNLOADS
+from library.concurrency import run_concurrently
+
+
+CATALOG_PAGE_SIZE = 9
 
 
 # ---------------------------------------
-# catalog — список книг с поиском
+# Счётчик уникальных скачиваний для карточек
+# Считается после выборки, запросом к журналу по id книг (без JOIN'а —
+# журнал может жить в базе 'analytics'). В приближённом режиме
+# (ANALYTICS_APPROXIMATE_COUNTS) — по HLL-скетчам.
 # ---------------------------------------
-def catalog(request):
-    """
-    Каталог книг с поиском, фильтрами и пагинацией
-    """
-    selected_genres = request.GET.getlist('genres')
-    selected_authors = request.GET.getlist('authors')
-
-    books = Book.objects.filter(is_active=True).prefetch_related(
-        'authors', 'genres'
-    ).annotate(
-        unique_downloads=Count(
-            'download_logs__user',
-            filter=Q(download_logs__status='success'),
-            distinct=True
-        )
-    )
-    
+def with_unique_downloads(books):
+    if settings.ANALYTICS_APPROXIMATE_COUNTS:
+        return sketches.attach_unique_downloads(books)
+    return stats.attach_unique_downloads(books)
 
-    # ===== ФИЛЬТРАЦИЯ КНИГ =====
+
+# ---------------------------------------
+# Фильтры каталога (общие для HTML-каталога и JSON API)
+# ---------------------------------------
+def filter_catalog_books(books, selected_genres, selected_authors):
     if selected_genres:
         books = books.filter(genres__slug__in=selected_genres)
 
     if selected_authors:
         books = books.filter(authors__slug__in=selected_authors)
 
-    books = books.distinct()
+    return books.distinct()
+
+
+# ---------------------------------------
+# catalog — список книг с поиском
+# ---------------------------------------
+def _catalog_params(request):
+    sort = 'new' if request.GET.get('sort') == 'new' else 'title'
+    return request.GET.getlist('genres'), request.GET.getlist('authors'), sort
+
+
+def _catalog_books(selected_genres, selected_authors):
+    books = Book.objects.filter(is_active=True).prefetch_related('authors', 'genres')
+    return filter_catalog_books(books, selected_genres, selected_authors)
+
 
+def _catalog_filters_context(selected_genres, selected_authors, sort):
+    """
+    Боковая панель фильтров и блок «Применены фильтры»: общие для catalog()
+    и catalog_filters_fragment.
+    """
     # ===== ДОСТУПНЫЕ АВТОРЫ =====
     if selected_genres:
         available_authors = Author.objects.filter(
@@ -60,35 +89,116 @@ def catalog(request):
     else:
         available_genres = Genre.objects.all()
 
-    # ===== СОРТИРОВКА =====
-    sort = request.GET.get('sort', 'title')
-    if sort == 'new':
-        books = books.order_by('-created_at')
-    else:
-        books = books.order_by('title')
-
-    paginator = Paginator(books, 9)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    selected_genre_objects = Genre.objects.filter(slug__in=selected_genres)
-    selected_author_objects = Author.objects.filter(slug__in=selected_authors)
-
-    context = {
-        'page_obj': page_obj,
+    return {
         'genres': Genre.objects.order_by('name'),
         'authors': Author.objects.order_by('name'),
         'selected_genres': selected_genres,
         'selected_authors': selected_authors,
-        'selected_genre_objects': selected_genre_objects,
-        'selected_author_objects': selected_author_objects,
+        'selected_genre_objects': Genre.objects.filter(slug__in=selected_genres),
+        'selected_author_objects': Author.objects.filter(slug__in=selected_authors),
         'available_genres': available_genres,
         'available_authors': available_authors,
         'sort': sort,
     }
 
+
+def _books_fragment_url(selected_genres, selected_authors, sort, cursor):
+    params = urlencode(
+        {'genres': selected_genres, 'authors': selected_authors, 'sort': sort, 'cursor': cursor},
+        doseq=True,
+    )
+    return f"{reverse('books:catalog_books_fragment')}?{params}"
+
+
+def catalog(request):
+    """
+    Каталог книг с поиском, фильтрами и пагинацией
+    """
+    selected_genres, selected_authors, sort = _catalog_params(request)
+
+    # ===== ФИЛЬТРАЦИЯ И СОРТИРОВКА КНИГ =====
+    # Порядок — как у курсоров (books/pagination.py), чтобы подгрузка
+    # продолжала страницу без пропусков и повторов
+    books = _catalog_books(selected_genres, selected_authors).order_by(*order_by_args(sort))
+
+    paginator = Paginator(books, CATALOG_PAGE_SIZE)
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
+    page_obj.object_list = with_unique_downloads(page_obj.object_list)
+
+    # Следующая порция для подгрузки при прокрутке — сразу после последней книги страницы
+    next_fragment_url = ''
+    if page_obj.has_next():
+        cursor = encode_cursor(page_obj.object_list[-1], sort)
+        next_fragment_url = _books_fragment_url(selected_genres, selected_authors, sort, cursor)
+
+    context = _catalog_filters_context(selected_genres, selected_authors, sort)
+    context.update({
+        'page_obj': page_obj,
+        'next_fragment_url': next_fragment_url,
+        'found_count': page_obj.paginator.count if selected_genres or selected_authors else None,
+    })
+
     return render(request, 'books/catalog.html', context)
 
+
+# ---------------------------------------
+# Фрагменты каталога для подгрузки без перезагрузки страницы (static/books/js/catalog.js)
+# ---------------------------------------
+@require_safe
+def catalog_books_fragment(request):
+    """
+    Только карточки книг: порция после ?cursor=... с теми же фильтрами и сортировкой.
+    URL следующей порции — в заголовке X-Next-Page (нет заголовка — это конец списка).
+    Запросов боковой панели здесь нет.
+    """
+    selected_genres, selected_authors, sort = _catalog_params(request)
+    cursor = request.GET.get('cursor')
+
+    etag = page_etag(request, 'catalog-books', request.GET.urlencode(),
+                     get_version(CATALOG), get_version(DOWNLOADS))
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+
+    try:
+        books, next_cursor = paginate(
+            _catalog_books(selected_genres, selected_authors), sort, cursor, CATALOG_PAGE_SIZE,
+        )
+    except InvalidCursor:
+        return HttpResponseBadRequest('Некорректный cursor')
+
+    response = render(request, 'books/includes/catalog_books.html', {
+        'books': with_unique_downloads(books),
+        'first': not cursor,
+    })
+    if next_cursor:
+        response['X-Next-Page'] = _books_fragment_url(selected_genres, selected_authors, sort, next_cursor)
+    return finalize(request, response, etag)
+
+
+@require_safe
+def catalog_filters_fragment(request):
+    """
+    Только боковая панель фильтров и блок «Применены фильтры» — при смене фильтра.
+    Список книг страница берёт отдельно из catalog_books_fragment.
+    """
+    selected_genres, selected_authors, sort = _catalog_params(request)
+
+    etag = page_etag(request, 'catalog-filters', request.GET.urlencode(), get_version(CATALOG))
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+
+    context = _catalog_filters_context(selected_genres, selected_authors, sort)
+    if selected_genres or selected_authors:
+        context['found_count'] = _catalog_books(selected_genres, selected_authors).count()
+    else:
+        context['found_count'] = None
+
+    response = render(request, 'books/includes/catalog_filters_fragment.html', context)
+    return finalize(request, response, etag)
+
 # ---------------------------------------
 # genre_list — Список всех жанров
 # ---------------------------------------
@@ -106,74 +216,107 @@ def genre_list(request):
 
 # ---------------------------------------
 # book_detail — подробная карточка
+# Общие шаги для синхронной и async-версии
 # ---------------------------------------
-def book_detail(request, slug):
+def _book_detail_conditional(request, book):
     """
-    Отображение карточки книги.
-    Создаём запись в BookView.
-    Добавляем флаг is_favorited.
+    Учёт просмотра и conditional GET. Возвращает (etag, 304-ответ или None).
     """
-
-    book = get_object_or_404(
-        Book.objects.prefetch_related('authors', 'genres'),
-        slug=slug,
-        is_active=True
-    )
-
     # --- ЛОГИКА ПРОСМОТРА ---
-    VIEW_TIMEOUT = timedelta(minutes=6)
-    now = timezone.now()
-    threshold = now - VIEW_TIMEOUT
-
+    # Авторизованных учитываем здесь. Анонимных — beacon'ом со страницы
+    # (record_view): так ответ не зависит от посетителя, не пишет сессию
+    # и не ставит cookie, а значит может отдаваться из общего кэша.
     if request.user.is_authenticated:
-        recent_view = BookView.objects.filter(
-            user=request.user,
-            book=book,
-            created_at__gte=threshold
-        ).exists()
-
-        if not recent_view:
-            BookView.objects.create(
-                user=request.user,
-                book=book
-            )
-
-    else:
-        if not request.session.session_key:
-            request.session.create()
+        record_book_view(book, user=request.user)
+
+    # --- CONDITIONAL GET ---
+    # Скачивания меняют версию статистики книги. Просмотры — нет (они частые,
+    # и каждый писал бы в кэш): счётчик просмотров обновляется в ETag раз
+    # в BOOK_VIEWS_ETAG_WINDOW секунд
+    etag = page_etag(
+        request, 'book', book.pk, book.updated_at.isoformat(),
+        get_version(CATALOG), get_version(book_stats(book.pk)),
+        int(time.time() // settings.BOOK_VIEWS_ETAG_WINDOW),
+    )
+    return etag, not_modified(request, etag)
 
-        session_key = request.session.session_key
 
-        recent_view = BookView.objects.filter(
-            session_key=session_key,
-            book=book,
-            created_at__gte=threshold
-        ).exists()
+def _book_view_count(book):
+    # Живые логи + агрегаты заархивированных событий (archive_events)
+    archived_views = book.daily_stats.aggregate(n=Sum('views'))['n'] or 0
+    return book.view_logs.count() + archived_views
 
-        if not recent_view:
-            BookView.objects.create(
-                session_key=session_key,
-                book=book
-            )
 
-    # --- ФЛАГ ИЗБРАННОГО ---
-    is_favorited = False
-    if request.user.is_authenticated:
-        is_favorited = Favorite.objects.filter(
-            user=request.user,
-            book=book
-        ).exists()
+def _book_download_count(book):
+    return (
+        book.download_logs.filter(status='success').values('user').order_by()
+            .union(book.archived_downloads.values('user').order_by())
+            .count()
+    )
 
-    # --- ПОДСЧЁТ СТАТИСТИКИ ---
-    view_count = book.view_logs.count()
-    download_count = book.download_logs.filter(status='success').values('user').distinct().count()
 
-    return render(request, 'books/detail.html', {
+def _render_book_detail(request, book, etag, is_favorited, view_count, download_count):
+    response = render(request, 'books/detail.html', {
         'book': book,
         'is_favorited': is_favorited,
         'view_count': view_count,
         'download_count': download_count,
     })
+    return finalize(request, response, etag)
+
+
+def book_detail(request, slug):
+    """
+    Отображение карточки книги.
+    Создаём запись в BookView.
+    Добавляем флаг is_favorited.
+    Поддерживает conditional GET: при совпадении ETag — 304 (просмотр всё равно учитывается).
+    """
+
+    # Один запрос за самой книгой; связи подгружаем, только если будем рендерить
+    book = get_object_or_404(Book, slug=slug, is_active=True)
+
+    etag, response = _book_detail_conditional(request, book)
+    if response is not None:
+        return response
+
+    prefetch_related_objects([book], 'authors', 'genres')
+
+    # --- ФЛАГ ИЗБРАННОГО ---
+    # Из кэша множества избранного (books/favorites.py), без отдельного запроса
+    is_favorited = book.pk in get_favorite_ids(request.user)
+
+    # --- ПОДСЧЁТ СТАТИСТИКИ ---
+    view_count = _book_view_count(book)
+    download_count = _book_download_count(book)
+
+    return _render_book_detail(request, book, etag, is_favorited, view_count, download_count)
+
+
+async def book_detail_async(request, slug):
+    """
+    То же, что book_detail, для library.asgi.
+    Учёт просмотра идёт до ETag (новый просмотр меняет версию статистики),
+    затем связи, флаг избранного и оба счётчика выполняются одновременно,
+    каждый на своём соединении (library/concurrency.py).
+    """
+    book = await aget_object_or_404(Book, slug=slug, is_active=True)
+
+    # request.user загружается здесь же, в синхронном коде
+    etag, response = await sync_to_async(_book_detail_conditional)(request, book)
+    if response is not None:
+        return response
+
+    _, favorite_ids, view_count, download_count = await run_concurrently(
+        partial(prefetch_related_objects, [book], 'authors', 'genres'),
+        partial(get_favorite_ids, request.user),
+        partial(_book_view_count, book),
+        partial(_book_download_count, book),
+    )
+
+    return await sync_to_async(_render_book_detail)(
+        request, book, etag, book.pk in favorite_ids, view_count, download_count,
+    )
 
 # ---------------------------------------
 # genre_detail — страница жанра
@@ -184,25 +327,32 @@ def genre_detail(request, slug):
     - информация о жанре
     - список книг данного жанра
     """
-    genre = get_object_or_404(Genre, slug=slug)
-
-    books = Book.objects.filter(
-        genres=genre,
-        is_active=True
-    ).prefetch_related('authors', 'genres').distinct().annotate(
-    unique_downloads=Count(
-        'download_logs__user',
-        filter=Q(download_logs__status='success'),
-        distinct=True
+    genre = get_object_or_404(
+        Genre.objects.annotate(books_updated_at=Max('books__updated_at')),
+        slug=slug
+    )
+
+    etag = page_etag(
+        request, 'genre', genre.pk, genre.updated_at.isoformat(), genre.books_updated_at,
+        get_version(CATALOG), get_version(DOWNLOADS),
+    )
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+
+    books = with_unique_downloads(
+        Book.objects.filter(
+            genres=genre,
+            is_active=True
+        ).prefetch_related('authors', 'genres').distinct()
     )
-)
 
     context = {
         "genre": genre,
         "books": books,
     }
 
-    return render(request, "books/genre_detail.html", context)
+    return finalize(request, render(request, "books/genre_detail.html", context), etag)
 
 # ---------------------------------------
 # author_detail — страница автора
@@ -213,21 +363,28 @@ def author_detail(request, slug):
     - информация об авторе
     - список всех его книг
     """
-    author = get_object_or_404(Author, slug=slug)
-    books = author.books.filter(is_active=True).prefetch_related('authors', 'genres').annotate(
-    unique_downloads=Count(
-        'download_logs__user',
-        filter=Q(download_logs__status='success'),
-        distinct=True
+    author = get_object_or_404(
+        Author.objects.annotate(books_updated_at=Max('books__updated_at')),
+        slug=slug
+    )
+
+    etag = page_etag(
+        request, 'author', author.pk, author.updated_at.isoformat(), author.books_updated_at,
+        get_version(CATALOG), get_version(DOWNLOADS),
+    )
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+    books = with_unique_downloads(
+        author.books.filter(is_active=True).prefetch_related('authors', 'genres')
     )
-)
 
     context = {
         'author': author,
         'books': books,
     }
 
-    return render(request, 'books/author_detail.html', context)
+    return finalize(request, render(request, 'books/author_detail.html', context), etag)
 
 # ---------------------------------------
 # author_list — Список всех авторов
@@ -261,32 +418,20 @@ def search(request):
     genres = []
 
     if query:
-
-        books = (
-            Book.objects
-            .filter(is_active=True)
-            .filter(title__icontains=query)
-            .prefetch_related('authors', 'genres')
-            .distinct()
-            .annotate(
-                unique_downloads=Count(
-                    'download_logs__user',
-                    filter=Q(download_logs__status='success'),
-                    distinct=True
-                )
-            )
-        )
-
-        authors = (
-            Author.objects
-            .filter(name__icontains=query)
-            .distinct()
-        )
-
-        genres = (
-            Genre.objects
-            .filter(name__icontains=query)
-            .distinct()
+        started = time.perf_counter()
+        normalized = normalize_query(query)
+
+        # Транслитерация и похожие по триграммам, если точных мало; кэш до изменения каталога
+        results, cached = cached_search(normalized)
+        books = with_unique_downloads(results['books'])
+        authors = results['authors']
+        genres = results['genres']
+
+        search_log.record(
+            normalized,
+            results=len(books) + len(authors) + len(genres),
+            latency_ms=round((time.perf_counter() - started) * 1000),
+            cached=cached,
         )
 
     context = {
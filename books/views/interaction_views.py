@@ -4,13 +4,21 @@
 """
 
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import require_POST
-from django.http import HttpResponse, Http404, HttpResponseForbidden, FileResponse
+from django.views.decorators.http import require_POST, require_http_methods
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import csrf_exempt
+from django.http import HttpResponse, Http404, HttpResponseForbidden, FileResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect
-from django.db import transaction
+from django.db import router, transaction
 from django.db.models import F
 from ..models import Book, Favorite, DownloadLog
+from ..favorites import invalidate_favorite_ids
+from ..tracking import get_visitor_id, remember_visitor, record_book_view
+from ..search import normalize_query
 from django.utils import timezone
+from django.utils.http import url_has_allowed_host_and_scheme
+from analytics import search_log
+from library import replicas
 
 
 
@@ -31,7 +39,77 @@ def favorite_toggle(request, pk):
     next_url = request.POST.get('next')
     if next_url:
         return redirect(next_url)
-    return redirect('books:detail', pk=book.pk)
+    return redirect('books:detail', slug=book.slug)
+
+@csrf_exempt
+@require_POST
+def record_view(request, pk):
+    """
+    Beacon просмотра книги со страницы book_detail.
+    Анонимный посетитель идентифицируется подписанной cookie (books/tracking.py),
+    cookie выставляется здесь, а не на кэшируемой HTML-странице, и только
+    для адресов beacon'а (VISITOR_COOKIE_PATH).
+    CSRF не нужен: запрос только фиксирует просмотр с дедупликацией.
+    """
+    book = get_object_or_404(Book.objects.only('id'), pk=pk, is_active=True)
+
+    if request.user.is_authenticated:
+        record_book_view(book, user=request.user)
+    else:
+        record_book_view(book, visitor_id=get_visitor_id(request))
+
+    return remember_visitor(request, HttpResponse(status=204))
+
+@csrf_exempt
+@require_POST
+def search_click(request):
+    """
+    Beacon клика по результату поиска со страницы search_results:
+    q — запрос, url — куда перешли. Пишется в буферизованный журнал поиска.
+    """
+    query = normalize_query(request.POST.get('q', ''))
+    url = request.POST.get('url', '')
+    if query and url_has_allowed_host_and_scheme(url, allowed_hosts={request.get_host()}):
+        search_log.record(query, clicked_url=url)
+    return HttpResponse(status=204)
+
+@never_cache
+@require_http_methods(['GET', 'PUT', 'DELETE'])
+def favorite_api(request, pk):
+    """
+    Идемпотентное избранное для JS:
+      GET    — текущее состояние (static/books/js/favorite.js сверяется с ним после сбоя)
+      PUT    — добавить (INSERT ... ON CONFLICT DO NOTHING)
+      DELETE — убрать (DELETE ... WHERE, без сигналов)
+    Повторный запрос ничего не меняет, поэтому двойной клик не создаёт гонки.
+    Возвращает {"book": pk, "favorited": bool}.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Требуется вход'}, status=401)
+
+    if not Book.objects.filter(pk=pk, is_active=True).exists():
+        return JsonResponse({'error': 'Книга не найдена'}, status=404)
+
+    favorites = Favorite.objects.filter(user=request.user, book_id=pk)
+    if request.method == 'GET':
+        return JsonResponse({'book': pk, 'favorited': favorites.exists()})
+
+    if request.method == 'PUT':
+        Favorite.objects.bulk_create(
+            [Favorite(user=request.user, book_id=pk)],
+            ignore_conflicts=True
+        )
+    else:
+        # Один DELETE без Collector'а: .delete() сначала выбирает строки,
+        # чтобы разослать post_delete, — лишний SELECT на каждый клик.
+        # На Favorite никто не ссылается, каскадов нет.
+        favorites._raw_delete(router.db_for_write(Favorite))
+
+    # bulk_create и _raw_delete не шлют сигналы — сбрасываем кэш и читаем с primary сами
+    invalidate_favorite_ids(request.user.pk)
+    replicas.pin_to_primary()
+
+    return JsonResponse({'book': pk, 'favorited': request.method == 'PUT'})
 
 @login_required
 def download_book(request, pk, fmt):
@@ -55,7 +133,7 @@ def download_book(request, pk, fmt):
         raise Http404("Запрошенный формат недоступен для этой книги.")
 
     try:
-        with transaction.atomic():
+        with transaction.atomic(using=router.db_for_write(DownloadLog)):
             DownloadLog.objects.create(
                 user=request.user,
                 book=book,
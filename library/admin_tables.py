@@ -0,0 +1,285 @@
+# library/admin_tables.py
+"""
+Списки в админке для больших таблиц (журналы BookView, DownloadLog).
+
+Стандартный changelist на сотнях миллионов строк упирается в:
+- точный COUNT(*) ради числа записей и номеров страниц;
+- OFFSET на дальних страницах;
+- фильтр по пользователю, который выводит вариантом каждого пользователя;
+- поиск icontains через JOIN, а между базами 'default' и 'analytics'
+  JOIN'а нет вовсе (library/routers.py).
+
+LargeTableAdminMixin заменяет это на:
+- оценку числа строк (estimate_count): pg_class без фильтров, оценку
+  планировщика (EXPLAIN) с фильтрами. Точный COUNT — только если оценка
+  меньше ADMIN_EXACT_COUNT_THRESHOLD, и не дольше ADMIN_COUNT_TIMEOUT_MS;
+- keyset-страницы по первичному ключу (новые сверху): «Новее» / «Старее»
+  вместо номеров, любая страница стоит как первая;
+- AutocompleteFilter — фильтр по внешнему ключу с подсказками admin autocomplete;
+- поиск в два шага: id в связанной таблице по её индексу (lookup задаётся
+  в search_fields), затем журнал по этим id через индексы (user, …) / (book, …).
+
+Сортировка по колонкам, «Показать все», фасеты и list_editable в этом режиме отключены.
+"""
+
+import json
+import logging
+
+from django import forms
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import DatabaseError, OperationalError, connections, transaction
+from django.db.models import Q, prefetch_related_objects
+from django.utils.functional import cached_property
+
+logger = logging.getLogger(__name__)
+
+# Параметры keyset-страниц: id последней / первой записи показанной страницы
+OLDER_VAR = 'older'
+NEWER_VAR = 'newer'
+CURSOR_VARS = (OLDER_VAR, NEWER_VAR)
+
+# Строк в таблице по статистике, пересчитанной на её текущий размер —
+# так же оценивает таблицу сам планировщик. NULL — статистики ещё нет.
+TABLE_ESTIMATE_SQL = """
+    SELECT CASE
+        WHEN c.reltuples < 0 OR c.relpages = 0 THEN NULL
+        ELSE (c.reltuples / c.relpages
+              * (pg_relation_size(c.oid) / current_setting('block_size')::int))::bigint
+    END
+    FROM pg_class c
+    WHERE c.oid = to_regclass(%s)
+"""
+
+
+# ---------------------------------------
+# Число строк
+# ---------------------------------------
+def table_estimate(connection, table):
+    with connection.cursor() as cursor:
+        cursor.execute(TABLE_ESTIMATE_SQL, [connection.ops.quote_name(table)])
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def plan_estimate(queryset):
+    """
+    Оценка планировщика или None. EXPLAIN (FORMAT JSON) — список из одного плана
+    (psycopg2) или сам план (psycopg 3: Django склеивает разобранный JSON заново).
+    """
+    try:
+        plan = json.loads(queryset.explain(format='json'))
+        if isinstance(plan, list):
+            plan = plan[0]
+        return int(plan['Plan']['Plan Rows'])
+    except (DatabaseError, ValueError, LookupError, TypeError):
+        return None
+
+
+def estimate_count(queryset):
+    """
+    (число строк, точное ли оно). Вне PostgreSQL — всегда точный COUNT.
+    """
+    alias = queryset.db
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return queryset.count(), True
+
+    queryset = queryset.order_by()
+    if queryset.query.where:
+        estimate = plan_estimate(queryset)
+    else:
+        estimate = table_estimate(connection, queryset.model._meta.db_table)
+    if estimate is not None and estimate >= settings.ADMIN_EXACT_COUNT_THRESHOLD:
+        return estimate, False
+
+    # Оценка небольшая, но планировщик мог ошибиться — COUNT под таймаутом
+    try:
+        with transaction.atomic(using=alias):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT set_config('statement_timeout', %s, true)",
+                    [str(settings.ADMIN_COUNT_TIMEOUT_MS)],
+                )
+            return queryset.count(), True
+    except OperationalError:
+        logger.warning('COUNT по %s прерван по таймауту, показана оценка', queryset.model.__name__)
+        return estimate or 0, False
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        count, self.count_is_exact = estimate_count(self.object_list)
+        return count
+
+
+# ---------------------------------------
+# Фильтр с подсказками
+# ---------------------------------------
+AUTOCOMPLETE_FILTER_JS = 'library/js/autocomplete_filter.js'
+
+
+class AutocompleteFilter(admin.FieldListFilter):
+    """
+    Фильтр по внешнему ключу без списка всех вариантов: значение подбирается
+    подсказками admin autocomplete (select2 из состава админки).
+    У ModelAdmin связанной модели должны быть search_fields.
+
+        list_filter = (('user', AutocompleteFilter), ...)
+    """
+
+    template = 'admin/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.name}__exact'
+        super().__init__(field, request, params, model, model_admin, field_path)
+        # Параметры для admin:autocomplete — модель, которой принадлежит поле
+        self.app_label = field.model._meta.app_label
+        self.model_name = field.model._meta.model_name
+
+        self.selected = None
+        value = self.used_parameters.get(self.lookup_kwarg)
+        if value:
+            try:
+                self.selected = field.related_model._default_manager.filter(pk=value[-1]).first()
+            except (ValueError, ValidationError):
+                pass  # неверный id — IncorrectLookupParameters из queryset()
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.selected is None,
+            'query_string': changelist.get_query_string(remove=[self.lookup_kwarg]),
+            'display': 'Все',
+        }
+
+
+class AutocompleteFilterMixin:
+    """
+    Статика для AutocompleteFilter в list_filter ModelAdmin.
+    """
+
+    @property
+    def media(self):
+        extra = '' if settings.DEBUG else '.min'
+        return super().media + forms.Media(
+            js=[
+                f'admin/js/vendor/jquery/jquery{extra}.js',
+                f'admin/js/vendor/select2/select2.full{extra}.js',
+                'admin/js/jquery.init.js',
+                'admin/js/autocomplete.js',
+                AUTOCOMPLETE_FILTER_JS,
+            ],
+            css={'screen': [f'admin/css/vendor/select2/select2{extra}.css', 'admin/css/autocomplete.css']},
+        )
+
+
+# ---------------------------------------
+# Список
+# ---------------------------------------
+class LargeTableChangeList(ChangeList):
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        for var in CURSOR_VARS:
+            lookup_params.pop(var, None)
+        return lookup_params
+
+    def get_ordering(self, request, queryset):
+        # Порядок keyset-страниц; сортировка по колонкам отключена (sortable_by)
+        return ['-pk']
+
+    def get_results(self, request):
+        # Ссылки фильтров, поиска и страниц строятся от self.params — без курсора,
+        # то есть с первой страницы
+        try:
+            older = int(self.params.pop(OLDER_VAR, None) or 0)
+            newer = int(self.params.pop(NEWER_VAR, None) or 0)
+        except ValueError:
+            raise IncorrectLookupParameters
+        for var in CURSOR_VARS:
+            self.filter_params.pop(var, None)
+
+        limit = self.list_per_page
+        rows = []
+        if newer:
+            rows = list(self.queryset.filter(pk__gt=newer).order_by('pk')[:limit + 1])
+            if len(rows) <= limit:
+                newer = 0  # дошли до начала — показываем первую страницу целиком
+        if newer:
+            rows = rows[:limit][::-1]
+            has_newer, has_older = True, True
+        else:
+            queryset = self.queryset.order_by('-pk')
+            if older:
+                queryset = queryset.filter(pk__lt=older)
+            rows = list(queryset[:limit + 1])
+            has_newer, has_older = bool(older), len(rows) > limit
+            rows = rows[:limit]
+
+        # Связанные объекты — отдельными запросами (журнал и они могут быть в разных базах)
+        prefetch_related_objects(rows, *self.model_admin.list_prefetch_related)
+
+        paginator = self.model_admin.get_paginator(request, self.queryset, limit)
+        self.result_count = paginator.count
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = has_newer or has_older
+        self.paginator = paginator
+
+        self.first_url = self.get_query_string() if older or newer else None
+        self.newer_url = self.get_query_string({NEWER_VAR: rows[0].pk}) if has_newer and rows else None
+        self.older_url = self.get_query_string({OLDER_VAR: rows[-1].pk}) if has_older and rows else None
+
+
+class LargeTableAdminMixin(AutocompleteFilterMixin):
+    """
+    Режим списка для больших таблиц (см. описание модуля).
+
+    search_fields — пути «внешний ключ__поле__lookup» с lookup, который
+    обслуживает индекс связанной таблицы, например 'user__username__startswith'.
+    list_prefetch_related — внешние ключи из list_display.
+    """
+
+    change_list_template = 'admin/large_table_change_list.html'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    sortable_by = ()
+    # Не JOIN: связанные объекты догружаются list_prefetch_related
+    list_select_related = ()
+    list_prefetch_related = ()
+
+    def get_changelist(self, request, **kwargs):
+        return LargeTableChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+
+        condition = Q()
+        for path in self.get_search_fields(request):
+            field_name, lookup = path.split('__', 1)
+            related_model = self.model._meta.get_field(field_name).related_model
+            ids = list(
+                related_model._default_manager
+                    .filter(**{lookup: search_term})
+                    .order_by()
+                    .values_list('pk', flat=True)[:settings.ADMIN_SEARCH_MAX_RELATED]
+            )
+            if ids:
+                condition |= Q(**{f'{field_name}__in': ids})
+
+        if not condition:
+            return queryset.none(), False
+        return queryset.filter(condition), False
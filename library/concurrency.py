@@ -0,0 +1,144 @@
+# library/concurrency.py
+"""
+Параллельное выполнение независимых блоков ORM-кода: из async-представлений
+(run_concurrently) и из синхронных под WSGI (run_with_timeouts, ограниченный пул).
+
+Async ORM Django (aget, acount, ...) выполняет запросы через
+sync_to_async(thread_sensitive=True) — в одном потоке, на одном соединении,
+то есть по очереди. Чтобы независимые блоки шли одновременно, каждый
+выполняется в отдельном потоке (thread_sensitive=False): django.db.connections
+локальны для потока, поэтому у каждого блока своё соединение.
+
+- контекст запроса (чтение с реплики, статистика инструментирования)
+  переносится в поток через contextvars;
+- запросы потока попадают в статистику текущего запроса (Server-Timing);
+- соединения потока закрываются по тем же правилам, что и в конце
+  обычного запроса (CONN_MAX_AGE), — пул потоков не копит соединения.
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import ExitStack
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connections
+
+from library import instrumentation
+
+
+def _threaded(func):
+    """
+    func для выполнения в чужом потоке: запросы — в статистику текущего
+    HTTP-запроса, соединения потока — закрыть по завершении.
+    """
+    @wraps(func)
+    def run(*args, **kwargs):
+        stats = instrumentation.current()
+        try:
+            with ExitStack() as stack:
+                if stats is not None:
+                    for alias in connections:
+                        stack.enter_context(connections[alias].execute_wrapper(stats))
+                return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return run
+
+
+def in_thread(func):
+    """
+    Async-обёртка: func выполняется в отдельном потоке со своими соединениями с БД.
+    """
+    return sync_to_async(_threaded(func), thread_sensitive=False)
+
+
+async def run_concurrently(*calls):
+    """
+    Выполняет вызовы без аргументов (functools.partial) одновременно,
+    каждый в своём потоке. Результаты — в порядке вызовов; ошибка любого
+    вызова пробрасывается (остальные всё равно доработают).
+    """
+    return await asyncio.gather(*(in_thread(call)() for call in calls))
+
+
+# ---------------------------------------
+# Синхронный код: ограниченный пул потоков с таймаутами
+# ---------------------------------------
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name, max_workers):
+    """
+    Общий для процесса пул потоков: не больше max_workers одновременных
+    блоков (и соединений с БД) на процесс, сколько бы запросов ни шло.
+    """
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = _pools[name] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        return pool
+
+
+def run_in_background(name, func, max_workers=1):
+    """
+    Запускает вызов без аргументов в общем пуле name и не ждёт результата
+    (сброс буферов журналов и т. п.). Соединения потока закрываются как обычно.
+    """
+    return get_pool(name, max_workers).submit(_threaded(func))
+
+
+class BlockResult:
+    """
+    Итог одного вызова run_with_timeouts: status — 'ok', 'timeout' или 'error'.
+    """
+
+    def __init__(self, status, value=None, error=None, elapsed=0.0):
+        self.status = status
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.status == 'ok'
+
+
+def _timed(func):
+    started = time.perf_counter()
+    try:
+        return BlockResult('ok', value=func(), elapsed=time.perf_counter() - started)
+    except Exception as exc:
+        return BlockResult('error', error=exc, elapsed=time.perf_counter() - started)
+
+
+def run_with_timeouts(pool, calls, timeout):
+    """
+    Запускает вызовы без аргументов {имя: callable} в пуле pool и ждёт каждый
+    не дольше timeout секунд с момента запуска. Возвращает {имя: BlockResult}.
+
+    Поток, не уложившийся в таймаут, прервать нельзя: он доработает в фоне,
+    результат будет отброшен, а соединение закрыто. Ещё не начатые вызовы
+    (пул занят) снимаются из очереди.
+    """
+    started = time.perf_counter()
+    futures = {
+        # Свой контекст на каждый вызов: режим реплики и статистика запроса
+        name: pool.submit(contextvars.copy_context().run, _threaded(_timed), call)
+        for name, call in calls.items()
+    }
+
+    results = {}
+    for name, future in futures.items():
+        remaining = max(0.0, started + timeout - time.perf_counter())
+        try:
+            results[name] = future.result(timeout=remaining)
+        except FutureTimeoutError:
+            future.cancel()
+            results[name] = BlockResult('timeout', elapsed=time.perf_counter() - started)
+    return results
@@ -0,0 +1,131 @@
+# library/instrumentation.py
+"""
+Инструментирование запросов: число SQL-запросов, время БД, повторяющиеся
+запросы (N+1) и время рендера шаблонов.
+
+Собирает QueryInstrumentationMiddleware (library/middleware.py):
+- заголовок Server-Timing (видно во вкладке Network браузера);
+- строка JSON в логгер 'library.sql' на каждый запрос;
+- бюджет запросов: предупреждение или QueryBudgetExceeded (SQL_QUERY_BUDGET_STRICT).
+"""
+
+import contextvars
+import re
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.template import base as template_base
+
+# Статистика текущего запроса (None — инструментирование выключено)
+_current = contextvars.ContextVar('request_stats', default=None)
+
+_NUMBER_RE = re.compile(r'\b\d+\b')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_IN_LIST_RE = re.compile(r'\bIN \((?:%s|\?)(?:, (?:%s|\?))*\)')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def fingerprint(sql):
+    """
+    SQL без литералов и с IN (...) любой длины — одинаковый для запросов N+1.
+    """
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return sql
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.fingerprints = Counter()
+        self.template_time = 0.0
+        self._template_depth = 0
+        # Запросы одного HTTP-запроса могут идти из нескольких потоков (library/concurrency.py)
+        self._lock = threading.Lock()
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+    def duplicates(self, limit=3):
+        """
+        [(fingerprint, сколько раз)] для запросов, выполненных больше одного раза.
+        """
+        return [(sql, n) for sql, n in self.fingerprints.most_common(limit) if n > 1]
+
+    # execute_wrapper для connection.execute_wrapper()
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            key = fingerprint(sql)
+            with self._lock:
+                self.queries += 1
+                self.db_time += elapsed
+                self.fingerprints[key] += 1
+
+
+def start():
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+# ---------------------------------------
+# Время рендера шаблонов
+# Оборачиваем Template.render один раз; {% include %} считается в составе
+# внешнего шаблона (учитывается только верхний уровень).
+# ---------------------------------------
+def install_template_timer():
+    if getattr(template_base.Template.render, '_instrumented', False):
+        return
+
+    original = template_base.Template.render
+
+    @wraps(original)
+    def render(self, context):
+        stats = _current.get()
+        if stats is None:
+            return original(self, context)
+        stats._template_depth += 1
+        started = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            stats._template_depth -= 1
+            if stats._template_depth == 0:
+                stats.template_time += time.perf_counter() - started
+
+    render._instrumented = True
+    template_base.Template.render = render
+
+
+# ---------------------------------------
+# Бюджет запросов для отдельного представления
+# ---------------------------------------
+def query_budget(limit):
+    """
+    @query_budget(10) — свой лимит SQL-запросов для представления
+    (по умолчанию SQL_QUERY_BUDGET).
+    """
+    def decorator(view_func):
+        view_func.query_budget = limit
+        return view_func
+    return decorator
@@ -0,0 +1,124 @@
+# library/middleware.py
+"""
+Общие middleware проекта.
+"""
+
+import json
+import logging
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import instrumentation, replicas
+
+sql_logger = logging.getLogger('library.sql')
+
+
+class ReplicaMiddleware:
+    """
+    GET/HEAD-запросы к представлениям из REPLICA_READ_APPS читают с реплики.
+    Браузер, который недавно писал (избранное, скачивание), читает с primary:
+    запрос с записью получает cookie replicas.PIN_COOKIE на READ_YOUR_WRITES_WINDOW секунд.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state_token = replicas.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            pinned = replicas.finish_request(state_token)
+            token = getattr(request, '_replica_token', None)
+            if token is not None:
+                replicas.stop_replica_reads(token)
+        if pinned and replicas.replica_aliases():
+            response.set_cookie(
+                replicas.PIN_COOKIE, '1',
+                max_age=settings.READ_YOUR_WRITES_WINDOW,
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not replicas.replica_aliases() or request.method not in ('GET', 'HEAD'):
+            return None
+
+        app_label = view_func.__module__.split('.', 1)[0]
+        if app_label not in settings.REPLICA_READ_APPS:
+            return None
+
+        if replicas.is_pinned(request):
+            return None
+
+        request._replica_token = replicas.start_replica_reads()
+        return None
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Считает SQL-запросы, время БД и рендера шаблонов для каждого запроса
+    (library/instrumentation.py). Отдаёт их в Server-Timing и в лог
+    'library.sql', следит за бюджетом запросов представления.
+    Ставится первым, чтобы учесть запросы сессии и пользователя.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if not settings.SQL_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        instrumentation.install_template_timer()
+
+    def __call__(self, request):
+        stats, token = instrumentation.start()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            instrumentation.stop(token)
+
+        budget = getattr(request, '_query_budget', settings.SQL_QUERY_BUDGET)
+        self._report(request, response, stats, budget)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"',
+            f'tpl;dur={stats.template_time * 1000:.1f}',
+            f'total;dur={stats.total_time * 1000:.1f}',
+        ])
+
+        if stats.queries > budget and settings.SQL_QUERY_BUDGET_STRICT:
+            raise instrumentation.QueryBudgetExceeded(
+                f'{request.path}: {stats.queries} SQL-запросов при бюджете {budget}'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._view_name = f'{view_func.__module__}.{view_func.__name__}'
+        budget = getattr(view_func, 'query_budget', None)
+        if budget is not None:
+            request._query_budget = budget
+        return None
+
+    def _report(self, request, response, stats, budget):
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': getattr(request, '_view_name', None),
+            'status': response.status_code,
+            'queries': stats.queries,
+            'db_ms': round(stats.db_time * 1000, 1),
+            'template_ms': round(stats.template_time * 1000, 1),
+            'total_ms': round(stats.total_time * 1000, 1),
+            'budget': budget,
+            'duplicates': [{'sql': sql[:200], 'count': n} for sql, n in stats.duplicates()],
+        }
+        line = json.dumps(record, ensure_ascii=False)
+        n_plus_one = any(n >= settings.SQL_DUPLICATE_THRESHOLD for _, n in stats.duplicates(1))
+        if stats.queries > budget or n_plus_one:
+            sql_logger.warning(line)
+        else:
+            sql_logger.info(line)
@@ -0,0 +1,205 @@
+# library/replicas.py
+"""
+Реплики основной базы для чтения.
+
+- какие запросы читать с реплики, решает ReplicaMiddleware (GET-запросы
+  представлений каталога/страниц/аналитики) через contextvar;
+- read-your-writes: после избранного или скачивания браузер
+  READ_YOUR_WRITES_WINDOW секунд читает только с primary — ReplicaMiddleware
+  ставит cookie PIN_COOKIE, метка не зависит от кэша и воркера;
+- health check: фоновый поток процесса раз в REPLICA_HEALTH_CHECK_INTERVAL
+  секунд проверяет реплики, запрос только читает последний результат.
+  Реплика с отставанием больше REPLICA_MAX_LAG секунд (или недоступная)
+  выпадает из ротации до следующей проверки.
+"""
+
+import contextvars
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = 'primary_pin'
+
+# Читать ли текущему запросу с реплики (выставляет ReplicaMiddleware)
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+# Состояние текущего запроса: изменяемый dict, чтобы метка из потока
+# async-представления (sync_to_async копирует контекст) дошла до middleware
+_request_state = contextvars.ContextVar('replica_request_state', default=None)
+
+# Отставание реплики в секундах.
+# Если WAL принят и применён полностью — реплика догнала primary, даже если
+# pg_last_xact_replay_timestamp() давно не менялся (на primary нет записей).
+PG_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+def replica_aliases():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+# ---------------------------------------
+# Режим чтения текущего запроса
+# ---------------------------------------
+def use_replica():
+    return _use_replica.get()
+
+
+def start_replica_reads():
+    """
+    Возвращает токен для stop_replica_reads().
+    """
+    return _use_replica.set(True)
+
+
+def stop_replica_reads(token=None):
+    if token is not None:
+        _use_replica.reset(token)
+    else:
+        _use_replica.set(False)
+
+
+# ---------------------------------------
+# Read-your-writes
+# ---------------------------------------
+def start_request():
+    """
+    Начало запроса (ReplicaMiddleware). Возвращает токен для finish_request().
+    """
+    return _request_state.set({'pinned': False})
+
+
+def finish_request(token):
+    """
+    Конец запроса. True — запрос писал, и браузер нужно закрепить за primary.
+    """
+    state = _request_state.get()
+    _request_state.reset(token)
+    return bool(state and state['pinned'])
+
+
+def pin_to_primary():
+    """
+    Текущий запрос что-то записал: он и следующие запросы этого браузера
+    (READ_YOUR_WRITES_WINDOW секунд) читают с primary.
+    Вне HTTP-запроса (команды, фоновые потоки) — только перестаёт читать с реплики.
+    """
+    stop_replica_reads()
+    state = _request_state.get()
+    if state is not None:
+        state['pinned'] = True
+
+
+def is_pinned(request):
+    return PIN_COOKIE in request.COOKIES
+
+
+# ---------------------------------------
+# Health check
+# ---------------------------------------
+class _Health:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked_at = None
+        self.healthy = []
+        self.thread = None
+
+
+_health = _Health()
+
+
+def replica_lag(alias):
+    """
+    Отставание реплики в секундах; None — реплика недоступна.
+    Для не-PostgreSQL (SQLite-заглушка в разработке) — только проверка связи.
+    """
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(PG_LAG_SQL)
+            else:
+                cursor.execute('SELECT 0')
+            return float(cursor.fetchone()[0])
+    except DatabaseError as exc:
+        logger.warning('Реплика %s недоступна: %s', alias, exc)
+        return None
+
+
+def check_replicas():
+    """
+    Проверяет все реплики и обновляет список здоровых. Возвращает {alias: lag}.
+    """
+    lags = {alias: replica_lag(alias) for alias in replica_aliases()}
+    healthy = []
+    for alias, lag in lags.items():
+        if lag is None:
+            continue
+        if lag > settings.REPLICA_MAX_LAG:
+            logger.warning('Реплика %s отстаёт на %.1f с — исключена из ротации', alias, lag)
+            continue
+        healthy.append(alias)
+
+    with _health.lock:
+        _health.healthy = healthy
+        _health.checked_at = time.monotonic()
+    return lags
+
+
+def _health_check_loop():
+    while True:
+        try:
+            check_replicas()
+        except Exception:
+            logger.exception('Не удалось проверить реплики')
+        finally:
+            # Соединения потока не держим между проверками
+            connections.close_all()
+        time.sleep(settings.REPLICA_HEALTH_CHECK_INTERVAL)
+
+
+def start_health_checks():
+    """
+    Запускает фоновую проверку реплик процесса, если она ещё не идёт
+    (в т.ч. в дочернем процессе после fork — там потока родителя нет).
+    """
+    if _health.thread is not None and _health.thread.is_alive():
+        return
+    with _health.lock:
+        if _health.thread is not None and _health.thread.is_alive():
+            return
+        _health.thread = threading.Thread(
+            target=_health_check_loop, name='replica-health-check', daemon=True,
+        )
+        _health.thread.start()
+
+
+def healthy_replicas():
+    """
+    Здоровые реплики по последней фоновой проверке. Запрос её не ждёт:
+    до первой проверки — пустой список, т.е. чтение с primary.
+    Если проверка давно не завершалась (зависла), результату не верим.
+    """
+    start_health_checks()
+    checked_at = _health.checked_at
+    if checked_at is None or time.monotonic() - checked_at > 3 * settings.REPLICA_HEALTH_CHECK_INTERVAL:
+        return []
+    return _health.healthy
+
+
+def choose_replica():
+    """
+    Случайная здоровая реплика или None (тогда читаем с primary).
+    """
+    healthy = healthy_replicas()
+    return random.choice(healthy) if healthy else None
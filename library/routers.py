@@ -0,0 +1,114 @@
+# library/routers.py
+"""
+Маршрутизация моделей по базам данных.
+
+ReplicaRouter — чтение с реплик основной базы (см. library/replicas.py).
+Стоит в DATABASE_ROUTERS первым: модели событий в базе 'analytics'
+он пропускает дальше, в AnalyticsRouter.
+
+AnalyticsRouter — журналы событий (BookView, DownloadLog) и все модели
+приложения analytics (агрегаты, скетчи) живут в отдельной базе 'analytics',
+если она описана в DATABASES. Иначе всё остаётся в 'default'.
+
+Между базами нет JOIN'ов: внешние ключи событий на Book/User объявлены
+с db_constraint=False, а представления берут счётчики запросами по id
+(см. analytics/stats.py).
+"""
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from . import replicas
+
+ANALYTICS_DB = 'analytics'
+
+# Модели событий из других приложений
+EVENT_MODELS = {
+    ('books', 'bookview'),
+    ('books', 'downloadlog'),
+}
+EVENT_APPS = {'analytics'}
+
+
+def is_event_model(app_label, model_name):
+    return app_label in EVENT_APPS or (app_label, model_name) in EVENT_MODELS
+
+
+def analytics_db_enabled():
+    return ANALYTICS_DB in settings.DATABASES
+
+
+class AnalyticsRouter:
+    def _route(self, model):
+        if not analytics_db_enabled():
+            return None
+        if is_event_model(model._meta.app_label, model._meta.model_name):
+            return ANALYTICS_DB
+        # Явно, иначе Django возьмёт базу из instance-хинта: book у события
+        # из 'analytics' (select_related/prefetch) искался бы не в той базе
+        return DEFAULT_DB_ALIAS
+
+    def db_for_read(self, model, **hints):
+        return self._route(model)
+
+    def db_for_write(self, model, **hints):
+        return self._route(model)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Связь событие → книга/пользователь допустима: это ссылка по id без JOIN'ов
+        if any(is_event_model(o._meta.app_label, o._meta.model_name) for o in (obj1, obj2)):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if not analytics_db_enabled():
+            return None
+        if model_name is None:
+            # Операции без модели (RunSQL/RunPython): события — только в analytics
+            return db == ANALYTICS_DB if app_label in EVENT_APPS else db != ANALYTICS_DB
+        if is_event_model(app_label, model_name):
+            return db == ANALYTICS_DB
+        return db != ANALYTICS_DB
+
+
+# Приложения, модели которых всегда читаются с primary:
+# свежая сессия/пользователь после входа должны быть видны сразу.
+# django_cache — таблица DatabaseCache: версии кэша с отставанием реплики
+# вернули бы устаревшие данные
+PRIMARY_ONLY_APPS = {'sessions', 'auth', 'contenttypes', 'admin', 'django_cache'}
+
+
+class ReplicaRouter:
+    def _in_analytics_db(self, model):
+        return analytics_db_enabled() and is_event_model(model._meta.app_label, model._meta.model_name)
+
+    def db_for_read(self, model, **hints):
+        if self._in_analytics_db(model):
+            return None
+        if (
+            not replicas.use_replica()
+            or model._meta.app_label in PRIMARY_ONLY_APPS
+            # Внутри транзакции читаем то, что в ней записали
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return replicas.choose_replica() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if self._in_analytics_db(model):
+            return None
+        # После записи текущий запрос дочитывает с primary
+        replicas.stop_replica_reads()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # primary и реплики — одна и та же база
+        main = {DEFAULT_DB_ALIAS, *replicas.replica_aliases()}
+        if obj1._state.db in main and obj2._state.db in main:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replicas.replica_aliases():
+            return False
+        return None
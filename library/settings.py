@@ -22,20 +22,25 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # pg_trgm-индексы и поиск / trigram indexes
 
     # Мои приложения (добавил свои apps)
     'users',      # Пользователи / Users
     'books.apps.BooksConfig',      # Книги / Books
     'analytics',  # Аналитика / Analytics
     'pages',      # Статические страницы (home/about)
+    'benchmarks', # Синтетические данные и бенчмарки / Benchmarks
 ]
 
 MIDDLEWARE = [
+    'library.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'library.staticfiles.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'library.middleware.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -53,6 +58,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'books.context_processors.favorites',
             ],
         },
     },
@@ -74,6 +80,72 @@ DATABASES = {
     }
 }
 
+# Отдельная база для журналов событий и аналитики (library/routers.py).
+# Если ANALYTICS_POSTGRES_DB не задана — всё хранится в 'default'.
+if os.getenv("ANALYTICS_POSTGRES_DB"):
+    DATABASES['analytics'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv("ANALYTICS_POSTGRES_DB"),
+        'USER': os.getenv("ANALYTICS_POSTGRES_USER", os.getenv("POSTGRES_USER")),
+        'PASSWORD': os.getenv("ANALYTICS_POSTGRES_PASSWORD", os.getenv("POSTGRES_PASSWORD")),
+        'HOST': os.getenv("ANALYTICS_POSTGRES_HOST", os.getenv("POSTGRES_HOST")),
+        'PORT': os.getenv("ANALYTICS_POSTGRES_PORT", os.getenv("POSTGRES_PORT")),
+    }
+
+# Реплики основной базы для чтения (library/replicas.py).
+# POSTGRES_REPLICA_HOSTS="replica1.local,replica2.local" — те же БД/пользователь, другие хосты.
+DATABASE_REPLICAS = []
+# Секунд на подключение к реплике (libpq connect_timeout)
+REPLICA_CONNECT_TIMEOUT = int(os.getenv("REPLICA_CONNECT_TIMEOUT", 2))
+for i, host in enumerate(filter(None, os.getenv("POSTGRES_REPLICA_HOSTS", "").split(",")), start=1):
+    alias = f'replica{i}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        # Недоступная реплика не должна подвешивать запрос или проверку здоровья
+        'OPTIONS': {'connect_timeout': REPLICA_CONNECT_TIMEOUT},
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+# Представления этих приложений читают с реплик (GET/HEAD)
+REPLICA_READ_APPS = ['books', 'pages', 'analytics']
+# Реплика с отставанием больше (сек) исключается из ротации
+REPLICA_MAX_LAG = int(os.getenv("REPLICA_MAX_LAG", 5))
+# Как часто (сек) каждый процесс проверяет отставание реплик
+REPLICA_HEALTH_CHECK_INTERVAL = 10
+# Сколько секунд после избранного/скачивания пользователь читает с primary
+READ_YOUR_WRITES_WINDOW = 15
+
+DATABASE_ROUTERS = ['library.routers.ReplicaRouter', 'library.routers.AnalyticsRouter']
+
+# Общий кэш всех процессов: версии (books/versioning.py), избранное, поиск.
+# REDIS_URL="redis://cache.local:6379/1" — Redis (нужен пакет redis);
+# иначе — таблица в основной базе (python manage.py createcachetable).
+# LocMem не подходит: сброс кэша в одном процессе не виден остальным.
+# Таблице нужен запас на версии (CATALOG, DOWNLOADS, книги со скачиваниями,
+# избранное каждого пользователя), множества избранного и ответы поиска:
+# с MAX_ENTRIES по умолчанию (300) они вытесняли бы друг друга. При переполнении
+# удаляется 1/CULL_FREQUENCY записей.
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+            'OPTIONS': {
+                'MAX_ENTRIES': int(os.getenv("CACHE_MAX_ENTRIES", 200_000)),
+                'CULL_FREQUENCY': 10,
+            },
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -97,6 +169,18 @@ AUTH_PASSWORD_VALIDATORS = [
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']   # (от меня: сюда положу Bootstrap/JS во время разработки)
 
+# Сборка статики: python manage.py collectstatic — имена с хэшем содержимого,
+# манифест staticfiles.json и сжатые .gz/.br рядом (library/staticfiles.py)
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'library.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+# Отдавать STATIC_ROOT самим приложением (StaticFilesMiddleware); с DEBUG отдаёт runserver
+STATIC_SERVE = os.getenv("STATIC_SERVE", "0" if DEBUG else "1") == "1"
+# max-age для файлов без хэша в имени (хэшированные — immutable на год)
+STATIC_UNHASHED_MAX_AGE = 60
+
 # Медиа — файлы, которые загружают пользователи (обложки, PDF)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'  # (от меня: сюда будут сохраняться uploaded файлы)
@@ -117,4 +201,107 @@ LOGOUT_REDIRECT_URL = '/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Email (для сброса пароля) — можно использовать консоль на этапе разработки:
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
\ No newline at end of file
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# Холодный архив журналов просмотров/скачиваний (команда archive_events)
+ANALYTICS_ARCHIVE_ROOT = Path(os.getenv("ANALYTICS_ARCHIVE_ROOT", BASE_DIR / 'archive'))
+
+# Приближённые уникальные счётчики по HLL-скетчам (дашборд и карточки книг).
+# Стандартная ошибка ≈ 1.6 %, см. analytics/hll.py
+ANALYTICS_APPROXIMATE_COUNTS = os.getenv("ANALYTICS_APPROXIMATE_COUNTS", "0") == "1"
+# Скетчи пишутся пачками из буфера процесса (analytics/sketches.py):
+# по SKETCH_FLUSH_BATCH_SIZE событий или раз в SKETCH_FLUSH_INTERVAL секунд
+SKETCH_FLUSH_BATCH_SIZE = 500
+SKETCH_FLUSH_INTERVAL = 10
+
+# Async-версии тяжёлых представлений (dashboard, book_detail) с параллельными
+# запросами (library/concurrency.py). library.asgi включает их по умолчанию;
+# под WSGI каждый async-вызов шёл бы через отдельный event loop.
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "0") == "1"
+
+# Синхронный дашборд (WSGI): блоки параллельно в пуле потоков, одно соединение на блок.
+# Блок, не уложившийся в DASHBOARD_BLOCK_TIMEOUT секунд, выводится как «временно недоступно».
+DASHBOARD_PARALLEL = os.getenv("DASHBOARD_PARALLEL", "0") == "1"
+DASHBOARD_BLOCK_TIMEOUT = float(os.getenv("DASHBOARD_BLOCK_TIMEOUT", 5))
+# Потоков (и соединений с БД) на процесс для блоков дашборда
+DASHBOARD_MAX_WORKERS = int(os.getenv("DASHBOARD_MAX_WORKERS", 5))
+
+# Поиск (books/search.py): не больше SEARCH_RESULTS_LIMIT точных совпадений на
+# книги, авторов и жанры. Если точных совпадений меньше
+# SEARCH_FUZZY_MIN_RESULTS, добавляются похожие по pg_trgm word_similarity
+# не ниже порога — не больше SEARCH_FUZZY_LIMIT и не дольше SEARCH_FUZZY_TIMEOUT_MS
+SEARCH_RESULTS_LIMIT = 100
+SEARCH_FUZZY_MIN_RESULTS = 3
+SEARCH_FUZZY_THRESHOLD = float(os.getenv("SEARCH_FUZZY_THRESHOLD", 0.5))
+SEARCH_FUZZY_LIMIT = 20
+SEARCH_FUZZY_TIMEOUT_MS = int(os.getenv("SEARCH_FUZZY_TIMEOUT_MS", 300))
+
+# Кэш результатов поиска (books/search.py, cached_search): сбрасывается
+# версией CATALOG; ответы больше SEARCH_CACHE_MAX_RESULTS объектов не кэшируются
+SEARCH_CACHE_TIMEOUT = 60 * 10
+SEARCH_CACHE_MAX_RESULTS = 300
+# Журнал поиска (analytics/search_log.py) пишется пачками: по SEARCH_LOG_BATCH_SIZE
+# записей или раз в SEARCH_LOG_FLUSH_INTERVAL секунд
+SEARCH_LOG_BATCH_SIZE = 200
+SEARCH_LOG_FLUSH_INTERVAL = 10
+
+# Подсказки поиска (books/typeahead.py): не больше стольких записей в индексе
+# процесса — при большем каталоге остаются самые популярные
+TYPEAHEAD_MAX_ENTRIES = int(os.getenv("TYPEAHEAD_MAX_ENTRIES", 200_000))
+
+# Списки больших таблиц в админке (library/admin_tables.py): точный COUNT —
+# только если оценка PostgreSQL меньше порога, и не дольше ADMIN_COUNT_TIMEOUT_MS;
+# поиск по журналам — не больше ADMIN_SEARCH_MAX_RELATED найденных пользователей/книг
+ADMIN_EXACT_COUNT_THRESHOLD = 10_000
+ADMIN_COUNT_TIMEOUT_MS = 500
+ADMIN_SEARCH_MAX_RELATED = 1000
+
+# Архивы данных пользователей (users/exports.py): собираются в фоне, не больше
+# USER_EXPORT_WORKERS одновременно на процесс; сборка дольше USER_EXPORT_STALE_AFTER
+# секунд считается брошенной. Каталог не раздаётся напрямую — только владельцу через view
+USER_EXPORT_ROOT = Path(os.getenv("USER_EXPORT_ROOT", BASE_DIR / 'exports'))
+USER_EXPORT_WORKERS = 2
+USER_EXPORT_STALE_AFTER = 60 * 60
+USER_EXPORT_CHUNK_SIZE = 2000
+
+# Порог, после которого множество избранного пользователя хранится битсетом
+FAVORITES_BITSET_THRESHOLD = 2000
+
+# Анонимный посетитель — подписанная cookie вместо серверной сессии (books/tracking.py).
+# Cookie нужна только beacon'у просмотра (books:record_view), поэтому браузер шлёт её
+# лишь на VISITOR_COOKIE_PATH, а запросы страниц каталога остаются без cookie
+VISITOR_COOKIE_NAME = 'library_visitor'
+VISITOR_COOKIE_AGE = 60 * 60 * 24 * 365
+VISITOR_COOKIE_PATH = '/catalog/view/'
+
+# Сколько секунд общий кэш (nginx/CDN) может отдавать анонимные страницы каталога.
+# Кэш должен обходиться при наличии cookie sessionid.
+ANONYMOUS_SHARED_MAX_AGE = 60
+
+# Счётчик просмотров на странице книги может отставать от ETag на столько секунд:
+# просмотры не пишут версию в кэш (books/signals.py), в ETag входит номер окна
+BOOK_VIEWS_ETAG_WINDOW = 60
+
+# Инструментирование SQL (library/instrumentation.py): Server-Timing + лог 'library.sql'
+SQL_INSTRUMENTATION = DEBUG or os.getenv("SQL_INSTRUMENTATION", "0") == "1"
+# Бюджет SQL-запросов на запрос по умолчанию (@query_budget(n) — для отдельного представления)
+SQL_QUERY_BUDGET = int(os.getenv("SQL_QUERY_BUDGET", 30))
+# True — превышение бюджета падает с QueryBudgetExceeded вместо предупреждения в логе
+SQL_QUERY_BUDGET_STRICT = os.getenv("SQL_QUERY_BUDGET_STRICT", "0") == "1"
+# Столько одинаковых запросов за один запрос — признак N+1, предупреждение в логе
+SQL_DUPLICATE_THRESHOLD = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'library': {'handlers': ['console'], 'level': 'INFO' if DEBUG else 'WARNING'},
+        # Время блоков дашборда (analytics/views/site_analytics.py)
+        'analytics': {'handlers': ['console'], 'level': 'INFO' if DEBUG else 'WARNING'},
+        # Построение индекса подсказок (books/typeahead.py)
+        'books': {'handlers': ['console'], 'level': 'INFO' if DEBUG else 'WARNING'},
+    },
+}
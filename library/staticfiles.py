@@ -0,0 +1,199 @@
+# library/staticfiles.py
+"""
+Статика с хэшами в именах, заранее сжатая и отдаваемая самим приложением.
+
+Сборка (при деплое):
+    python manage.py collectstatic --noinput
+
+CompressedManifestStaticFilesStorage — ManifestStaticFilesStorage
+(global.3f2a…e1.css + staticfiles.json; ссылки в CSS переписываются на
+хэшированные имена), после чего рядом с каждым текстовым файлом кладутся
+сжатые варианты: file.css.gz и, если установлен brotli, file.css.br.
+
+StaticFilesMiddleware отдаёт STATIC_ROOT без отдельного веб-сервера или CDN:
+- вариант по Accept-Encoding: br, затем gzip, иначе исходный файл (Vary: Accept-Encoding);
+- хэшированные имена — Cache-Control: immutable на год: содержимое по этому
+  имени никогда не меняется, браузер не перепроверяет их вовсе;
+- исходные имена (без хэша) — короткий max-age и ETag для 304.
+Список файлов строится один раз при старте процесса: collectstatic — до запуска.
+
+С DEBUG статику по-прежнему отдаёт runserver из STATICFILES_DIRS,
+а {% static %} возвращает имена без хэшей — collectstatic для разработки не нужен.
+"""
+
+import gzip
+import mimetypes
+import os
+import posixpath
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:  # необязательная зависимость: без неё — только gzip
+    brotli = None
+
+# Что имеет смысл сжимать: картинки и шрифты (кроме svg) уже сжаты
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico'}
+# Файлы меньше — не сжимаем: заголовки ответа съедят выигрыш
+COMPRESS_MIN_SIZE = 256
+# Сжатый вариант сохраняется, только если он меньше исходного хотя бы на 5 %
+COMPRESS_MAX_RATIO = 0.95
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Расширение сжатого варианта → Content-Encoding, в порядке предпочтения
+ENCODINGS = [('.br', 'br'), ('.gz', 'gzip')]
+
+
+def compress(content):
+    """
+    {расширение: байты} сжатых вариантов, которые стоит хранить.
+    """
+    variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(content, quality=11)
+    return {
+        ext: data for ext, data in variants.items()
+        if len(data) <= len(content) * COMPRESS_MAX_RATIO
+    }
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    manifest_strict = False
+
+    def hashed_name(self, name, content=None, filename=None):
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            # Файла нет в сборке (картинки, которые кладут на сервер отдельно):
+            # ссылка без хэша вместо ошибки 500 на каждой странице
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+
+        # И хэшированные, и исходные имена: шаблоны без {% static %} тоже получают сжатие
+        names = set(self.hashed_files) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS or not self.exists(name):
+                continue
+            with self.open(name) as f:
+                content = f.read()
+            if len(content) < COMPRESS_MIN_SIZE:
+                continue
+            for ext, data in compress(content).items():
+                if self.exists(name + ext):
+                    self.delete(name + ext)
+                self._save(name + ext, ContentFile(data))
+
+
+# ---------------------------------------
+# Отдача
+# ---------------------------------------
+class StaticFile:
+    def __init__(self, path, immutable):
+        self.path = path
+        self.immutable = immutable
+        self.content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        # Content-Encoding → путь сжатого варианта
+        self.variants = {
+            encoding: Path(f'{path}{ext}')
+            for ext, encoding in ENCODINGS
+            if Path(f'{path}{ext}').is_file()
+        }
+
+
+def accepted_encodings(header):
+    """
+    Кодировки из Accept-Encoding с q > 0 (без разбора приоритетов: берём лучшую из наших).
+    """
+    accepted = set()
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def scan(root, storage):
+    """
+    {путь URL без STATIC_URL: StaticFile} по STATIC_ROOT.
+    """
+    hashed = set(storage.hashed_files.values()) if hasattr(storage, 'hashed_files') else set()
+    compressed = tuple(ext for ext, _ in ENCODINGS)
+    files = {}
+    for path in Path(root).rglob('*'):
+        if not path.is_file() or path.name.endswith(compressed):
+            continue
+        name = path.relative_to(root).as_posix()
+        files[name] = StaticFile(path, immutable=name in hashed)
+    return files
+
+
+class StaticFilesMiddleware:
+    """
+    Отдаёт собранную статику из STATIC_ROOT со сжатыми вариантами и долгим кэшем.
+    Ставится сразу после SecurityMiddleware — статике не нужны сессии и пользователь.
+    Включается настройкой STATIC_SERVE (по умолчанию — когда DEBUG выключен).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if not settings.STATIC_SERVE or not settings.STATIC_ROOT or not os.path.isdir(settings.STATIC_ROOT):
+            raise MiddlewareNotUsed
+
+        self.prefix = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else '/' + settings.STATIC_URL
+        self.files = scan(settings.STATIC_ROOT, staticfiles_storage)
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(self.prefix):
+            name = posixpath.normpath(request.path_info[len(self.prefix):]).lstrip('/')
+            static_file = self.files.get(name)
+            if static_file is not None:
+                return self.serve(request, static_file)
+        return self.get_response(request)
+
+    def serve(self, request, static_file):
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        encoding, path = None, static_file.path
+        for candidate, variant in static_file.variants.items():
+            if candidate in accepted:
+                encoding, path = candidate, variant
+                break
+
+        stat = path.stat()
+        etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+        response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+        if response is None:
+            response = FileResponse(open(path, 'rb'), content_type=static_file.content_type)
+            if encoding:
+                response['Content-Encoding'] = encoding
+        elif not isinstance(response, HttpResponseNotModified):
+            return response
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Cache-Control'] = (
+            IMMUTABLE_CACHE_CONTROL if static_file.immutable
+            else f'public, max-age={settings.STATIC_UNHASHED_MAX_AGE}'
+        )
+        if static_file.variants:
+            response['Vary'] = 'Accept-Encoding'
+        return response
@@ -0,0 +1,281 @@
+# library/tests.py
+from unittest import mock
+
+from urllib.parse import parse_qs, urlsplit
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.models import Session
+from django.db import DatabaseError, connections, router
+from django.db.utils import ConnectionRouter
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from books.admin import BookViewAdmin
+from books.models import Book, BookView, DownloadLog
+from books.views import catalog_views
+
+from . import admin_tables, replicas
+from .middleware import ReplicaMiddleware
+
+ROUTERS = ['library.routers.ReplicaRouter', 'library.routers.AnalyticsRouter']
+
+
+# ---------------------------------------
+# Маршрутизация (library/routers.py)
+# ---------------------------------------
+class AnalyticsRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ConnectionRouter(ROUTERS)
+        patcher = mock.patch('library.routers.analytics_db_enabled', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_event_models_go_to_analytics(self):
+        for model in (BookView, DownloadLog):
+            with self.subTest(model=model.__name__):
+                self.assertEqual(self.router.db_for_read(model), 'analytics')
+                self.assertEqual(self.router.db_for_write(model), 'analytics')
+
+    def test_catalog_models_stay_in_default(self):
+        self.assertEqual(self.router.db_for_read(Book), 'default')
+        self.assertEqual(self.router.db_for_write(Book), 'default')
+
+    def test_migrations_split(self):
+        self.assertTrue(self.router.allow_migrate('analytics', 'books', model_name='bookview'))
+        self.assertFalse(self.router.allow_migrate('default', 'books', model_name='bookview'))
+        self.assertFalse(self.router.allow_migrate('analytics', 'books', model_name='book'))
+        self.assertTrue(self.router.allow_migrate('default', 'books', model_name='book'))
+        self.assertTrue(self.router.allow_migrate('analytics', 'analytics'))
+        self.assertFalse(self.router.allow_migrate('default', 'analytics'))
+
+    def test_without_analytics_db_everything_is_default(self):
+        with mock.patch('library.routers.analytics_db_enabled', return_value=False):
+            self.assertEqual(self.router.db_for_read(BookView), 'default')
+            self.assertTrue(self.router.allow_migrate('default', 'books', model_name='bookview'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ConnectionRouter(ROUTERS)
+        for target, value in (
+            ('library.replicas.start_health_checks', None),
+            ('library.replicas.healthy_replicas', ['replica1']),
+        ):
+            patcher = mock.patch(target, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def read_on_replica(self, model):
+        token = replicas.start_replica_reads()
+        try:
+            return self.router.db_for_read(model)
+        finally:
+            replicas.stop_replica_reads(token)
+
+    def test_reads_go_to_replica_only_when_enabled(self):
+        self.assertEqual(self.router.db_for_read(Book), 'default')
+        self.assertEqual(self.read_on_replica(Book), 'replica1')
+
+    def test_primary_only_apps(self):
+        self.assertEqual(self.read_on_replica(Session), 'default')
+
+    def test_no_healthy_replica_reads_primary(self):
+        with mock.patch('library.replicas.healthy_replicas', return_value=[]):
+            self.assertEqual(self.read_on_replica(Book), 'default')
+
+    def test_write_stops_replica_reads(self):
+        token = replicas.start_replica_reads()
+        try:
+            self.assertEqual(self.router.db_for_write(Book), 'default')
+            self.assertEqual(self.router.db_for_read(Book), 'default')
+        finally:
+            replicas.stop_replica_reads(token)
+
+    def test_replicas_never_migrate(self):
+        self.assertFalse(self.router.allow_migrate('replica1', 'books', model_name='book'))
+
+
+# ---------------------------------------
+# Реплики (library/replicas.py, ReplicaMiddleware)
+# ---------------------------------------
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2', 'replica3'], REPLICA_MAX_LAG=5)
+class ReplicaHealthTests(SimpleTestCase):
+    def test_lagging_and_unavailable_replicas_are_excluded(self):
+        lags = {'replica1': 30.0, 'replica2': 0.5, 'replica3': None}
+        with mock.patch('library.replicas.replica_lag', side_effect=lags.get), \
+                mock.patch.object(replicas, '_health', replicas._Health()):
+            replicas.check_replicas()
+            with mock.patch('library.replicas.start_health_checks'):
+                self.assertEqual(replicas.healthy_replicas(), ['replica2'])
+
+    def test_request_does_not_wait_for_first_check(self):
+        with mock.patch.object(replicas, '_health', replicas._Health()), \
+                mock.patch('library.replicas.start_health_checks') as start, \
+                mock.patch('library.replicas.check_replicas') as check:
+            self.assertEqual(replicas.healthy_replicas(), [])
+        start.assert_called_once()
+        check.assert_not_called()
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], READ_YOUR_WRITES_WINDOW=15)
+class ReplicaMiddlewareTests(SimpleTestCase):
+    def request(self, method='get', **cookies):
+        request = getattr(RequestFactory(), method)('/catalog/')
+        request.COOKIES.update(cookies)
+        request.user = AnonymousUser()
+        return request
+
+    def run_middleware(self, request, view):
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware = ReplicaMiddleware(get_response)
+        return middleware(request)
+
+    def test_get_reads_from_replica(self):
+        seen = []
+
+        def view(request):
+            seen.append(replicas.use_replica())
+            return HttpResponse()
+        view.__module__ = catalog_views.__name__
+
+        self.run_middleware(self.request(), view)
+        self.assertEqual(seen, [True])
+        self.assertFalse(replicas.use_replica())
+
+    def test_write_sets_pin_cookie(self):
+        def view(request):
+            replicas.pin_to_primary()
+            return HttpResponse()
+        view.__module__ = catalog_views.__name__
+
+        response = self.run_middleware(self.request('post'), view)
+        cookie = response.cookies[replicas.PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], 15)
+
+    def test_pinned_browser_reads_from_primary(self):
+        seen = []
+
+        def view(request):
+            seen.append(replicas.use_replica())
+            return HttpResponse()
+        view.__module__ = catalog_views.__name__
+
+        response = self.run_middleware(self.request(**{replicas.PIN_COOKIE: '1'}), view)
+        self.assertEqual(seen, [False])
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+
+# ---------------------------------------
+# Списки больших таблиц в админке (library/admin_tables.py)
+# ---------------------------------------
+class PlanEstimateTests(SimpleTestCase):
+    def estimate(self, **explain):
+        queryset = mock.Mock()
+        queryset.explain = mock.Mock(**explain)
+        return admin_tables.plan_estimate(queryset)
+
+    def test_both_json_shapes(self):
+        # psycopg2 — список планов, psycopg 3 — сам план
+        self.assertEqual(self.estimate(return_value='[{"Plan": {"Plan Rows": 7}}]'), 7)
+        self.assertEqual(self.estimate(return_value='{"Plan": {"Plan Rows": 7}}'), 7)
+
+    def test_unreadable_plan_is_none(self):
+        for explain in (
+            {'return_value': 'Seq Scan on books_bookview'},
+            {'return_value': '{}'},
+            {'return_value': '[]'},
+            {'return_value': '"plan"'},
+            {'side_effect': DatabaseError},
+        ):
+            with self.subTest(**explain):
+                self.assertIsNone(self.estimate(**explain))
+
+
+class LargeTableAdminTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', password='secret')
+        cls.reader = get_user_model().objects.create_user('reader')
+        cls.books = [Book.objects.create(title=title, slug=slug) for title, slug in (
+            ('Война и мир', 'voyna-i-mir'), ('Анна Каренина', 'anna-karenina'),
+        )]
+        cls.views = [
+            BookView.objects.create(book=cls.books[i % 2], user=cls.reader if i < 3 else cls.admin)
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:books_bookview_changelist')
+
+    def changelist(self, query):
+        response = self.client.get(self.url, query)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl']
+
+    def pks(self, changelist):
+        return [view.pk for view in changelist.result_list]
+
+    def follow(self, link):
+        return self.changelist({key: values[-1] for key, values in parse_qs(urlsplit(link).query).items()})
+
+    @mock.patch.object(BookViewAdmin, 'list_per_page', 2)
+    def test_older_and_newer_pages(self):
+        pks = sorted((view.pk for view in self.views), reverse=True)
+        first = self.changelist({})
+        self.assertEqual(self.pks(first), pks[:2])
+        self.assertIsNone(first.newer_url)
+
+        second = self.follow(first.older_url)
+        self.assertEqual(self.pks(second), pks[2:4])
+        last = self.follow(second.older_url)
+        self.assertEqual(self.pks(last), pks[4:])
+        self.assertIsNone(last.older_url)
+
+        self.assertEqual(self.pks(self.follow(last.newer_url)), pks[2:4])
+        # С начала списка «Новее» ведёт на первую страницу целиком
+        self.assertEqual(self.pks(self.follow(second.newer_url)), pks[:2])
+
+    def test_bad_cursor(self):
+        response = self.client.get(self.url, {'older': 'abc'})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('e=1', response['Location'])
+
+    def test_search_by_related_indexes(self):
+        reader_views = sorted((v.pk for v in self.views if v.user_id == self.reader.pk), reverse=True)
+        self.assertEqual(self.pks(self.changelist({'q': 'read'})), reader_views)
+        # Логин — только по началу
+        self.assertEqual(self.pks(self.changelist({'q': 'eader'})), [])
+        book_views = sorted((v.pk for v in self.views if v.book_id == self.books[1].pk), reverse=True)
+        self.assertEqual(self.pks(self.changelist({'q': 'Каренина'})), book_views)
+
+    def test_filtered_list_count(self):
+        cl = self.changelist({'user__id__exact': self.reader.pk})
+        self.assertEqual((cl.result_count, cl.paginator.count_is_exact), (3, True))
+
+    def test_estimate_count_falls_back_to_exact_count(self):
+        queryset = BookView.objects.filter(user=self.reader)
+        if connections[router.db_for_read(BookView)].vendor != 'postgresql':
+            self.assertEqual(admin_tables.estimate_count(queryset), (3, True))
+            return
+        # Оценки нет или она меньше порога — точный COUNT
+        for estimate in (None, 1):
+            with self.subTest(estimate=estimate), \
+                    mock.patch.object(admin_tables, 'plan_estimate', return_value=estimate):
+                self.assertEqual(admin_tables.estimate_count(queryset), (3, True))
+        with override_settings(ADMIN_EXACT_COUNT_THRESHOLD=2), \
+                mock.patch.object(admin_tables, 'plan_estimate', return_value=50):
+            self.assertEqual(admin_tables.estimate_count(queryset), (50, False))
+        # Настоящий EXPLAIN
+        with override_settings(ADMIN_EXACT_COUNT_THRESHOLD=0):
+            count, exact = admin_tables.estimate_count(queryset)
+        self.assertFalse(exact)
+        self.assertGreater(count, 0)
@@ -0,0 +1,94 @@
+// Каталог без перезагрузки страницы.
+// Без JS работают обычные GET-формы фильтров и пагинация по страницам. С JS:
+// - следующая порция карточек подгружается при прокрутке (catalog_books_fragment,
+//   URL порции — data-next-url, дальше — заголовок X-Next-Page);
+// - смена фильтра или сортировки заменяет только боковую панель
+//   (catalog_filters_fragment) и список книг — без остальной страницы.
+(() => {
+  const root = document.querySelector('.catalog-row[data-books-url]');
+  const books = document.getElementById('catalog-books');
+  if (!root || !books || !('IntersectionObserver' in window)) return;
+
+  const pagination = () => document.querySelector('.catalog-pagination');
+  const sentinel = document.createElement('div');
+  books.after(sentinel);
+  let loading = false;
+
+  const hidePagination = () => {
+    const nav = pagination();
+    if (nav) nav.hidden = true;
+  };
+
+  const fetchFragment = url => fetch(url, { credentials: 'same-origin' }).then(response => {
+    if (!response.ok) throw new Error(response.status);
+    return response;
+  });
+
+  const nearBottom = () => sentinel.getBoundingClientRect().top < window.innerHeight + 600;
+
+  // ===== Подгрузка при прокрутке =====
+  const loadMore = () => {
+    const url = books.dataset.nextUrl;
+    if (!url || loading) return;
+    loading = true;
+    fetchFragment(url)
+      .then(response => {
+        books.dataset.nextUrl = response.headers.get('X-Next-Page') || '';
+        return response.text();
+      })
+      .then(html => {
+        books.insertAdjacentHTML('beforeend', html);
+        loading = false;
+        if (nearBottom()) loadMore();  // порция не заполнила экран
+      })
+      .catch(() => {
+        // Запасной путь — обычная пагинация
+        loading = false;
+        books.dataset.nextUrl = '';
+        const nav = pagination();
+        if (nav) nav.hidden = false;
+      });
+  };
+
+  hidePagination();
+  new IntersectionObserver(entries => {
+    if (entries.some(entry => entry.isIntersecting)) loadMore();
+  }, { rootMargin: '600px 0px' }).observe(sentinel);
+
+  // ===== Смена фильтров и сортировки =====
+  const refresh = query => {
+    history.pushState(null, '', `${window.location.pathname}?${query}`);
+    loading = true;
+    Promise.all([
+      fetchFragment(`${root.dataset.filtersUrl}?${query}`).then(response => response.text()),
+      fetchFragment(`${root.dataset.booksUrl}?${query}`),
+    ])
+      .then(([filtersHtml, booksResponse]) => {
+        const parsed = document.createElement('div');
+        parsed.innerHTML = filtersHtml;
+        parsed.querySelectorAll('template[data-target]').forEach(template => {
+          document.getElementById(template.dataset.target).innerHTML = template.innerHTML;
+        });
+        books.dataset.nextUrl = booksResponse.headers.get('X-Next-Page') || '';
+        return booksResponse.text();
+      })
+      .then(html => {
+        books.innerHTML = html;
+        hidePagination();
+        loading = false;
+        if (nearBottom()) loadMore();
+      })
+      .catch(() => window.location.reload());  // запасной путь — полная страница
+  };
+
+  // Формы фильтров и сортировки отправляются через requestSubmit() — перехватываем
+  document.addEventListener('submit', event => {
+    const form = event.target;
+    if (!form.closest('#catalog-filters, #catalog-toolbar')) return;
+    event.preventDefault();
+    refresh(new URLSearchParams(new FormData(form)).toString());
+  });
+
+  // Назад/вперёд по истории фильтров — просто загружаем страницу
+  window.addEventListener('popstate', () => window.location.reload());
+})();
@@ -0,0 +1,56 @@
+// Избранное без перезагрузки страницы.
+// Форма .favorite-form остаётся рабочей без JS (POST на favorite_toggle),
+// с JS отправляем PUT/DELETE на data-api-url и меняем кнопку на месте.
+// POST на favorite_toggle переключает состояние, поэтому повторять его после
+// неудачного PUT/DELETE вслепую нельзя: запрос мог дойти. Вместо этого кнопка
+// сверяется с сервером (GET на data-api-url), и форма уходит обычным POST,
+// только если ответа не было, а состояние на сервере прежнее — запрос не дошёл.
+function renderFavorite(form, favorited) {
+  form.dataset.favorited = favorited ? '1' : '0';
+  form.querySelector('button').textContent = favorited ? 'Убрать из избранного' : 'Добавить в избранное';
+}
+
+function resyncFavorite(form) {
+  return fetch(form.dataset.apiUrl, { credentials: 'same-origin', cache: 'no-store' })
+    .then(response => (response.ok ? response.json() : null))
+    .then(data => {
+      if (!data) return null;
+      renderFavorite(form, data.favorited);
+      return data.favorited;
+    })
+    .catch(() => null);  // сети нет — кнопка остаётся как была
+}
+
+if (window.fetch) {
+  document.querySelectorAll('.favorite-form').forEach(form => {
+    form.addEventListener('submit', event => {
+      event.preventDefault();
+
+      const button = form.querySelector('button');
+      const favorited = form.dataset.favorited === '1';
+      const token = form.querySelector('input[name="csrfmiddlewaretoken"]').value;
+
+      // fetch отклоняет промис асинхронно (и при сетевой ошибке, и если запрос
+      // вообще не ушёл), поэтому запасной путь — в .catch, а не в try/catch
+      let answered = false;
+      button.disabled = true;
+      fetch(form.dataset.apiUrl, {
+        method: favorited ? 'DELETE' : 'PUT',
+        headers: { 'X-CSRFToken': token },
+        credentials: 'same-origin',
+      })
+        .then(response => {
+          answered = true;
+          if (!response.ok) throw new Error(response.status);
+          return response.json();
+        })
+        .then(data => renderFavorite(form, data.favorited))
+        .catch(() => resyncFavorite(form).then(current => {
+          // Ответа не было, а на сервере всё как до клика — PUT/DELETE не дошёл:
+          // обычный POST формы переключит состояние ровно один раз
+          if (!answered && current === favorited) form.submit();
+        }))
+        .finally(() => { button.disabled = false; });
+    });
+  });
+}
@@ -0,0 +1,76 @@
+// Подсказки в строке поиска.
+// Без JS форма работает как раньше (GET на books:search); с JS под полем
+// показываем подсказки из data-autocomplete-url, клик или Enter — переход.
+document.querySelectorAll('.search-input[data-autocomplete-url]').forEach(input => {
+  const list = document.createElement('ul');
+  list.className = 'search-suggestions';
+  list.hidden = true;
+  input.setAttribute('autocomplete', 'off');
+  input.parentNode.appendChild(list);
+
+  const kinds = { book: '📚', author: '✍️', genre: '🏷️' };
+  let timer = null;
+  let controller = null;
+  let active = -1;
+
+  const hide = () => { list.hidden = true; active = -1; };
+
+  const highlight = index => {
+    const items = list.querySelectorAll('a');
+    items.forEach((a, i) => a.classList.toggle('active', i === index));
+    active = index;
+  };
+
+  const render = results => {
+    list.innerHTML = '';
+    results.forEach(item => {
+      const li = document.createElement('li');
+      const a = document.createElement('a');
+      a.href = item.url;
+      a.textContent = `${kinds[item.type] || ''} ${item.label}`;
+      li.appendChild(a);
+      list.appendChild(li);
+    });
+    list.hidden = results.length === 0;
+    active = -1;
+  };
+
+  const load = () => {
+    const query = input.value.trim();
+    if (!query) { hide(); return; }
+    if (controller) controller.abort();  // ответ на устаревший запрос не нужен
+    controller = new AbortController();
+    const url = `${input.dataset.autocompleteUrl}?q=${encodeURIComponent(query)}`;
+    fetch(url, { signal: controller.signal })
+      .then(response => {
+        if (!response.ok) throw new Error(response.status);
+        return response.json();
+      })
+      .then(data => render(data.results))
+      .catch(() => {});  // без подсказок поиск всё равно работает
+  };
+
+  input.addEventListener('input', () => {
+    clearTimeout(timer);
+    timer = setTimeout(load, 80);
+  });
+
+  input.addEventListener('keydown', event => {
+    const items = list.querySelectorAll('a');
+    if (list.hidden || !items.length) return;
+    if (event.key === 'ArrowDown' || event.key === 'ArrowUp') {
+      event.preventDefault();
+      const step = event.key === 'ArrowDown' ? 1 : -1;
+      highlight((active + step + items.length) % items.length);
+    } else if (event.key === 'Enter' && active >= 0) {
+      event.preventDefault();
+      window.location.href = items[active].href;
+    } else if (event.key === 'Escape') {
+      hide();
+    }
+  });
+
+  // mousedown срабатывает раньше blur — клик по подсказке не теряется
+  list.addEventListener('mousedown', event => event.preventDefault());
+  input.addEventListener('blur', hide);
+});
@@ -0,0 +1,15 @@
+// Фильтр списка в админке по внешнему ключу с подсказками
+// (library/admin_tables.py, AutocompleteFilter). select2 поднимает admin/js/autocomplete.js;
+// выбор значения открывает список с этим фильтром, очистка — без него.
+'use strict';
+{
+  const $ = django.jQuery;
+
+  $(() => {
+    $('.autocomplete-filter').on('change', function () {
+      const url = new URL(this.dataset.clearUrl, window.location.href);
+      if (this.value) url.searchParams.set(this.dataset.lookup, this.value);
+      window.location.href = url.toString();
+    });
+  });
+}
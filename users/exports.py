@@ -0,0 +1,193 @@
+# users/exports.py
+"""
+Архив данных пользователя: всё избранное, скачивания и просмотры — то,
+чего не показывает профиль (там только последние 10 скачиваний).
+
+Архив собирается не в запросе: profile_edit создаёт DataExport (request_export),
+а build_export выполняется в фоновом пуле процесса
+(library.concurrency.run_in_background, не больше USER_EXPORT_WORKERS архивов
+одновременно). Пока архив собирается, на странице редактирования профиля
+виден статус; готовый архив скачивает только владелец (data_export_download).
+
+Состав zip:
+    favorites.csv  — избранное
+    downloads.csv  — скачивания
+    views.csv      — просмотры
+    profile.json   — данные профиля и число строк в каждом файле
+
+Строки читаются server-side курсором (.values().iterator) и сразу пишутся в
+файл внутри zip, поэтому память не зависит от длины истории. Журналы могут
+лежать в базе 'analytics', и JOIN с книгами там невозможен. Поэтому названия
+книг подгружаются отдельным запросом на каждую пачку строк.
+
+Новый архив заменяет прежний, и его файл удаляется (users/signals.py).
+Сборку, которая не закончилась за USER_EXPORT_STALE_AFTER секунд (например,
+если процесс перезапустили), считаем брошенной и позволяем запросить архив снова.
+Её запись не удаляется, а помечается 'superseded': поток мог не умереть, а
+зависнуть, и файл, который он допишет, удаляет он сам — статус ready
+выставляется только записи, которая всё ещё 'running'.
+"""
+
+import csv
+import io
+import json
+import logging
+import zipfile
+from datetime import datetime, timedelta
+from functools import partial
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from books.models import Book, BookView, DownloadLog, Favorite
+from library.concurrency import run_in_background
+from .models import DataExport
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('pending', 'running')
+
+
+def sources(user):
+    """
+    Файл архива → (события пользователя, колонки). book_title добавляется к каждому.
+    """
+    return {
+        'favorites.csv': (Favorite.objects.filter(user=user), ('book_id', 'created_at')),
+        'downloads.csv': (
+            DownloadLog.objects.filter(user=user),
+            ('book_id', 'file_format', 'file_size', 'status', 'created_at'),
+        ),
+        'views.csv': (BookView.objects.filter(user=user), ('book_id', 'created_at')),
+    }
+
+
+# ---------------------------------------
+# Запрос архива
+# ---------------------------------------
+def latest_export(user):
+    return user.data_exports.first()
+
+
+def request_export(user):
+    """
+    Новый DataExport со сборкой в фоне или None, если архив уже собирается.
+    """
+    stale = timezone.now() - timedelta(seconds=settings.USER_EXPORT_STALE_AFTER)
+    if user.data_exports.filter(status__in=ACTIVE_STATUSES, created_at__gte=stale).exists():
+        return None
+
+    # Брошенные сборки не удаляем: их поток может ещё писать файл
+    user.data_exports.filter(status__in=ACTIVE_STATUSES).update(
+        status='superseded', finished_at=timezone.now(),
+    )
+    # Давние 'superseded' удалять можно: запись без файла, а сборка, не найдя её, удалит свой
+    user.data_exports.exclude(status='superseded', finished_at__gte=stale).delete()
+    export = DataExport.objects.create(user=user)
+    transaction.on_commit(lambda: run_in_background(
+        'user-export', partial(build_export, export.pk), max_workers=settings.USER_EXPORT_WORKERS,
+    ))
+    return export
+
+
+# ---------------------------------------
+# Сборка
+# ---------------------------------------
+def with_titles(rows, chunk_size):
+    """
+    Добавляет book_title к строкам: один запрос к книгам на пачку.
+    """
+    rows = iter(rows)
+    while batch := list(islice(rows, chunk_size)):
+        titles = dict(
+            Book.objects.filter(pk__in={row['book_id'] for row in batch}).values_list('pk', 'title')
+        )
+        for row in batch:
+            row['book_title'] = titles.get(row['book_id'], '')
+            yield row
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def write_csv(archive, name, rows, fields):
+    """
+    Пишет строки в файл name внутри zip по мере чтения. Возвращает число строк.
+    """
+    count = 0
+    # utf-8-sig: Excel иначе не узнаёт кодировку кириллических названий
+    with io.TextIOWrapper(archive.open(name, 'w', force_zip64=True), encoding='utf-8-sig', newline='') as fh:
+        writer = csv.writer(fh)
+        writer.writerow(fields)
+        for row in rows:
+            writer.writerow([_csv_value(row[field]) for field in fields])
+            count += 1
+    return count
+
+
+def profile_data(user, counts):
+    return {
+        'username': user.username,
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'date_joined': user.date_joined,
+        'last_login': user.last_login,
+        'exported_at': timezone.now(),
+        'files': counts,
+    }
+
+
+def build_export(export_id):
+    # Заменён новым запросом, пока ждал в очереди
+    if not DataExport.objects.filter(pk=export_id, status='pending').update(status='running'):
+        return
+    export = DataExport.objects.select_related('user').filter(pk=export_id).first()
+    if export is None:
+        return  # пользователь удалён
+
+    user = export.user
+    chunk_size = settings.USER_EXPORT_CHUNK_SIZE
+    root = Path(settings.USER_EXPORT_ROOT)
+    root.mkdir(parents=True, exist_ok=True)
+    file_name = f'user-{user.pk}-{export.pk}.zip'
+    # Архив пишется во временный файл: ссылка появляется только на целый
+    tmp_path = root / f'{file_name}.tmp'
+    path = root / file_name
+    # Итог сборки записывается, только если её не заменили и не удалили
+    running = DataExport.objects.filter(pk=export.pk, status='running')
+
+    try:
+        counts = {}
+        with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for name, (queryset, fields) in sources(user).items():
+                rows = queryset.order_by('pk').values(*fields).iterator(chunk_size=chunk_size)
+                columns = ('book_id', 'book_title', *fields[1:])
+                counts[name] = write_csv(archive, name, with_titles(rows, chunk_size), columns)
+            archive.writestr('profile.json', json.dumps(
+                profile_data(user, counts), cls=DjangoJSONEncoder, ensure_ascii=False, indent=2,
+            ))
+        tmp_path.replace(path)
+        finished = running.update(
+            status='ready', file_name=file_name, file_size=path.stat().st_size, finished_at=timezone.now(),
+        )
+    except Exception:
+        logger.exception('Не удалось собрать архив данных пользователя %s', user.pk)
+        tmp_path.unlink(missing_ok=True)
+        path.unlink(missing_ok=True)
+        running.update(status='failed', finished_at=timezone.now())
+        return
+
+    if not finished:
+        # Пока собирали, запрошен новый архив или удалён пользователь: файл ничей
+        path.unlink(missing_ok=True)
+        DataExport.objects.filter(pk=export.pk, status='superseded').delete()
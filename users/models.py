@@ -0,0 +1,46 @@
+# users/models.py
+from pathlib import Path
+
+from django.conf import settings
+from django.db import models
+
+
+# -----------------------------------------
+# DataExport — архив данных пользователя
+# (избранное, скачивания, просмотры), см. users/exports.py
+# -----------------------------------------
+class DataExport(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+        # Заменён новым запросом, пока собирался: файл удаляет сама сборка
+        ('superseded', 'Superseded'),
+    ]
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='data_exports'
+    )
+    status = models.CharField(
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default='pending'
+    )
+    # Имя файла в USER_EXPORT_ROOT (не в MEDIA_ROOT: архив отдаётся только владельцу)
+    file_name = models.CharField(max_length=100, blank=True)
+    file_size = models.PositiveBigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['user', '-created_at'])]
+
+    def __str__(self):
+        return f'{self.user} — {self.created_at:%Y-%m-%d %H:%M} ({self.status})'
+
+    @property
+    def path(self):
+        return Path(settings.USER_EXPORT_ROOT) / self.file_name if self.file_name else None
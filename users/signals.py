@@ -0,0 +1,15 @@
+# users/signals.py
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import DataExport
+
+
+@receiver(post_delete, sender=DataExport)
+def delete_export_file(sender, instance, **kwargs):
+    """
+    Файл архива удаляется вместе с записью: при новом запросе архива
+    и при удалении пользователя (CASCADE).
+    """
+    if instance.path is not None:
+        instance.path.unlink(missing_ok=True)
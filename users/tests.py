@@ -0,0 +1,92 @@
+# users/tests.py
+import json
+import tempfile
+import zipfile
+from pathlib import Path
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from books.models import Book, Favorite
+from . import exports
+from .models import DataExport
+
+
+# ---------------------------------------
+# Архив данных пользователя (users/exports.py)
+# ---------------------------------------
+class DataExportTests(TestCase):
+    # Скачивания и просмотры могут лежать в базе 'analytics'
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('reader', password='secret')
+        cls.book = Book.objects.create(title='Война и мир', slug='voyna-i-mir')
+        Favorite.objects.create(user=cls.user, book=cls.book)
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        settings_override = override_settings(USER_EXPORT_ROOT=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def files(self):
+        return sorted(p.name for p in Path(self.root).iterdir())
+
+    def test_build_export(self):
+        export = exports.request_export(self.user)
+        exports.build_export(export.pk)
+
+        export.refresh_from_db()
+        self.assertEqual(export.status, 'ready')
+        self.assertEqual(self.files(), [export.file_name])
+        with zipfile.ZipFile(export.path) as archive:
+            profile = json.loads(archive.read('profile.json'))
+            favorites = archive.read('favorites.csv').decode('utf-8-sig').splitlines()
+        self.assertEqual(profile['files'], {'favorites.csv': 1, 'downloads.csv': 0, 'views.csv': 0})
+        self.assertEqual(favorites[1].split(',')[:2], [str(self.book.pk), 'Война и мир'])
+
+    def test_running_export_blocks_new_request(self):
+        self.assertIsNotNone(exports.request_export(self.user))
+        self.assertIsNone(exports.request_export(self.user))
+
+    def test_new_request_replaces_ready_export(self):
+        old = exports.request_export(self.user)
+        exports.build_export(old.pk)
+        new = exports.request_export(self.user)
+        self.assertFalse(DataExport.objects.filter(pk=old.pk).exists())
+        self.assertEqual(self.files(), [])
+        self.assertEqual(exports.latest_export(self.user), new)
+
+    def test_stale_export_is_superseded_and_cleans_up_its_file(self):
+        old = exports.request_export(self.user)
+        DataExport.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=1))
+
+        # Новый архив запрошен, пока брошенная сборка ещё пишет файл
+        profile_data = exports.profile_data
+
+        def request_new(*args):
+            self.new = exports.request_export(self.user)
+            return profile_data(*args)
+
+        with mock.patch.object(exports, 'profile_data', side_effect=request_new):
+            exports.build_export(old.pk)
+
+        self.assertFalse(DataExport.objects.filter(pk=old.pk).exists())
+        self.assertEqual(self.files(), [])
+        self.assertEqual(exports.latest_export(self.user), self.new)
+
+    def test_failed_export_leaves_no_file(self):
+        export = exports.request_export(self.user)
+        with mock.patch.object(exports, 'write_csv', side_effect=OSError), self.assertLogs(exports.logger):
+            exports.build_export(export.pk)
+
+        export.refresh_from_db()
+        self.assertEqual(export.status, 'failed')
+        self.assertEqual(self.files(), [])
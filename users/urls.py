@@ -23,4 +23,5 @@ urlpatterns = [
     # Профиль и редактирование профиля
     path('profile/', views.profile, name='profile'),
     path('profile/edit/', views.profile_edit, name='profile_edit'),
+    path('profile/export/<int:pk>/', views.data_export_download, name='data_export_download'),
 ]
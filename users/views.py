@@ -5,21 +5,24 @@ Views для регистрации/входа/выхода и профиля.
 - register: регистрация
 - logout_view: выход
 - profile: профиль пользователя
-- profile_edit: редактирование профиля
+- profile_edit: редактирование профиля и запрос архива данных
+- data_export_download: скачивание готового архива данных
 """
 
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth import logout as auth_logout
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseNotAllowed
+from django.http import FileResponse, Http404, HttpResponseNotAllowed
 from django.conf import settings
-from django.db.models import Count, Q
 from django.views.decorators.http import require_POST
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth import update_session_auth_hash
 from books.models import Book, Favorite, DownloadLog
+from analytics.stats import unique_downloads_by_book
+from . import exports
 from .forms import CustomUserCreationForm, UserUpdateForm
+from .models import DataExport
 
 def register(request):
     if request.method == 'POST':
@@ -51,25 +54,21 @@ def profile(request):
     """
     user = request.user
 
-    favorites_qs = (
+    favorites_qs = list(
         Favorite.objects
             .filter(user=user)
             .select_related('book')
-            .annotate(
-            unique_downloads=Count(
-                'book__download_logs__user',
-                filter=Q(book__download_logs__status='success'),
-                distinct=True
-            )
-        )
             .order_by('-created_at')
     )
-    favorite_books = favorites_qs
+    # «Скачано» — запросом к журналу по id книг (журнал может быть в базе 'analytics')
+    unique_downloads = unique_downloads_by_book([fav.book_id for fav in favorites_qs])
+    for fav in favorites_qs:
+        fav.unique_downloads = unique_downloads.get(fav.book_id, 0)
 
     downloads_qs = (
         DownloadLog.objects
         .filter(user=user, status='success')
-        .select_related('book')
+        .prefetch_related('book')  # книги — отдельным запросом в основную базу
         .order_by('-created_at')[:10]
     )
 
@@ -100,6 +99,14 @@ def profile_edit(request):
                 messages.success(request, 'Пароль успешно изменён.')
                 return redirect('users:profile')
 
+        elif 'request_export' in request.POST:
+            # Архив собирается в фоне (users/exports.py), ссылка появится на этой странице
+            if exports.request_export(request.user):
+                messages.success(request, 'Архив данных готовится. Ссылка на скачивание появится на этой странице.')
+            else:
+                messages.info(request, 'Архив данных уже готовится.')
+            return redirect('users:profile_edit')
+
     else:
         user_form = UserUpdateForm(instance=request.user)
         password_form = PasswordChangeForm(request.user)
@@ -107,6 +114,19 @@ def profile_edit(request):
     return render(request, 'users/profile_edit.html', {
         'form': user_form,
         'password_form': password_form,
+        'data_export': exports.latest_export(request.user),
     })
 
 
+@login_required
+def data_export_download(request, pk):
+    export = get_object_or_404(DataExport, pk=pk, user=request.user, status='ready')
+    if not export.path.is_file():
+        raise Http404
+    return FileResponse(
+        open(export.path, 'rb'),
+        as_attachment=True,
+        filename=f'library-data-{export.finished_at:%Y%m%d}.zip',
+    )
+
+